@@ -1,17 +1,289 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, make_response
+from flask import (Flask, Response, render_template, request, redirect, url_for, jsonify, make_response, send_file,
+                   abort, stream_with_context)
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from teacher_service import TeacherService
 from db_connector import DatabaseConnector
+from fragment_cache import FragmentCache
+from course_planner import parse_plan
+from workload_rollup import DIMENSIONS, WorkloadRollup
+from collaboration import CollaborationGraph
+from funding_analytics import PROFILES, parse_profile
+from interval_index import ProjectIntervalIndex
+from publication_cube import PAPER_LEVEL_TEXT, PAPER_TYPE_TEXT, ROLE_TEXT, PublicationCube
+from jobs import JobQueue
+from purger import Purger
+from change_feed import SCOPES, ChangeBroker
+from changelog import ChangeLogTailer
+from audit import AuditLog, FileAuditSink, MySQLAuditSink
+from reports import export_zip
+from documents import FORMATS, DocumentRenderer, available_formats, overview_data
+from arrow_export import (DATASET_TABLES, MEDIA_TYPE, SERVICE_QUERIES, ipc_stream, pyarrow_available, records_reader,
+                          table_reader)
+import atexit
+import hashlib
 import json
+import os
+import tempfile
+from datetime import timezone
 from io import BytesIO
 
 app = Flask(__name__)
 
-# 初始化数据库连接
+# 数据库配置，可通过环境变量覆盖
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'teacher_research_system'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', '20050318'),
+    'port': int(os.environ.get('DB_PORT', 3306)),
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    # 只读副本，格式 "host1,host2:3307"
+    'replicas': [
+        {'host': host, 'port': int(port or 3306)}
+        for host, _, port in (item.strip().partition(':') for item in os.environ.get('DB_REPLICAS', '').split(','))
+        if host
+    ],
+    'sticky_seconds': float(os.environ.get('DB_STICKY_SECONDS', 5)),
+    'max_replica_lag': float(os.environ.get('DB_MAX_REPLICA_LAG', 5)),
+}
+
+# 参与 ETag 计算，模板或输出格式变化时修改它即可让浏览器缓存全部失效
+ETAG_SALT = os.environ.get('ETAG_SALT', '1')
+
+# 数据库连接在每个进程第一次使用时才建立，见 create_app()
 db_connector = DatabaseConnector()
-db_connector.connect(host="localhost", database="teacher_research_system", 
-                    user="root", password="20050318")
 teacher_service = TeacherService(db_connector)
 
+# 结果页表格片段缓存，键中包含教师数据版本号
+fragment_cache = FragmentCache(int(os.environ.get('FRAGMENT_CACHE_SIZE', 1024)))
+
+# 变更日志持久消费者的后台线程，CHANGE_LOG_TAIL_INTERVAL 为 0 时不启动
+change_tailer = ChangeLogTailer(teacher_service, interval=float(os.environ.get('CHANGE_LOG_TAIL_INTERVAL', 2)))
+
+# 教学工作量汇总，按年份缓存，课程写操作后增量更新（其他进程的写操作从变更日志得知）
+workload_rollup = WorkloadRollup(teacher_service,
+                                 change_tailer=change_tailer if change_tailer.interval > 0 else None)
+
+# 项目起止年份区间索引，查询某段时间内在研的项目
+project_interval_index = ProjectIntervalIndex(teacher_service)
+
+# 论文统计立方体，论文写操作后按教师增量更新
+publication_cube = PublicationCube(teacher_service)
+
+# 教师合作关系图，论文（可选再加上项目）写操作后增量更新
+collaboration_graph = CollaborationGraph(
+    teacher_service, sources=os.environ.get('COLLABORATION_SOURCES', 'paper').split(','))
+
+# 教师对比页面一次最多查询的教师数
+MAX_COMPARE_TEACHERS = int(os.environ.get('MAX_COMPARE_TEACHERS', 20))
+
+# 耗时报表的后台任务队列，任务记录在本机所有 worker 进程之间共享
+job_queue = JobQueue(os.environ.get('JOB_DB', os.path.join(tempfile.gettempdir(), 'teacher_research_jobs.db')),
+                     result_dir=os.environ.get('JOB_RESULT_DIR'),
+                     workers=int(os.environ.get('JOB_WORKERS', 2)))
+
+# 已删除论文/项目的后台清理，PURGE_INTERVAL 为 0 时不在 Web 进程中清理（可单独运行 purger.py）
+purger = Purger(teacher_service, interval=float(os.environ.get('PURGE_INTERVAL', 60)))
+
+# 数据变更推送（SSE），每个连接占用一个请求线程，每个进程最多同时打开 CHANGE_FEED_MAX_STREAMS 个，为 0 时不推送
+change_broker = ChangeBroker(teacher_service, max_subscribers=int(os.environ.get('CHANGE_FEED_MAX_STREAMS', 2)))
+# 单个 SSE 连接保持的最长秒数，到期后浏览器自动重连
+CHANGE_FEED_MAX_DURATION = float(os.environ.get('CHANGE_FEED_MAX_DURATION', 300))
+
+# 审计日志：AUDIT_LOG 为 file（默认，写入 AUDIT_LOG_FILE）、mysql（写入 audit_log 表）或 off
+# 操作者取自反向代理认证后设置的请求头 AUDIT_USER_HEADER
+AUDIT_USER_HEADER = os.environ.get('AUDIT_USER_HEADER', 'X-Remote-User')
+audit_log = None
+if os.environ.get('AUDIT_LOG', 'file') == 'mysql':
+    audit_log = AuditLog(MySQLAuditSink(db_connector))
+elif os.environ.get('AUDIT_LOG', 'file') == 'file':
+    audit_log = AuditLog(FileAuditSink(
+        os.environ.get('AUDIT_LOG_FILE', os.path.join(tempfile.gettempdir(), 'teacher_research_audit.log')),
+        max_bytes=int(os.environ.get('AUDIT_LOG_MAX_BYTES', 50 * 1024 * 1024)),
+        backup_count=int(os.environ.get('AUDIT_LOG_BACKUPS', 10))))
+if audit_log is not None:
+    teacher_service.add_listener(audit_log.on_write)
+
+# PDF / Excel 文档在独立的渲染进程中生成，不占用请求线程
+document_renderer = DocumentRenderer(workers=int(os.environ.get('DOC_RENDER_WORKERS', 2)))
+
+def create_app(**db_config):
+    """
+    应用工厂：只记录数据库配置，不在导入或启动时连接数据库
+    每个 worker 进程在处理第一个请求时才创建自己的连接池，因此可以在 fork 前加载应用
+    """
+    config = dict(DB_CONFIG)
+    config.update(db_config)
+    db_connector.configure(**config)
+    # 指定快照文件时所有查询都在本地只读快照上运行，不连接 MySQL
+    if os.environ.get('DB_SNAPSHOT'):
+        db_connector.open_snapshot(os.environ['DB_SNAPSHOT'])
+        # 快照只读，不需要清理，数据也不会变化
+        purger.interval = 0
+        change_tailer.interval = 0
+        change_broker.max_subscribers = 0
+    precompile_templates()
+    atexit.register(db_connector.drain)
+    atexit.register(job_queue.stop)
+    atexit.register(purger.stop)
+    atexit.register(change_tailer.stop)
+    atexit.register(change_broker.close)
+    atexit.register(document_renderer.shutdown)
+    if audit_log is not None:
+        # atexit 按注册的相反顺序执行：先写完审计记录，再关闭连接池
+        atexit.register(audit_log.close)
+    return app
+
+@app.before_request
+def restore_last_write():
+    """从 cookie 恢复该用户上次写入的时间，写入后的短时间内读请求走主库"""
+    try:
+        last_write_at = float(request.cookies.get('last_write_at', ''))
+    except ValueError:
+        last_write_at = None
+    db_connector.begin_request(last_write_at)
+
+@app.before_request
+def set_audit_actor():
+    """审计记录中的操作者和客户端地址"""
+    if audit_log is not None:
+        audit_log.set_actor(request.headers.get(AUDIT_USER_HEADER), request.remote_addr)
+
+@app.before_request
+def start_purger():
+    """清理线程在 fork 之后处理第一个请求时启动（已启动时只比较一次进程号）"""
+    purger.start()
+
+@app.before_request
+def start_job_queue():
+    """任务工作线程在 fork 之后处理第一个请求时启动，并把进程退出时遗留的任务重新排队，不等到有人提交新任务"""
+    job_queue.start()
+
+@app.before_request
+def start_change_tailer():
+    """变更日志消费线程在 fork 之后处理第一个请求时启动"""
+    change_tailer.start()
+
+@app.after_request
+def remember_last_write(response):
+    if db_connector.wrote_in_request():
+        response.set_cookie('last_write_at', str(db_connector.last_write_at()),
+                            max_age=int(db_connector.sticky_seconds) + 1, httponly=True, samesite='Lax')
+    return response
+
+@app.teardown_request
+def release_db_connection(exc):
+    """请求结束时把连接还给连接池"""
+    db_connector.release_connection()
+
+def precompile_templates():
+    """
+    启动时编译全部模板，字节码同时写入磁盘缓存
+    在 fork 之前调用时，各 worker 直接继承已编译的模板；重启后从磁盘加载，无需重新解析
+    """
+    cache_dir = os.environ.get('TEMPLATE_CACHE_DIR',
+                               os.path.join(tempfile.gettempdir(), 'teacher_research_jinja'))
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+def render_fragment(template, name, teacher_id, scope, versions, years, load):
+    """
+    渲染按教师缓存的表格片段，只有该部分数据的版本号变化时才重新查询和渲染
+    load() 返回服务层的 (success, result)；返回 (片段, 错误信息)，成功时错误信息为 None
+    """
+    key = (template, teacher_id, years, versions[scope][0]) if versions else None
+    error = None
+    
+    def render():
+        nonlocal error
+        success, result = load()
+        if success:
+            return render_template(template, **{name: result}), True
+        error = result
+        return render_template(template, **{f'error_{name}': result}), False
+    
+    fragment, _ = fragment_cache.get_or_render(key, render)
+    return fragment, error
+
+def year_arg(args, name):
+    """解析可选的年份参数"""
+    value = args.get(name)
+    return int(value) if value else None
+
+def teacher_ids_arg(value):
+    """解析逗号分隔的教师ID列表（允许中文逗号）"""
+    return [item.strip() for item in (value or '').replace('，', ',').split(',') if item.strip()]
+
+def query_url(endpoint, form):
+    """把查询表单转换为可缓存、可收藏的 GET 地址"""
+    return url_for(endpoint,
+                   teacher_id=form['teacher_id'],
+                   start_year=form.get('start_year') or None,
+                   end_year=form.get('end_year') or None)
+
+def change_feed_url(teacher_ids, scopes):
+    """页面订阅数据变更推送的地址，关注的数据变化时页面自动重新加载；未启用推送时为 None"""
+    if change_broker.max_subscribers <= 0:
+        return None
+    return url_for('change_feed', teacher_ids=','.join(teacher_ids), scopes=','.join(scopes))
+
+def conditional_response(teacher_id, scopes, render):
+    """
+    按教师数据版本号生成 ETag/Last-Modified
+    数据未变化时直接返回 304，不执行业务查询也不渲染模板
+    render(versions) 返回 (页面, 是否可缓存)，查询失败的页面不缓存
+    """
+    success, versions = teacher_service.get_data_versions(teacher_id)
+    if not success:
+        return render(None)[0]
+
+    stamps = [versions[scope] for scope in scopes]
+    etag = hashlib.sha1(
+        f"{ETAG_SALT}|{request.full_path}|{[version for version, _ in stamps]}".encode('utf-8')
+    ).hexdigest()
+    updated = [updated_at for _, updated_at in stamps if updated_at is not None]
+    # 数据库会话时区为 UTC
+    last_modified = max(updated).replace(microsecond=0, tzinfo=timezone.utc) if updated else None
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (last_modified is not None and request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+
+    if not_modified:
+        response = make_response('', 304)
+    else:
+        body, cacheable = render(versions)
+        response = make_response(body)
+        if not cacheable:
+            return response
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # 允许浏览器缓存，但每次使用前都要重新验证
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# ========== 健康检查路由 ==========
+@app.route('/healthz')
+def healthz():
+    """存活探针：进程能处理请求即可，不访问数据库"""
+    return jsonify(status='ok', pid=os.getpid())
+
+@app.route('/readyz')
+def readyz():
+    """就绪探针：能从连接池取到可用的数据库连接才算就绪"""
+    try:
+        db_connector.ping()
+    except Exception as e:
+        return jsonify(status='unavailable', error=str(e)), 503
+    return jsonify(status='ready', pid=os.getpid())
+
 @app.route('/')
 def index():
     """首页 - 提供四个主要功能入口"""
@@ -98,16 +370,23 @@ def update_paper():
 def query_papers():
     """查询教师论文"""
     if request.method == 'POST':
-        teacher_id = request.form['teacher_id']
-        start_year = int(request.form['start_year']) if request.form['start_year'] else None
-        end_year = int(request.form['end_year']) if request.form['end_year'] else None
+        return redirect(query_url('query_papers', request.form), code=303)
+    
+    if request.args.get('teacher_id'):
+        teacher_id = request.args['teacher_id']
+        start_year = year_arg(request.args, 'start_year')
+        end_year = year_arg(request.args, 'end_year')
         
-        success, result = teacher_service.get_teacher_papers(teacher_id, start_year, end_year)
+        def render(versions):
+            table, error = render_fragment(
+                'papers/_query_table.html', 'papers', teacher_id, 'paper', versions, (start_year, end_year),
+                lambda: teacher_service.get_teacher_papers(teacher_id, start_year, end_year))
+            if error:
+                return render_template('papers/query.html', error=error), False
+            return render_template('papers/query_result.html', table=table,
+                                   change_feed_url=change_feed_url([teacher_id], ('paper',))), True
         
-        if success:
-            return render_template('papers/query_result.html', papers=result)
-        else:
-            return render_template('papers/query.html', error=result)
+        return conditional_response(teacher_id, ('paper',), render)
     
     return render_template('papers/query.html')
 
@@ -179,6 +458,55 @@ def list_paper_authors():
     
     return render_template('papers/list_authors.html')
 
+@app.route('/papers/stats')
+def paper_statistics():
+    """按 教师 / 年份 / 级别 / 类型 任意切片统计论文篇数"""
+    options = dict(level_text=PAPER_LEVEL_TEXT, type_text=PAPER_TYPE_TEXT, role_text=ROLE_TEXT)
+    group_by = request.args.getlist('group_by')
+    if not request.args.get('submitted'):
+        return render_template('papers/stats.html', group_by=['year'], **options)
+    
+    success, rows = publication_cube.slice(
+        group_by,
+        teacher_ids=teacher_ids_arg(request.args.get('teacher_ids')) or None,
+        start_year=year_arg(request.args, 'start_year'),
+        end_year=year_arg(request.args, 'end_year'),
+        levels=[int(level) for level in request.args.getlist('level')] or None,
+        types=[int(paper_type) for paper_type in request.args.getlist('type')] or None,
+        role=request.args.get('role') or None)
+    if not success:
+        return render_template('papers/stats.html', group_by=group_by, error=rows, **options)
+    return render_template('papers/stats.html', group_by=group_by, rows=rows,
+                           total=sum(row['count'] for row in rows), **options)
+
+@app.route('/papers/collaboration')
+def paper_collaboration():
+    """教师合作关系：合作者、合作距离和所在的合作群体"""
+    teacher_id = request.args.get('teacher_id')
+    target_id = request.args.get('target_id')
+    if not teacher_id:
+        success, components = collaboration_graph.components()
+        if not success:
+            return render_template('papers/collaboration.html', error=components)
+        return render_template('papers/collaboration.html', components=components,
+                               isolated=sum(1 for group in components if len(group) == 1),
+                               names=collaboration_graph.teacher_names)
+
+    success, collaborators = collaboration_graph.collaborators(teacher_id)
+    if not success:
+        return render_template('papers/collaboration.html', error=collaborators)
+    success, component = collaboration_graph.component(teacher_id)
+    if not success:
+        return render_template('papers/collaboration.html', error=component)
+    path = None
+    if target_id:
+        success, path = collaboration_graph.distance(teacher_id, target_id)
+        if not success:
+            return render_template('papers/collaboration.html', error=path)
+    return render_template('papers/collaboration.html', teacher_id=teacher_id, target_id=target_id,
+                           collaborators=collaborators, component=component, path=path,
+                           names=collaboration_graph.teacher_names)
+
 # ========== 项目相关路由 ==========
 @app.route('/projects')
 def projects_home():
@@ -261,19 +589,46 @@ def update_project():
 def query_projects():
     """查询教师项目"""
     if request.method == 'POST':
-        teacher_id = request.form['teacher_id']
-        start_year = int(request.form['start_year']) if request.form['start_year'] else None
-        end_year = int(request.form['end_year']) if request.form['end_year'] else None
+        return redirect(query_url('query_projects', request.form), code=303)
+    
+    if request.args.get('teacher_id'):
+        teacher_id = request.args['teacher_id']
+        start_year = year_arg(request.args, 'start_year')
+        end_year = year_arg(request.args, 'end_year')
         
-        success, result = teacher_service.get_teacher_projects(teacher_id, start_year, end_year)
+        def render(versions):
+            table, error = render_fragment(
+                'projects/_query_table.html', 'projects', teacher_id, 'project', versions, (start_year, end_year),
+                lambda: teacher_service.get_teacher_projects(teacher_id, start_year, end_year))
+            if error:
+                return render_template('projects/query.html', error=error), False
+            return render_template('projects/query_result.html', table=table,
+                                   change_feed_url=change_feed_url([teacher_id], ('project',))), True
         
-        if success:
-            return render_template('projects/query_result.html', projects=result)
-        else:
-            return render_template('projects/query.html', error=result)
+        return conditional_response(teacher_id, ('project',), render)
     
     return render_template('projects/query.html')
 
+@app.route('/projects/active')
+def active_projects():
+    """查询某段时间内在研的项目（起止年份与查询区间有交集）"""
+    start_year = year_arg(request.args, 'start_year')
+    end_year = year_arg(request.args, 'end_year')
+    teacher_id = request.args.get('teacher_id') or None
+    if start_year is None and end_year is None:
+        return render_template('projects/active.html')
+    if start_year is not None and end_year is not None and start_year > end_year:
+        return render_template('projects/active.html', error="开始年份不能晚于结束年份")
+    
+    success, project_ids = project_interval_index.overlapping(start_year, end_year, teacher_id)
+    if success:
+        success, projects = teacher_service.get_projects(project_ids)
+    else:
+        projects = project_ids
+    if not success:
+        return render_template('projects/active.html', error=projects)
+    return render_template('projects/active.html', projects=projects)
+
 @app.route('/projects/participants/add', methods=['GET', 'POST'])
 def add_project_participant():
     """添加项目参与者"""
@@ -328,6 +683,51 @@ def update_project_funding():
     
     return render_template('projects/update_funding.html')
 
+@app.route('/projects/participants/rebalance_funding', methods=['GET', 'POST'])
+def rebalance_project_funding():
+    """批量调整项目参与者经费分配"""
+    if request.method == 'POST':
+        data = request.form
+        allocation = {}
+
+        # 解析参与者经费
+        for i in range(1, int(data['participant_count']) + 1):
+            teacher_id = data[f'participant_{i}_id']
+            if teacher_id in allocation:
+                return render_template('projects/rebalance_funding.html', error="参与者不能重复")
+            allocation[teacher_id] = float(data[f'participant_{i}_funding'])
+
+        success, message = teacher_service.rebalance_project_funding(
+            project_id=data['project_id'],
+            allocation=allocation,
+            total_funding=float(data['total_funding']) if data.get('total_funding') else None
+        )
+
+        if success:
+            return redirect(url_for('projects_home'))
+        else:
+            return render_template('projects/rebalance_funding.html', error=message)
+
+    return render_template('projects/rebalance_funding.html')
+
+@app.route('/projects/funding')
+def project_funding_analytics():
+    """项目经费按年分摊后的逐年统计"""
+    group_by = request.args.get('group_by') or None
+    if not request.args.get('submitted'):
+        return render_template('projects/funding.html', profiles=PROFILES)
+    
+    success, profile = parse_profile(request.args.get('profile'))
+    if success:
+        teacher_ids = teacher_ids_arg(request.args.get('teacher_ids')) or None
+        success, result = teacher_service.get_funding_series(
+            group_by, year_arg(request.args, 'start_year'), year_arg(request.args, 'end_year'), profile, teacher_ids)
+    else:
+        result = profile
+    if not success:
+        return render_template('projects/funding.html', profiles=PROFILES, error=result)
+    return render_template('projects/funding.html', profiles=PROFILES, result=result, group_by=group_by)
+
 @app.route('/projects/participants/update_rank', methods=['GET', 'POST'])
 def update_project_participant_rank():
     """更新项目参与者排名"""
@@ -426,20 +826,64 @@ def remove_course():
     
     return render_template('courses/remove.html')
 
+@app.route('/courses/plan', methods=['GET', 'POST'])
+def plan_semester_courses():
+    """按整个学期的排课计划批量分配教学任务"""
+    if request.method == 'POST':
+        data = request.form
+        upload = request.files.get('plan_file')
+        text = upload.read().decode('utf-8-sig') if upload and upload.filename else data.get('plan', '')
+        ok, plan = parse_plan(text)
+        if not ok:
+            return render_template('courses/plan.html', error=plan, plan=text)
+
+        success, message = teacher_service.apply_semester_plan(
+            year=int(data['year']),
+            semester=int(data['semester']),
+            plan=plan
+        )
+
+        if success:
+            return render_template('courses/plan.html', message=message)
+        else:
+            return render_template('courses/plan.html', error=message, plan=text)
+
+    return render_template('courses/plan.html')
+
+@app.route('/courses/workload')
+def course_workload():
+    """按 教师 × 学期 × 课程类型 汇总某一年的教学工作量，含各级小计"""
+    year = year_arg(request.args, 'year')
+    group_by = request.args.getlist('group_by') or list(DIMENSIONS)
+    if year is None:
+        return render_template('courses/workload.html', group_by=group_by)
+
+    success, rows = workload_rollup.rows(year, group_by)
+    if not success:
+        return render_template('courses/workload.html', error=rows, year=year, group_by=group_by)
+    return render_template('courses/workload.html', rows=rows, year=year, group_by=group_by)
+
 @app.route('/courses/query', methods=['GET', 'POST'])
 def query_courses():
     """查询教师课程"""
     if request.method == 'POST':
-        teacher_id = request.form['teacher_id']
-        start_year = int(request.form['start_year']) if request.form['start_year'] else None
-        end_year = int(request.form['end_year']) if request.form['end_year'] else None
+        return redirect(query_url('query_courses', request.form), code=303)
+    
+    if request.args.get('teacher_id'):
+        teacher_id = request.args['teacher_id']
+        start_year = year_arg(request.args, 'start_year')
+        end_year = year_arg(request.args, 'end_year')
         
-        success, result = teacher_service.get_teacher_courses(teacher_id, start_year, end_year)
+        def render(versions):
+            table, error = render_fragment(
+                'courses/_query_table.html', 'courses', teacher_id, 'course', versions, (start_year, end_year),
+                lambda: teacher_service.get_teacher_courses(teacher_id, start_year, end_year))
+            if error:
+                return render_template('courses/query.html', error=error), False
+            return render_template('courses/query_result.html', table=table,
+                                   change_feed_url=change_feed_url([teacher_id], ('course',))), True
         
-        if success:
-            return render_template('courses/query_result.html', courses=result)
-        else:
-            return render_template('courses/query.html', error=result)
+        return conditional_response(teacher_id, ('course',), render)
     
     return render_template('courses/query.html')
 
@@ -448,50 +892,274 @@ def query_courses():
 def teacher_overview():
     """教师教学科研总览"""
     if request.method == 'POST':
-        teacher_id = request.form['teacher_id']
-        start_year = int(request.form['start_year']) if request.form['start_year'] else None
-        end_year = int(request.form['end_year']) if request.form['end_year'] else None
-        
-        # 查询教师基本信息
-        connection = db_connector.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM teacher WHERE teacher_id = %s", (teacher_id,))
-        teacher_info = cursor.fetchone()
-        cursor.close()
-        
-        if not teacher_info:
-            return render_template('overview.html', error="找不到指定的教师")
-        
-        # 转换枚举值为可读文本
-        gender_map = {1: "男", 2: "女"}
-        title_map = {
-            1: "博士后", 2: "助教", 3: "讲师", 4: "副教授", 5: "特任教授",
-            6: "教授", 7: "助理研究员", 8: "特任副研究员", 
-            9: "副研究员", 10: "特任研究员", 11: "研究员"
-        }
-        
-        teacher_info['gender_text'] = gender_map.get(teacher_info['gender'], "未知")
-        teacher_info['title_text'] = title_map.get(teacher_info['title'], "未知")
-        
-        # 查询论文信息
-        success_papers, papers = teacher_service.get_teacher_papers(teacher_id, start_year, end_year)
-        
-        # 查询项目信息
-        success_projects, projects = teacher_service.get_teacher_projects(teacher_id, start_year, end_year)
-        
-        # 查询课程信息
-        success_courses, courses = teacher_service.get_teacher_courses(teacher_id, start_year, end_year)
-        
-        return render_template('overview/result.html',
-                             teacher=teacher_info,
-                             papers=papers if success_papers else [],
-                             projects=projects if success_projects else [],
-                             courses=courses if success_courses else [],
-                             error_papers=None if success_papers else papers,
-                             error_projects=None if success_projects else projects,
-                             error_courses=None if success_courses else courses)
+        return redirect(query_url('teacher_overview', request.form), code=303)
+    
+    if request.args.get('teacher_id'):
+        teacher_id = request.args['teacher_id']
+        start_year = year_arg(request.args, 'start_year')
+        end_year = year_arg(request.args, 'end_year')
+        
+        def render(versions):
+            # 查询教师基本信息
+            success_teacher, teacher_info = teacher_service.get_teacher_info(teacher_id)
+            if not success_teacher:
+                return render_template('overview/index.html', error=teacher_info), False
+            
+            # 各部分独立缓存，某一部分数据变化时只重新查询和渲染该部分
+            years = (start_year, end_year)
+            sections = {}
+            errors = []
+            for name, scope, load in (
+                ('courses', 'course', lambda: teacher_service.get_teacher_courses(teacher_id, start_year, end_year)),
+                ('papers', 'paper', lambda: teacher_service.get_teacher_papers(teacher_id, start_year, end_year)),
+                ('projects', 'project', lambda: teacher_service.get_teacher_projects(teacher_id, start_year, end_year)),
+            ):
+                sections[name], error = render_fragment(
+                    f'overview/_{name}.html', name, teacher_id, scope, versions, years, load)
+                if error:
+                    errors.append(error)
+            
+            page = render_template('overview/result.html', teacher=teacher_info, sections=sections,
+                                   export_formats=available_formats(),
+                                   change_feed_url=change_feed_url([teacher_id], ('paper', 'project', 'course')))
+            return page, not errors
+        
+        return conditional_response(teacher_id, ('paper', 'project', 'course'), render)
     
     return render_template('overview/index.html')
 
+@app.route('/overview/export')
+def export_overview():
+    """在服务端生成教师总览文档（PDF / Excel）"""
+    teacher_id = request.args.get('teacher_id')
+    fmt = request.args.get('format', 'pdf')
+    if not teacher_id:
+        return render_template('overview/index.html', error="请输入教师ID")
+    if fmt not in available_formats():
+        return render_template('overview/index.html', error=f"服务器不支持导出该格式: {fmt}")
+    start_year = year_arg(request.args, 'start_year')
+    end_year = year_arg(request.args, 'end_year')
+    
+    success, data = overview_data(teacher_service, teacher_id, start_year, end_year)
+    if success:
+        success, data = document_renderer.render(fmt, data)
+    if not success:
+        return render_template('overview/index.html', error=data)
+    _, _, years = job_years({'start_year': start_year, 'end_year': end_year})
+    return send_file(BytesIO(data), mimetype=FORMATS[fmt][0], as_attachment=True,
+                     download_name=f"overview_{teacher_id}_{years}.{fmt}")
+
+@app.route('/api/export.arrow')
+def export_arrow():
+    """
+    以 Arrow IPC 流格式导出数据表（?table=paper）或服务层查询结果（?query=teacher_papers&teacher_id=...）
+    数据表按批从数据库读取、边读边发送
+    """
+    if not pyarrow_available():
+        return jsonify(error="服务器未安装 pyarrow，不支持 Arrow 导出"), 501
+    table = request.args.get('table')
+    query = request.args.get('query')
+    if table in DATASET_TABLES:
+        name = table
+        success, reader = table_reader(db_connector, table)
+    elif query in SERVICE_QUERIES:
+        teacher_id = request.args.get('teacher_id')
+        if not teacher_id:
+            return jsonify(error="请指定教师ID"), 400
+        start_year = year_arg(request.args, 'start_year')
+        end_year = year_arg(request.args, 'end_year')
+        name = f"{query}_{teacher_id}"
+        success, reader = getattr(teacher_service, SERVICE_QUERIES[query])(teacher_id, start_year, end_year)
+        if success:
+            success, reader = records_reader(reader)
+    else:
+        return jsonify(error="请指定数据表（table）或查询（query）",
+                       tables=list(DATASET_TABLES), queries=list(SERVICE_QUERIES)), 400
+    if not success:
+        return jsonify(error=reader), 500
+    response = Response(stream_with_context(ipc_stream(reader)), mimetype=MEDIA_TYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.arrow"'
+    return response
+
+@app.route('/api/changes')
+def change_feed():
+    """
+    数据变更推送（text/event-stream）：?teacher_ids=T001,T002&scopes=paper,project
+    关注的教师的论文/项目/课程数据提交修改后推送 change 事件，scopes 省略时为全部数据范围
+    """
+    teacher_ids = teacher_ids_arg(request.args.get('teacher_ids'))
+    if len(teacher_ids) > MAX_COMPARE_TEACHERS:
+        return jsonify(error=f"最多同时关注 {MAX_COMPARE_TEACHERS} 位教师"), 400
+    scopes = teacher_ids_arg(request.args.get('scopes')) or SCOPES
+    if not teacher_ids or set(scopes) - set(SCOPES):
+        return jsonify(error="请指定教师ID（teacher_ids）和数据范围（scopes）", scopes=list(SCOPES)), 400
+    success, subscription = change_broker.subscribe(teacher_ids, scopes, request.headers.get('Last-Event-ID'))
+    if not success:
+        # 连接数已满或正在关闭，浏览器按 Retry-After 稍后重连
+        response = jsonify(error=subscription)
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    # 不使用 stream_with_context：推送期间不保留请求上下文，也不占用数据库连接
+    response = Response(change_broker.events(subscription, max_duration=CHANGE_FEED_MAX_DURATION),
+                        mimetype='text/event-stream')
+    # 连接在开始推送之前就断开时生成器不会执行，由这里取消订阅
+    response.call_on_close(lambda: change_broker.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止 nginx 缓冲，事件立即送达浏览器
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/overview/compare', methods=['GET', 'POST'])
+def compare_teachers():
+    """多位教师教学科研情况对比"""
+    if request.method == 'POST':
+        return redirect(url_for('compare_teachers',
+                                teacher_ids=','.join(teacher_ids_arg(request.form.get('teacher_ids'))),
+                                start_year=request.form.get('start_year') or None,
+                                end_year=request.form.get('end_year') or None), code=303)
+    
+    if request.args.get('teacher_ids'):
+        teacher_ids = teacher_ids_arg(request.args['teacher_ids'])
+        if len(teacher_ids) > MAX_COMPARE_TEACHERS:
+            return render_template('overview/compare.html', error=f"最多同时对比 {MAX_COMPARE_TEACHERS} 位教师")
+        success, result = teacher_service.compare_teachers(
+            teacher_ids, year_arg(request.args, 'start_year'), year_arg(request.args, 'end_year'))
+        if not success:
+            return render_template('overview/compare.html', error=result)
+        return render_template('overview/compare.html', items=result,
+                               change_feed_url=change_feed_url(teacher_ids, SCOPES))
+    
+    return render_template('overview/compare.html')
+
+# ========== 后台任务 ==========
+JOB_KINDS = {'overview_report': "教师总览报表（HTML）", 'data_export': "多年数据导出（CSV 压缩包）"}
+# 每位教师一份文档的压缩包，只提供当前环境能生成的格式
+DOCUMENT_JOB_KINDS = {'overview_pdf': ('pdf', "教师总览文档（PDF 压缩包）"),
+                      'overview_xlsx': ('xlsx', "教师总览文档（Excel 压缩包）")}
+JOB_KINDS.update({kind: text for kind, (fmt, text) in DOCUMENT_JOB_KINDS.items() if fmt in available_formats()})
+
+def job_teachers(params):
+    """任务参数中的教师列表，未指定时为全部教师"""
+    success, teachers = teacher_service.list_teachers()
+    if not success:
+        raise RuntimeError(teachers)
+    if params.get('teacher_ids'):
+        by_id = {teacher['teacher_id']: teacher for teacher in teachers}
+        missing = [teacher_id for teacher_id in params['teacher_ids'] if teacher_id not in by_id]
+        if missing:
+            raise ValueError(f"找不到教师: {', '.join(missing)}")
+        teachers = [by_id[teacher_id] for teacher_id in params['teacher_ids']]
+    return teachers
+
+def job_years(params):
+    start_year, end_year = params.get('start_year'), params.get('end_year')
+    if start_year is None and end_year is None:
+        return start_year, end_year, "all"
+    return start_year, end_year, f"{'' if start_year is None else start_year}-{'' if end_year is None else end_year}"
+
+def overview_report_job(params, progress):
+    """全院（或指定教师）的教学科研总览，生成一个 HTML 文件"""
+    try:
+        teachers = job_teachers(params)
+        start_year, end_year, years = job_years(params)
+        reports = []
+        for i, teacher in enumerate(teachers, 1):
+            success, teacher_info = teacher_service.get_teacher_info(teacher['teacher_id'])
+            if not success:
+                raise RuntimeError(teacher_info)
+            sections = {}
+            with app.app_context():
+                for name, load in (
+                    ('courses', teacher_service.get_teacher_courses),
+                    ('papers', teacher_service.get_teacher_papers),
+                    ('projects', teacher_service.get_teacher_projects),
+                ):
+                    success, result = load(teacher['teacher_id'], start_year, end_year)
+                    key = name if success else f'error_{name}'
+                    sections[name] = Markup(render_template(f'overview/_{name}.html', **{key: result}))
+            reports.append({'teacher': teacher_info, 'sections': sections})
+            progress(i, len(teachers), f"已完成 {i}/{len(teachers)} 位教师")
+        with app.app_context():
+            page = render_template('overview/report.html', reports=reports, start_year=start_year, end_year=end_year)
+        return f"overview_{years}.html", page.encode('utf-8')
+    finally:
+        db_connector.release_connection()
+
+def data_export_job(params, progress):
+    """多位教师、多个年份的教学、论文、项目数据导出为 CSV 压缩包"""
+    try:
+        teachers = job_teachers(params)
+        start_year, end_year, years = job_years(params)
+        return f"export_{years}.zip", export_zip(teacher_service, teachers, start_year, end_year, progress)
+    finally:
+        db_connector.release_connection()
+
+def overview_documents_job(fmt):
+    """每位教师一份总览文档，在渲染进程池中并行生成后打包为 zip"""
+    def handler(params, progress):
+        try:
+            teachers = job_teachers(params)
+            start_year, end_year, years = job_years(params)
+            documents = []
+            for teacher in teachers:
+                success, data = overview_data(teacher_service, teacher['teacher_id'], start_year, end_year)
+                if not success:
+                    raise RuntimeError(data)
+                documents.append((f"overview_{teacher['teacher_id']}_{teacher['name']}.{fmt}", data))
+        finally:
+            db_connector.release_connection()
+        return f"overview_{fmt}_{years}.zip", document_renderer.render_zip(fmt, documents, progress)
+    return handler
+
+job_queue.register('overview_report', overview_report_job)
+job_queue.register('data_export', data_export_job)
+for kind, (fmt, _) in DOCUMENT_JOB_KINDS.items():
+    job_queue.register(kind, overview_documents_job(fmt))
+
+@app.route('/jobs', methods=['GET', 'POST'])
+def jobs_home():
+    """提交后台报表任务，查看最近的任务"""
+    if request.method == 'POST':
+        data = request.form
+        if data.get('kind') not in JOB_KINDS:
+            return render_template('jobs/index.html', kinds=JOB_KINDS, jobs=job_queue.recent(), error="未知的任务类型")
+        teacher_ids = teacher_ids_arg(data.get('teacher_ids'))
+        job_id = job_queue.submit(data['kind'], {
+            'teacher_ids': teacher_ids,
+            'start_year': year_arg(data, 'start_year'),
+            'end_year': year_arg(data, 'end_year'),
+        })
+        return redirect(url_for('job_detail', job_id=job_id), code=303)
+
+    return render_template('jobs/index.html', kinds=JOB_KINDS, jobs=job_queue.recent())
+
+@app.route('/jobs/<job_id>')
+def job_detail(job_id):
+    """任务进度页面，页面定时查询任务状态"""
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return render_template('jobs/detail.html', job=job, kind_text=JOB_KINDS.get(job['kind'], job['kind']))
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    """任务状态（JSON）"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error="任务不存在"), 404
+    return jsonify(job_id=job['job_id'], status=job['status'], status_text=job['status_text'],
+                   progress=job['progress'], message=job['message'],
+                   download_url=url_for('job_download', job_id=job_id) if job['status'] == 'done' else None)
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    """下载已完成任务的结果文件"""
+    job = job_queue.get(job_id)
+    path = job_queue.result_path(job) if job else None
+    if path is None or not os.path.exists(path):
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=job['result_name'])
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
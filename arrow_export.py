@@ -0,0 +1,225 @@
+"""
+列式数据导出（Arrow / Parquet）
+把教学科研数据表，或任意 TeacherService 查询结果，转换为 Arrow 记录批次：
+可以写成 Parquet 文件，也可以通过 /api/export.arrow 以 Arrow IPC 流格式下载，
+分析工具直接按列读取，保留整数、浮点、布尔等类型，不需要解析 CSV。
+
+数据表按批从数据库游标读取并逐批输出，内存占用只与批大小有关，与表的行数无关。
+pyarrow 为可选依赖，未安装时本功能不可用。
+
+导出 Parquet 文件:
+    python arrow_export.py --output-dir export
+"""
+import argparse
+import io
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# 每批读取和输出的行数
+BATCH_SIZE = 10000
+
+MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# 可以导出的数据表: 表名 -> (查询, [(列名, Arrow 类型)])
+# 已删除（尚未清理）的论文和项目及其作者/参与者不导出；作者/参与者导出连续排名而不是内部的排名键
+DATASET_TABLES = {
+    'teacher': (
+        "SELECT teacher_id, name, gender, title FROM teacher ORDER BY teacher_id",
+        [('teacher_id', 'string'), ('name', 'string'), ('gender', 'int8'), ('title', 'int8')],
+    ),
+    'paper': (
+        "SELECT paper_id, title, journal, pub_year, paper_type, paper_level FROM paper "
+        "WHERE deleted_at IS NULL ORDER BY paper_id",
+        [('paper_id', 'string'), ('title', 'string'), ('journal', 'string'), ('pub_year', 'int16'),
+         ('paper_type', 'int8'), ('paper_level', 'int8')],
+    ),
+    'paper_author': (
+        "SELECT pa.paper_id, pa.teacher_id, "
+        "ROW_NUMBER() OVER (PARTITION BY pa.paper_id ORDER BY pa.author_rank_key) AS author_rank, "
+        "pa.is_corresponding "
+        "FROM paper_author pa JOIN paper p ON pa.paper_id = p.paper_id "
+        "WHERE p.deleted_at IS NULL ORDER BY pa.paper_id, pa.author_rank_key",
+        [('paper_id', 'string'), ('teacher_id', 'string'), ('author_rank', 'int32'), ('is_corresponding', 'bool_')],
+    ),
+    'project': (
+        "SELECT project_id, project_name, project_source, project_type, start_year, end_year, total_funding "
+        "FROM project WHERE deleted_at IS NULL ORDER BY project_id",
+        [('project_id', 'string'), ('project_name', 'string'), ('project_source', 'string'),
+         ('project_type', 'int8'), ('start_year', 'int16'), ('end_year', 'int16'), ('total_funding', 'float64')],
+    ),
+    'project_participant': (
+        "SELECT pp.project_id, pp.teacher_id, "
+        "ROW_NUMBER() OVER (PARTITION BY pp.project_id ORDER BY pp.participant_rank_key) AS participant_rank, "
+        "pp.funding "
+        "FROM project_participant pp JOIN project p ON pp.project_id = p.project_id "
+        "WHERE p.deleted_at IS NULL ORDER BY pp.project_id, pp.participant_rank_key",
+        [('project_id', 'string'), ('teacher_id', 'string'), ('participant_rank', 'int32'), ('funding', 'float64')],
+    ),
+    'course': (
+        "SELECT course_id, course_name, total_hours, course_type FROM course ORDER BY course_id",
+        [('course_id', 'string'), ('course_name', 'string'), ('total_hours', 'int32'), ('course_type', 'int8')],
+    ),
+    'course_teaching': (
+        "SELECT course_id, teacher_id, course_year, semester, teaching_hours FROM course_teaching "
+        "ORDER BY course_year, semester, course_id, teacher_id",
+        [('course_id', 'string'), ('teacher_id', 'string'), ('course_year', 'int16'), ('semester', 'int8'),
+         ('teaching_hours', 'int32')],
+    ),
+}
+
+# 可以导出的服务层查询: 名称 -> TeacherService 方法名（参数为 teacher_id, start_year, end_year）
+SERVICE_QUERIES = {
+    'teacher_courses': 'get_teacher_courses',
+    'teacher_papers': 'get_teacher_papers',
+    'teacher_projects': 'get_teacher_projects',
+}
+
+# 数据库返回的值需要先转换的列类型（DECIMAL -> float，TINYINT -> bool）
+_CONVERTERS = {'float64': float, 'bool_': bool}
+
+
+def pyarrow_available():
+    return pa is not None
+
+
+def table_reader(db_connector, table, batch_size=BATCH_SIZE):
+    """
+    按批读取数据表，返回 (success, pyarrow.RecordBatchReader 或错误信息)
+    查询在返回前执行（出错时直接返回失败），数据在读取记录批次时才逐批从游标取出
+    """
+    if pa is None:
+        return False, "未安装 pyarrow，无法导出 Arrow / Parquet 格式"
+    if table not in DATASET_TABLES:
+        return False, f"未知的数据表: {table}"
+    query, columns = DATASET_TABLES[table]
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+    try:
+        connection = db_connector.get_connection(readonly=True)
+        cursor = connection.cursor()
+    except Exception as e:
+        return False, f"读取数据表失败: {str(e)}"
+    try:
+        cursor.execute(query)
+    except Exception as e:
+        cursor.close()
+        return False, f"读取数据表失败: {str(e)}"
+
+    def batches():
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield _record_batch(schema, columns, rows)
+        finally:
+            # 提前结束（例如下载中断）时丢弃未读取的结果，连接才能继续使用
+            if getattr(connection, 'unread_result', False):
+                connection.consume_results()
+            cursor.close()
+
+    return True, pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def records_reader(records, batch_size=BATCH_SIZE):
+    """
+    把服务层查询结果（字典列表，例如 get_teacher_papers 的返回值）转换为 RecordBatchReader
+    列类型由 Arrow 根据全部数据推断；返回 (success, reader 或错误信息)
+    """
+    if pa is None:
+        return False, "未安装 pyarrow，无法导出 Arrow / Parquet 格式"
+    table = pa.Table.from_pylist(records)
+    return True, pa.RecordBatchReader.from_batches(table.schema, table.to_batches(batch_size))
+
+
+def _record_batch(schema, columns, rows):
+    arrays = []
+    for (_, type_name), field, values in zip(columns, schema, zip(*rows)):
+        convert = _CONVERTERS.get(type_name)
+        if convert is not None:
+            values = [None if value is None else convert(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# ========== 输出 ==========
+def ipc_stream(reader):
+    """把记录批次编码为 Arrow IPC 流格式，每批生成一段字节（用于 HTTP 流式响应）"""
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            yield _drain(buffer)
+    # 流结束标记
+    yield _drain(buffer)
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def write_parquet(reader, path, compression='zstd'):
+    """把记录批次逐批写入 Parquet 文件（先写临时文件，完成后原子替换），返回行数"""
+    tmp_path = f"{path}.tmp"
+    rows = 0
+    try:
+        with pq.ParquetWriter(tmp_path, reader.schema, compression=compression) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return rows
+
+
+def export_parquet(db_connector, output_dir, tables=None, batch_size=BATCH_SIZE):
+    """把数据表导出为 output_dir/<表名>.parquet，返回 (success, {表名: 行数} 或错误信息)"""
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {}
+    for table in tables or DATASET_TABLES:
+        success, reader = table_reader(db_connector, table, batch_size)
+        if not success:
+            return False, reader
+        counts[table] = write_parquet(reader, os.path.join(output_dir, f"{table}.parquet"))
+    return True, counts
+
+
+def main(argv=None):
+    from app import DB_CONFIG
+    from db_connector import DatabaseConnector
+
+    parser = argparse.ArgumentParser(description="把教学科研数据导出为 Parquet 文件")
+    parser.add_argument('--output-dir', default='export')
+    parser.add_argument('--tables', default=','.join(DATASET_TABLES),
+                        help="逗号分隔的表名（默认全部: %(default)s）")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    db_connector = DatabaseConnector()
+    db_connector.connect(host=DB_CONFIG['host'], database=DB_CONFIG['database'],
+                         user=DB_CONFIG['user'], password=DB_CONFIG['password'])
+    try:
+        success, result = export_parquet(db_connector, args.output_dir,
+                                         [table.strip() for table in args.tables.split(',') if table.strip()],
+                                         args.batch_size)
+    finally:
+        db_connector.disconnect()
+    if not success:
+        raise SystemExit(result)
+    for table, count in result.items():
+        print(f"{table}: {count} 行")
+    print(f"已导出到 {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+审计日志
+记录谁在什么时候修改了论文作者排名、项目参与者排名和经费、课程教学学时，以及修改前后的值。
+
+服务层在写事务中记下审计信息，事务提交后和其他事件一起交给监听器（见 TeacherService._audit）；
+这里的监听器只把记录放进内存中的有界队列，由后台线程每隔 flush_interval 秒成批写出，
+写操作本身不等待任何审计写入。写出目标可以是本地的追加式日志文件（JSON Lines，按大小轮转），
+也可以是 MySQL 中的 audit_log 表。
+
+队列满时（写出跟不上或写出目标不可用），写操作最多等待 put_timeout 秒，之后丢弃该条记录并计数；
+写出失败的批次保留下来稍后重试。进程退出时（close）先写完队列中的全部记录，
+仍然无法写出时把记录输出到标准错误，不会悄无声息地丢失。
+"""
+import datetime
+import fcntl
+import json
+import os
+import queue
+import sys
+import threading
+
+
+class FileAuditSink:
+    """追加写入 JSON Lines 文件，超过 max_bytes 时轮转为 .1 .. .backup_count（多个进程可以写同一个文件）"""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=10):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def write(self, records):
+        data = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                # 文件锁让各进程的写入和轮转串行执行
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # 加锁之前文件可能已被其他进程轮转，重新打开
+                if not os.path.exists(self.path) or os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino:
+                    continue
+                f.write(data)
+                f.flush()
+                if f.tell() >= self.max_bytes:
+                    self._rotate()
+                return
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class MySQLAuditSink:
+    """写入 audit_log 表（见 migrations.py），每批一条多行 INSERT"""
+
+    def __init__(self, db_connector):
+        self.db = db_connector
+
+    def write(self, records):
+        try:
+            connection = self.db.get_connection()
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(
+                    "INSERT INTO audit_log (created_at, actor, client, action, entity, entity_key, before_value, "
+                    "after_value) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    [(record['time'], record['actor'], record['client'], record['action'], record['entity'],
+                      _json(record['key']), _json(record['before']), _json(record['after']))
+                     for record in records]
+                )
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            # 两批之间不占用连接池
+            self.db.release_connection()
+
+
+def _json(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False, default=str)
+
+
+class AuditLog:
+    """审计记录的有界队列和后台写出线程（每个进程一份）"""
+
+    def __init__(self, sink, queue_size=10000, batch_size=500, flush_interval=1.0, put_timeout=1.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        # 队列满而丢弃的记录数
+        self.dropped = 0
+        self._queue = queue.Queue(queue_size)
+        self._local = threading.local()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def set_actor(self, actor, client=None):
+        """设置当前线程后续写操作的操作者（例如登录用户）和客户端地址，每个请求开始时调用"""
+        self._local.actor = actor
+        self._local.client = client
+
+    def on_write(self, event, data):
+        """TeacherService 的监听器：在执行写操作的线程中把审计信息放入队列"""
+        if event != 'audit':
+            return
+        self.record(dict(data, actor=getattr(self._local, 'actor', None),
+                         client=getattr(self._local, 'client', None)))
+
+    def record(self, record):
+        """放入一条审计记录（补上 UTC 时间），队列满时最多等待 put_timeout 秒"""
+        record.setdefault('time', datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None))
+        self.start()
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"审计队列已满，丢弃记录: {json.dumps(record, ensure_ascii=False, default=str)}", file=sys.stderr)
+
+    def start(self):
+        """启动本进程的写出线程（已启动时只比较一次进程号）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._loop, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=10):
+        """写完队列中的全部记录后停止写出线程"""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        # 线程未启动（或没有及时结束）时由当前线程写出剩余的记录
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                return
+            self._write(batch, final=True)
+
+    def _take(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        pending = []
+        while True:
+            stopping = self._stopping.is_set()
+            if not pending:
+                try:
+                    pending.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    if stopping:
+                        return
+                    continue
+                # 等待一个写出间隔，把这段时间内的记录合成一批（停止时不等待）
+                self._stopping.wait(self.flush_interval)
+            pending.extend(self._take(self.batch_size - len(pending)))
+            if self._write(pending, final=stopping):
+                pending = []
+            else:
+                # 写出失败，保留这一批稍后重试
+                self._stopping.wait(self.flush_interval)
+
+    def _write(self, batch, final=False):
+        """写出一批记录，返回是否成功；final 为 True 时写出失败的记录输出到标准错误"""
+        if not batch:
+            return True
+        try:
+            self.sink.write(batch)
+            return True
+        except Exception as e:
+            print(f"写入审计日志失败: {str(e)}", file=sys.stderr)
+            if not final:
+                return False
+        for record in batch:
+            print(f"未写入的审计记录: {json.dumps(record, ensure_ascii=False, default=str)}", file=sys.stderr)
+        return True
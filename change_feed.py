@@ -0,0 +1,253 @@
+"""
+数据变更推送（Server-Sent Events）
+总览和查询页面以前只能靠手动刷新发现数据变化，每次刷新都要重新执行全部查询。
+这里的 ChangeBroker 通过 TeacherService 的监听器收到本进程每个写事务提交后的事件
+（数据范围、论文/项目/课程ID、涉及的教师），转发给订阅了这些教师的页面；
+页面收到事件后再重新加载，重新加载时数据未变化的部分由 ETag 和片段缓存直接返回。
+
+其他进程的写操作没有进程内事件，通过变更日志发现（见 changelog.py）。
+本进程的写操作随后也会在变更日志中被再次读到，页面可能收到两次事件，第二次重新加载会得到 304。
+
+事件编号由进程标识、递增序号和时间组成，最近的事件保留在内存中。连接建立时和每次心跳都会发送一个只有编号的消息，
+浏览器断线重连时通过 Last-Event-ID 带回最后的编号：同一进程且事件仍在内存中时补发遗漏的事件，
+否则（重连到了其他进程、进程已重启、事件已被挤出）按编号中的时间查询数据版本号，
+关注的教师此后有变化时发送一个不带ID的事件。订阅者的队列已满时丢弃积压的事件，发送 reset，页面直接重新加载。
+
+每个 SSE 连接在整个持续期间占用一个请求线程，因此每个进程限制同时打开的连接数，
+每个连接最多保持 max_duration 秒，之后由浏览器自动重连。
+"""
+import collections
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+from changelog import ChangeLogWatch
+from version_watch import EPOCH
+
+SCOPES = ('paper', 'project', 'course')
+# 内存中保留的最近事件数，用于断线重连后补发
+HISTORY_SIZE = 256
+# 浏览器断线后重连前等待的毫秒数
+RETRY_MILLISECONDS = 3000
+# 按时间补发时往前多查的时间（版本号的 updated_at 是语句执行时间而不是提交时间，且各服务器时钟可能有偏差）
+CATCH_UP_LOOKBACK = datetime.timedelta(seconds=30)
+
+
+class Subscription:
+    """一个 SSE 连接的订阅：关注的教师、数据范围和待发送的事件"""
+
+    def __init__(self, teacher_ids, scopes, queue_size):
+        self.teacher_ids = frozenset(teacher_ids)
+        self.scopes = frozenset(scopes)
+        self.queue = queue.Queue(queue_size)
+        # 队列已满丢弃过事件，下次发送 reset
+        self.overflowed = False
+
+    def matches(self, scope, teacher_ids):
+        """返回事件涉及的、本订阅关注的教师（不关注时为空列表）"""
+        if scope not in self.scopes:
+            return []
+        return [teacher_id for teacher_id in teacher_ids if teacher_id in self.teacher_ids]
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class ChangeBroker:
+    """进程内的数据变更事件分发（每个进程一份，线程安全）"""
+
+    def __init__(self, teacher_service, sync_interval=2, queue_size=100, max_subscribers=2):
+        self.service = teacher_service
+        self.sync_interval = sync_interval
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        # 事件编号的前缀，区分不同进程（以及进程重启前后）的编号
+        self._token = f"{os.getpid():x}{int(time.time() * 1000):x}"
+        self._seq = 0
+        # (编号, 数据范围, 论文/项目/课程ID, 教师)
+        self._history = collections.deque(maxlen=HISTORY_SIZE)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._watch = ChangeLogWatch(teacher_service, sync_interval)
+        teacher_service.add_listener(self._on_write)
+
+    # ========== 订阅 ==========
+    def subscribe(self, teacher_ids, scopes=SCOPES, last_event_id=None):
+        """
+        订阅指定教师在指定数据范围内的变更，返回 (success, Subscription 或错误信息)
+        提供 last_event_id 时先补发该编号之后的事件
+        """
+        teacher_ids = set(teacher_ids)
+        scopes = set(scopes)
+        if not teacher_ids:
+            return False, "请指定教师ID"
+        unknown = scopes - set(SCOPES)
+        if unknown:
+            return False, f"未知的数据范围: {', '.join(sorted(unknown))}"
+        if self._closed.is_set():
+            return False, "服务正在关闭"
+        subscription = Subscription(teacher_ids, scopes or SCOPES, self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return False, "变更推送连接数已达上限"
+            missed = self._missed_since(last_event_id) if last_event_id else []
+            for seq, scope, ids, event_teachers in missed or ():
+                event = self._event(subscription, seq, scope, ids, event_teachers)
+                if event is not None:
+                    subscription.put(event)
+            self._subscribers.add(subscription)
+        if missed is None:
+            # 已经加入订阅者之后再查询版本号，查询期间发生的变更不会遗漏
+            self._catch_up(subscription, last_event_id)
+        return True, subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _event_id(self, seq):
+        return f"{self._token}.{seq}.{int(time.time() * 1000)}"
+
+    def _missed_since(self, last_event_id):
+        """内存中 last_event_id 之后的事件；编号不是本进程的、或遗漏的事件已不在内存中时返回 None"""
+        token, _, rest = last_event_id.partition('.')
+        seq = rest.partition('.')[0]
+        if token != self._token or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq or (self._history and seq < self._history[0][0] - 1):
+            return None
+        return [item for item in self._history if item[0] > seq]
+
+    def _catch_up(self, subscription, last_event_id):
+        """按编号中的时间查询数据版本号，关注的教师此后有变化时放入不带ID的事件；编号无法识别时放入 reset"""
+        stamp = last_event_id.rpartition('.')[2]
+        if not stamp.isdigit():
+            subscription.put(('reset', None, None))
+            return
+        since = EPOCH + datetime.timedelta(milliseconds=int(stamp)) - CATCH_UP_LOOKBACK
+        for scope in sorted(subscription.scopes):
+            success, changes = self.service.get_changed_teachers(scope, since)
+            if not success:
+                subscription.put(('reset', None, None))
+                return
+            matched = subscription.matches(scope, sorted({teacher_id for teacher_id, _, _ in changes}))
+            if matched:
+                with self._lock:
+                    event_id = self._event_id(self._seq)
+                subscription.put(('change', event_id, {'scope': scope, 'ids': [], 'teacher_ids': matched}))
+
+    # ========== 发布 ==========
+    def publish(self, scope, teacher_ids, ids=()):
+        """把一次数据变更分发给关注相关教师的订阅者"""
+        ids = list(ids)
+        teacher_ids = sorted(set(teacher_ids))
+        with self._lock:
+            self._seq += 1
+            self._history.append((self._seq, scope, ids, teacher_ids))
+            for subscription in self._subscribers:
+                event = self._event(subscription, self._seq, scope, ids, teacher_ids)
+                if event is not None:
+                    subscription.put(event)
+
+    def _event(self, subscription, seq, scope, ids, teacher_ids):
+        matched = subscription.matches(scope, teacher_ids)
+        if not matched:
+            return None
+        return 'change', self._event_id(seq), {'scope': scope, 'ids': ids, 'teacher_ids': matched}
+
+    def _on_write(self, event, data):
+        if event in SCOPES:
+            self.publish(event, data['teacher_ids'], data.get('ids', ()))
+
+    def sync(self):
+        """检查其他进程的写操作（最多每 sync_interval 秒查询一次数据库），发布新的变更"""
+        for change in self._watch.poll():
+            if change['scope'] in SCOPES:
+                self.publish(change['scope'], change['teacher_ids'], change['ids'])
+
+    # ========== SSE 输出 ==========
+    def events(self, subscription, keepalive=15, max_duration=300):
+        """
+        生成 SSE 格式的文本，直到连接持续 max_duration 秒、服务关闭或客户端断开
+        没有事件时每 keepalive 秒发送一个只有编号的消息，避免代理断开空闲连接，同时更新浏览器记录的编号
+        """
+        started_at = last_sent = time.monotonic()
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n{self._position()}"
+            while not self._closed.is_set():
+                now = time.monotonic()
+                if now - started_at >= max_duration:
+                    return
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    self._drain(subscription)
+                    yield _format(('reset', None, None))
+                    last_sent = now
+                    continue
+                try:
+                    event = subscription.queue.get(timeout=min(self.sync_interval, keepalive))
+                except queue.Empty:
+                    event = None
+                if event is not None:
+                    yield _format(event)
+                    last_sent = time.monotonic()
+                    continue
+                if self._closed.is_set():
+                    return
+                try:
+                    self.sync()
+                finally:
+                    # 等待事件期间不占用连接池
+                    self.service.db.release_connection()
+                if time.monotonic() - last_sent >= keepalive:
+                    yield self._position()
+                    last_sent = time.monotonic()
+        finally:
+            self.unsubscribe(subscription)
+
+    def _position(self):
+        """只有编号、没有数据的消息：浏览器不触发事件，只记录编号，重连时据此补发"""
+        with self._lock:
+            return f"id: {self._event_id(self._seq)}\n\n"
+
+    @staticmethod
+    def _drain(subscription):
+        while True:
+            try:
+                subscription.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        """关闭全部 SSE 连接（浏览器随后会重连到其他 worker）"""
+        self._closed.set()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            # 唤醒正在等待事件的连接
+            try:
+                subscription.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+
+def _format(event):
+    name, event_id, data = event
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
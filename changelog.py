@@ -0,0 +1,157 @@
+"""
+变更日志消费
+每个写事务在提交前向 change_log 追加一行（数据范围、写操作名称、论文/项目/课程ID、涉及的教师），
+与数据修改一起提交或回滚，不会出现数据已修改而日志缺失的情况（outbox 模式）。
+派生数据按 change_id 顺序读取日志增量更新，不需要全量重建：
+
+- ChangeLogWatch：进程内的内存数据使用，不保存位点，从第一次检查时的最新变更开始，
+  接口与 VersionWatch 相同（poll() 返回上次检查以来的变化），但能得到每次修改的ID；
+- ChangeLogTailer：持久消费者使用，位点保存在 change_log_offset 表中，进程重启后从上次的位置继续。
+  每批变更与位点在同一个事务中处理（见 TeacherService.consume_changes），处理函数用同一个 cursor
+  写入的派生数据与位点一起提交；同名消费者可以在多个进程中运行，同一时刻只有一个进程在处理。
+  进程内的缓存也可以注册为按进程区分的消费者（per_process），例如工作量汇总（见 workload_rollup.py）。
+
+归档年份分区（migrations.py archive）产生的变更日志不列出ID（ids 为空列表），只列出涉及的教师。
+已处理且超过保留期的日志由清理线程删除（见 purger.py）；长时间没有运行的消费者不会阻止清理，
+它恢复后从最新的变更重新开始。
+"""
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+from teacher_service import CHANGE_LOG_BATCH_SIZE
+
+
+class ChangeLogWatch:
+    """按 change_id 顺序读取新的变更（不保存位点，线程安全，最多每 interval 秒查询一次）"""
+
+    def __init__(self, service, interval=2, batch_size=CHANGE_LOG_BATCH_SIZE):
+        self.service = service
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._synced_at = 0
+        # 已读取到的 change_id，第一次检查之前为 None
+        self._after = None
+
+    def poll(self):
+        """
+        返回自上次检查以来的新变更（按 change_id 排序，格式见 TeacherService.get_changes）
+        第一次检查只记录位置；未到检查时间、其他线程正在检查或查询失败时返回空列表
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._synced_at < self.interval:
+                return []
+            self._synced_at = now
+        # 同一时刻只有一个线程读取，避免重复返回同一批变更
+        if not self._poll_lock.acquire(blocking=False):
+            return []
+        try:
+            if self._after is None:
+                success, tail = self.service.get_change_log_tail()
+                if success:
+                    self._after = tail
+                return []
+            changes = []
+            while True:
+                success, batch = self.service.get_changes(self._after, self.batch_size)
+                if not success:
+                    break
+                changes.extend(batch)
+                if batch:
+                    self._after = batch[-1]['change_id']
+                if len(batch) < self.batch_size:
+                    break
+            return changes
+        finally:
+            self._poll_lock.release()
+
+
+class ChangeLogTailer:
+    """持久消费者的后台处理线程（每个进程一份）"""
+
+    def __init__(self, teacher_service, interval=2, batch_size=CHANGE_LOG_BATCH_SIZE):
+        self.service = teacher_service
+        self.interval = interval
+        self.batch_size = batch_size
+        # 消费者名称 -> (handler, from_start, per_process)
+        self._consumers = {}
+        # 按进程区分的消费者在本进程中的位点名称
+        self._names = {}
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def add_consumer(self, name, handler, from_start=False, per_process=False):
+        """
+        注册持久消费者，handler(cursor, changes) 在位点所在的事务中处理一批变更
+        handler 可能对同一批变更执行多次（事务回滚或重试时），派生数据应写入同一个 cursor，或者处理幂等
+        from_start 为 True 时新消费者从日志中最早的变更开始，否则从注册后第一次运行时的最新变更之后开始；
+        从最新的变更开始（包括位点过期后重新开始）时 changes 为 None，消费者应重新加载派生数据
+        per_process 为 True 时每个进程使用自己的位点（名称后加上主机名、进程号），用于进程内的缓存
+        """
+        self._consumers[name] = (handler, from_start, per_process)
+
+    def start(self):
+        """启动本进程的处理线程（没有消费者或 interval 不大于 0 时不启动）"""
+        if not self._consumers or self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._names = {}
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._loop, name="changelog-tailer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """停止处理线程，等待进行中的一批结束"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        """
+        各消费者分批处理积压的变更，直到追上日志末尾或被停止
+        返回 (success, {消费者: 处理的变更数} 或错误信息)；一个消费者出错不影响其他消费者
+        """
+        processed = {}
+        errors = []
+        for name, (handler, from_start, per_process) in list(self._consumers.items()):
+            processed[name] = 0
+            consumer = self._consumer_name(name) if per_process else name
+            while not self._stopping.is_set():
+                try:
+                    success, count = self.service.consume_changes(consumer, handler, self.batch_size, from_start)
+                finally:
+                    # 等待期间不占用连接池
+                    self.service.db.release_connection()
+                if not success:
+                    errors.append(f"{name}: {count}")
+                    break
+                processed[name] += count
+                if count < self.batch_size:
+                    break
+        if errors:
+            return False, "; ".join(errors)
+        return True, processed
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            success, result = self.run()
+            if not success:
+                print(f"处理变更日志失败: {result}", file=sys.stderr)
+            self._stopping.wait(self.interval)
+
+    def _consumer_name(self, name):
+        """本进程的位点名称（不超过 64 个字符），随机后缀避免进程号重复使用时接上已退出进程的位点"""
+        if name not in self._names:
+            self._names[name] = f"{name}@{socket.gethostname()[:24]}:{os.getpid()}:{uuid.uuid4().hex[:6]}"[-64:]
+        return self._names[name]
@@ -0,0 +1,273 @@
+"""
+教师合作关系图
+以教师为节点、共同发表的论文（可选再加上共同参与的项目）为边，在内存中维护一张带权无向图，
+支持查询合作者及合作次数、两位教师之间的合作距离（最短合作链）和连通分量。
+
+图以 CSR 数组保存：第 i 位教师的合作者为 indices[indptr[i]:indptr[i + 1]]，
+对应的合作次数在 weights 的同一区间。写操作后只重新统计涉及教师的边，
+修改过的行先放在覆盖层（字典）中，覆盖层足够大时再整体压缩回数组。
+
+与 workload_rollup.py 相同，本进程的写操作由 TeacherService 的监听器记下涉及的教师，
+下一次查询时再增量更新；其他进程的写操作通过数据版本号发现（见 version_watch.py）。
+"""
+import threading
+from array import array
+from collections import deque
+
+from version_watch import VersionWatch
+
+# 覆盖层中的行数超过节点数的该比例（且不少于 COMPACT_MIN_ROWS）时压缩回 CSR 数组
+COMPACT_RATIO = 0.1
+COMPACT_MIN_ROWS = 64
+
+
+class CollaborationGraph:
+    """教师合作关系图（每个进程一份，线程安全，第一次查询时加载）"""
+
+    def __init__(self, teacher_service, sources=('paper',), sync_interval=5):
+        self.service = teacher_service
+        self.sources = tuple(sources)
+        self.teacher_names = {}
+        # 节点编号 <-> 教师ID
+        self._ids = []
+        self._index = {}
+        self._indptr = array('l', [0])
+        self._indices = array('l')
+        self._weights = array('l')
+        # 节点编号 -> {合作者编号: 合作次数}，优先于 CSR 数组中的同一行
+        self._overlay = {}
+        # 连通分量编号缓存，图变化时清空
+        self._labels = None
+        self._loaded = False
+        # 加载期间数据发生变化的教师，加载完成后补上；不在加载时为 None
+        self._loading = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # 增量更新的查询和应用串行执行，避免较早查到的数据覆盖较新的数据
+        self._refresh_lock = threading.Lock()
+        # 本进程写操作涉及、尚未重新统计的教师
+        self._dirty = set()
+        self._watches = [VersionWatch(teacher_service, source, sync_interval) for source in self.sources]
+        teacher_service.add_listener(self._on_write)
+
+    # ========== 查询 ==========
+    def collaborators(self, teacher_id):
+        """
+        教师的全部合作者，按合作次数从多到少排列
+        返回格式: [{'teacher_id': ..., 'name': ..., 'weight': 合作次数}, ...]
+        """
+        success, error = self._ensure_loaded()
+        if not success:
+            return False, error
+        with self._lock:
+            node = self._index.get(teacher_id)
+            row = self._row(node) if node is not None else {}
+            result = [{'teacher_id': self._ids[other], 'name': self.teacher_names.get(self._ids[other]), 'weight': weight}
+                      for other, weight in row.items()]
+        result.sort(key=lambda item: (-item['weight'], item['teacher_id']))
+        return True, result
+
+    def distance(self, teacher_id, target_id):
+        """
+        两位教师之间的最短合作链（不考虑合作次数）
+        返回 [teacher_id, ..., target_id]，合作距离为长度减一；两人不连通时返回 None
+        """
+        success, error = self._ensure_loaded()
+        if not success:
+            return False, error
+        if teacher_id == target_id:
+            return True, [teacher_id]
+        with self._lock:
+            start, target = self._index.get(teacher_id), self._index.get(target_id)
+            if start is None or target is None:
+                return True, None
+            parents = {start: None}
+            queue = deque([start])
+            while queue and target not in parents:
+                node = queue.popleft()
+                for other in self._neighbors(node):
+                    if other not in parents:
+                        parents[other] = node
+                        queue.append(other)
+            if target not in parents:
+                return True, None
+            path = []
+            node = target
+            while node is not None:
+                path.append(self._ids[node])
+                node = parents[node]
+        return True, path[::-1]
+
+    def components(self):
+        """全部连通分量（教师ID列表），按人数从多到少排列，没有合作者的教师各自成为一个分量"""
+        success, error = self._ensure_loaded()
+        if not success:
+            return False, error
+        with self._lock:
+            labels = self._component_labels()
+            groups = {}
+            for node, label in enumerate(labels):
+                groups.setdefault(label, []).append(self._ids[node])
+        result = [sorted(group) for group in groups.values()]
+        result.sort(key=lambda group: (-len(group), group[0]))
+        return True, result
+
+    def component(self, teacher_id):
+        """教师所在的连通分量（教师ID列表）"""
+        success, error = self._ensure_loaded()
+        if not success:
+            return False, error
+        with self._lock:
+            node = self._index.get(teacher_id)
+            if node is None:
+                return True, [teacher_id]
+            labels = self._component_labels()
+            return True, sorted(self._ids[other] for other, label in enumerate(labels) if label == labels[node])
+
+    # ========== 图的存储 ==========
+    def _node(self, teacher_id):
+        node = self._index.get(teacher_id)
+        if node is None:
+            node = self._index[teacher_id] = len(self._ids)
+            self._ids.append(teacher_id)
+        return node
+
+    def _row(self, node):
+        """某个节点的 {合作者编号: 合作次数}（返回新字典）"""
+        if node in self._overlay:
+            return dict(self._overlay[node])
+        if node + 1 >= len(self._indptr):
+            return {}
+        start, end = self._indptr[node], self._indptr[node + 1]
+        return dict(zip(self._indices[start:end], self._weights[start:end]))
+
+    def _neighbors(self, node):
+        if node in self._overlay:
+            return self._overlay[node].keys()
+        if node + 1 >= len(self._indptr):
+            return ()
+        return self._indices[self._indptr[node]:self._indptr[node + 1]]
+
+    def _compact(self):
+        """把覆盖层合并回 CSR 数组"""
+        indptr, indices, weights = array('l', [0]), array('l'), array('l')
+        for node in range(len(self._ids)):
+            row = self._row(node)
+            for other in sorted(row):
+                indices.append(other)
+                weights.append(row[other])
+            indptr.append(len(indices))
+        self._indptr, self._indices, self._weights = indptr, indices, weights
+        self._overlay = {}
+
+    def _component_labels(self):
+        if self._labels is None:
+            labels = [-1] * len(self._ids)
+            for start in range(len(self._ids)):
+                if labels[start] >= 0:
+                    continue
+                labels[start] = start
+                queue = deque([start])
+                while queue:
+                    for other in self._neighbors(queue.popleft()):
+                        if labels[other] < 0:
+                            labels[other] = start
+                            queue.append(other)
+            self._labels = labels
+        return self._labels
+
+    def _apply(self, teacher_ids, edges):
+        """用重新统计的边 {(教师, 合作者): 次数} 替换指定教师的全部边（对称地修改合作者一侧）"""
+        changed = {self._node(teacher_id) for teacher_id in teacher_ids}
+        rows = {node: {} for node in changed}
+        for (teacher_id, collaborator_id), weight in edges.items():
+            rows[self._node(teacher_id)][self._node(collaborator_id)] = weight
+        for node in changed:
+            for other in set(self._row(node)) | set(rows[node]):
+                if other in changed:
+                    continue
+                if other not in self._overlay:
+                    self._overlay[other] = self._row(other)
+                if other in rows[node]:
+                    self._overlay[other][node] = rows[node][other]
+                else:
+                    self._overlay[other].pop(node, None)
+        self._overlay.update(rows)
+        self._labels = None
+        if len(self._overlay) > max(COMPACT_MIN_ROWS, COMPACT_RATIO * len(self._ids)):
+            self._compact()
+
+    # ========== 缓存维护 ==========
+    def _ensure_loaded(self):
+        self._sync()
+        if self._loaded:
+            return True, None
+        with self._load_lock:
+            if self._loaded:
+                return True, None
+            with self._lock:
+                self._loading = set()
+            success, result = self.service.list_teachers()
+            if success:
+                teachers = result
+                success, result = self._query_edges(None)
+            with self._lock:
+                changed, self._loading = self._loading, None
+                if not success:
+                    return False, result
+                edges = result
+                self._ids, self._index, self._overlay, self._labels = [], {}, {}, None
+                self.teacher_names = {teacher['teacher_id']: teacher['name'] for teacher in teachers}
+                for teacher in teachers:
+                    self._node(teacher['teacher_id'])
+                for (teacher_id, collaborator_id), weight in edges.items():
+                    self._overlay.setdefault(self._node(teacher_id), {})[self._node(collaborator_id)] = weight
+                self._compact()
+                self._loaded = True
+        if changed:
+            self._refresh(changed)
+        return True, None
+
+    def _query_edges(self, teacher_ids):
+        """各来源的合作次数相加，返回 (success, {(教师, 合作者): 次数} 或错误信息)"""
+        edges = {}
+        for source in self.sources:
+            success, rows = self.service.get_collaboration_edges(source, teacher_ids)
+            if not success:
+                return False, rows
+            for teacher_id, collaborator_id, count in rows:
+                edges[(teacher_id, collaborator_id)] = edges.get((teacher_id, collaborator_id), 0) + count
+        return True, edges
+
+    def _on_write(self, event, data):
+        """写操作提交后在写请求的线程中调用：只记下涉及的教师，下一次查询时再更新，写请求不等待查询"""
+        if event in self.sources:
+            with self._lock:
+                self._dirty.update(data['teacher_ids'])
+
+    def _refresh(self, teacher_ids):
+        """重新统计指定教师的全部边"""
+        with self._lock:
+            if self._loading is not None:
+                self._loading.update(teacher_ids)
+            if not self._loaded:
+                return
+        with self._refresh_lock:
+            success, edges = self._query_edges(sorted(teacher_ids))
+            with self._lock:
+                if not success:
+                    # 无法增量更新时丢弃缓存，下次查询重新加载
+                    self._loaded = False
+                    return
+                self._apply(teacher_ids, edges)
+
+    def _sync(self):
+        """重新统计本进程写过的教师，以及其他进程写操作中版本号变化的教师"""
+        changed = set()
+        for watch in self._watches:
+            changed |= watch.poll()
+        with self._lock:
+            changed |= self._dirty
+            self._dirty = set()
+        if changed:
+            self._refresh(changed)
@@ -0,0 +1,5 @@
+"""
+pytest 配置：测试位于 tests/ 目录，直接导入仓库根目录下的模块
+load_test.py / stress_test.py 是需要数据库的压测脚本，不作为测试收集
+"""
+collect_ignore = ['load_test.py', 'stress_test.py']
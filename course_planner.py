@@ -0,0 +1,82 @@
+"""
+学期排课计划
+一个学期的计划格式为 {course_id: [(teacher_id, hours), ...]}，计划中列出的课程按计划整体替换，
+未列出的课程保持不变；某门课程的列表为空表示撤销该课程本学期的全部教学任务。
+本模块只做解析、校验和差异计算，写库由 TeacherService.apply_semester_plan 在一个事务内完成。
+
+计划文本每行一条教学任务（空行和 # 开头的行会被忽略）:
+    课程ID,教师ID,学时
+只写课程ID表示撤销该课程本学期的全部教学任务
+"""
+import csv
+import io
+
+
+def parse_plan(text):
+    """
+    解析计划文本，返回 (True, plan) 或 (False, 错误信息)
+    plan格式: {course_id: [(teacher_id, hours), ...]}
+    """
+    plan = {}
+    reader = csv.reader(io.StringIO(text))
+    for line_no, row in enumerate(reader, 1):
+        row = [field.strip() for field in row]
+        if not any(row) or row[0].startswith('#'):
+            continue
+        if len(row) == 1:
+            plan.setdefault(row[0], [])
+            continue
+        if len(row) != 3 or not all(row):
+            return False, f"第{line_no}行格式错误，应为: 课程ID,教师ID,学时"
+        course_id, teacher_id, hours = row
+        try:
+            hours = int(hours)
+        except ValueError:
+            return False, f"第{line_no}行学时必须是整数"
+        plan.setdefault(course_id, []).append((teacher_id, hours))
+    if not plan:
+        return False, "计划为空"
+    return True, plan
+
+
+def validate_plan(plan, course_hours, teacher_ids):
+    """
+    校验计划，返回问题列表（为空表示通过）
+    course_hours: {course_id: total_hours}，为计划中存在的课程；teacher_ids: 存在的教师ID集合
+    每门课程的学时之和必须等于课程总学时（或为空列表，表示撤销）
+    """
+    problems = []
+    for course_id, assignments in sorted(plan.items()):
+        if course_id not in course_hours:
+            problems.append(f"课程 {course_id} 不存在")
+            continue
+        seen = set()
+        for teacher_id, hours in assignments:
+            if teacher_id in seen:
+                problems.append(f"课程 {course_id} 中教师 {teacher_id} 重复")
+            seen.add(teacher_id)
+            if teacher_id not in teacher_ids:
+                problems.append(f"教师 {teacher_id} 不存在")
+            if hours <= 0:
+                problems.append(f"课程 {course_id} 中教师 {teacher_id} 的学时必须大于0")
+        total = sum(hours for _, hours in assignments)
+        if assignments and total != course_hours[course_id]:
+            problems.append(f"课程 {course_id} 分配学时 {total} 与总学时 {course_hours[course_id]} 不一致")
+    return problems
+
+
+def diff_plan(plan, current):
+    """
+    计算计划与当前教学任务的差异
+    current: {(course_id, teacher_id): hours}，只需包含计划中课程本学期的教学任务
+    返回 (新增或修改 [(course_id, teacher_id, hours), ...], 删除 [(course_id, teacher_id), ...])
+    结果按 (course_id, teacher_id) 排序，写入时的加锁顺序固定
+    """
+    target = {(course_id, teacher_id): hours
+              for course_id, assignments in plan.items()
+              for teacher_id, hours in assignments}
+    upserts = sorted((course_id, teacher_id, hours)
+                     for (course_id, teacher_id), hours in target.items()
+                     if current.get((course_id, teacher_id)) != hours)
+    deletes = sorted(key for key in current if key not in target)
+    return upserts, deletes
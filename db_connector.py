@@ -1,10 +1,107 @@
+import os
+import random
+import threading
+import time
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+
+class _Endpoint:
+    """一个数据库节点（主库或只读副本）及其按进程懒加载的连接池"""
+
+    def __init__(self, name, config, pool_size, acquire_timeout):
+        self.name = name
+        self.config = config
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.pool = None
+        self.pid = None
+        self.slots = None
+        self.lock = threading.Lock()
+        # 副本延迟检查缓存: (检查时间, 延迟秒数或 None)
+        self.lag = None
+
+    def acquire(self):
+        pool = self._get_pool()
+        # mysql.connector 的连接池耗尽时直接报错，这里用信号量让请求排队等待
+        if not self.slots.acquire(timeout=self.acquire_timeout):
+            raise Error(msg=f"等待数据库连接超时: {self.name}")
+        try:
+            return pool.get_connection()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, connection):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            # 池化连接的 close() 会把连接放回连接池
+            connection.close()
+        except Error:
+            pass
+        finally:
+            self.slots.release()
+
+    def drain(self, timeout):
+        if self.pool is None or self.pid != os.getpid():
+            return True
+        acquired = 0
+        drained = True
+        for _ in range(self.pool_size):
+            if not self.slots.acquire(timeout=timeout):
+                drained = False
+                break
+            acquired += 1
+        # 此时没有线程持有连接，关闭池中所有空闲连接
+        self.pool._remove_connections()
+        for _ in range(acquired):
+            self.slots.release()
+        self.pool = None
+        self.pid = None
+        return drained
+
+    def reset(self):
+        """fork 后丢弃从父进程继承的连接池，不能关闭它们，否则会断开父进程的 socket"""
+        self.pool = None
+        self.pid = None
+        self.slots = None
+        self.lock = threading.Lock()
+        self.lag = None
+
+    def _get_pool(self):
+        """按进程懒加载连接池"""
+        pid = os.getpid()
+        if self.pool is None or self.pid != pid:
+            with self.lock:
+                if self.pool is None or self.pid != pid:
+                    self.pool = pooling.MySQLConnectionPool(
+                        pool_name=f"teacher_research_{self.name}_{pid}",
+                        pool_size=self.pool_size,
+                        pool_reset_session=True,
+                        **self.config
+                    )
+                    self.slots = threading.BoundedSemaphore(self.pool_size)
+                    self.pid = pid
+        return self.pool
+
 
 class DatabaseConnector:
     def __init__(self):
         self.connection = None
-    
+        # 连接池模式下的主库；为 None 时使用 connect() 建立的单连接
+        self.config = None
+        self.primary = None
+        self.replicas = []
+        # 用户写入后多少秒内的读请求仍走主库（读己之写）
+        self.sticky_seconds = 5
+        # 副本延迟超过该阈值（秒）时读请求回退到主库
+        self.max_replica_lag = 5
+        self.lag_check_interval = 2
+        # 本地只读快照后端，见 open_snapshot()
+        self.snapshot = None
+        self._draining = False
+        self._local = threading.local()
+
     def connect(self, host, database, user, password):
         """建立数据库连接"""
         try:
@@ -20,13 +117,192 @@ class DatabaseConnector:
         except Error as e:
             print(f"连接数据库时出错: {e}")
             raise
-    
+
+    def configure(self, host, database, user, password, port=3306, pool_size=5, acquire_timeout=10,
+                  replicas=None, sticky_seconds=5, max_replica_lag=5):
+        """
+        记录连接池配置，但不立即连接数据库
+        连接池在每个进程第一次取连接时才创建，因此可以在 fork 之前调用，
+        预派生的 WSGI worker 各自拥有独立的 socket，启动也不会阻塞在数据库上
+        replicas格式: [{'host': ..., 'port': ...}, ...]，未给出的参数与主库相同
+        """
+        self.config = {
+            'host': host,
+            'database': database,
+            'user': user,
+            'password': password,
+            'port': port,
+            # 会话时区固定为 UTC，时间戳可以直接用于 HTTP 缓存头
+            'time_zone': '+00:00',
+        }
+        self.primary = _Endpoint('primary', self.config, pool_size, acquire_timeout)
+        self.replicas = []
+        for i, replica in enumerate(replicas or []):
+            replica_config = dict(self.config)
+            replica_config.update(replica)
+            self.replicas.append(_Endpoint(f'replica{i}', replica_config, pool_size, acquire_timeout))
+        self.sticky_seconds = sticky_seconds
+        self.max_replica_lag = max_replica_lag
+        self._draining = False
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def open_snapshot(self, path):
+        """
+        使用本地 SQLite 快照（snapshot.py 导出）作为只读后端
+        所有查询都在快照上执行，写操作会失败
+        """
+        from snapshot import SnapshotBackend
+        self.snapshot = SnapshotBackend(path)
+        print(f"使用只读快照: {path}")
+
     def disconnect(self):
         """关闭数据库连接"""
         if self.connection and self.connection.is_connected():
             self.connection.close()
             print("数据库连接已关闭")
-    
-    def get_connection(self):
-        """获取数据库连接"""
-        return self.connection
\ No newline at end of file
+        if self.primary is not None or self.snapshot is not None:
+            self.drain()
+
+    def get_connection(self, readonly=False):
+        """
+        获取数据库连接
+        readonly=True 的只读查询会被路由到延迟足够小的副本；
+        当前用户刚写过数据、没有副本或副本延迟过大时仍使用主库
+        """
+        if self.snapshot is not None:
+            return self.snapshot.get_connection()
+        if self.config is None:
+            return self.connection
+
+        endpoint = self._route(readonly)
+        if not readonly:
+            self._local.last_write_at = time.time()
+
+        # 同一线程在一次请求内对同一节点复用同一个连接
+        connections = self._connections()
+        connection = connections.get(endpoint.name)
+        if connection is not None:
+            return connection
+
+        if self._draining:
+            raise Error(msg="数据库连接池正在关闭")
+        connection = endpoint.acquire()
+        connections[endpoint.name] = connection
+        return connection
+
+    def release_connection(self):
+        """归还当前线程占用的连接，在每个请求结束时调用"""
+        connections = self._connections()
+        for name, connection in list(connections.items()):
+            del connections[name]
+            self._endpoint(name).release(connection)
+
+    def begin_request(self, last_write_at=None):
+        """请求开始时恢复该用户上次写入的时间（通常来自 cookie），用于读己之写"""
+        self._local.last_write_at = last_write_at
+        self._local.request_started_at = time.time()
+
+    def wrote_in_request(self):
+        """当前请求是否使用过主库写连接"""
+        last_write_at = getattr(self._local, 'last_write_at', None)
+        started_at = getattr(self._local, 'request_started_at', 0)
+        return last_write_at is not None and last_write_at >= started_at
+
+    def last_write_at(self):
+        return getattr(self._local, 'last_write_at', None)
+
+    def ping(self):
+        """检查数据库是否可用，用于就绪探针"""
+        if self.snapshot is not None:
+            self.snapshot.get_connection().ping()
+            return True
+        connection = self.primary.acquire()
+        try:
+            connection.ping(reconnect=True, attempts=1)
+        finally:
+            self.primary.release(connection)
+        return True
+
+    def drain(self, timeout=30):
+        """
+        优雅关闭：不再发放新连接，等待正在使用的连接归还后关闭所有连接
+        返回是否在超时前等到了全部连接
+        """
+        self._draining = True
+        drained = True
+        if self.snapshot is not None:
+            self.snapshot.close()
+        for endpoint in [self.primary] + self.replicas:
+            if endpoint is not None and endpoint.pool is not None:
+                drained = endpoint.drain(timeout) and drained
+                print(f"数据库连接池已关闭: {endpoint.name}")
+        return drained
+
+    def replica_lag(self, endpoint):
+        """查询副本复制延迟（秒），结果按进程缓存 lag_check_interval 秒；无法确定时返回 None"""
+        now = time.time()
+        if endpoint.lag is not None and now - endpoint.lag[0] < self.lag_check_interval:
+            return endpoint.lag[1]
+        lag = None
+        connection = None
+        try:
+            connection = endpoint.acquire()
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                # MySQL 8.0.22 之前的版本
+                cursor.execute("SHOW SLAVE STATUS")
+            status = cursor.fetchone()
+            cursor.close()
+            if status:
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        except Error:
+            lag = None
+        finally:
+            if connection is not None:
+                endpoint.release(connection)
+        endpoint.lag = (now, lag)
+        return lag
+
+    def _route(self, readonly):
+        """选择本次查询使用的节点"""
+        if not readonly or not self.replicas:
+            return self.primary
+        last_write_at = getattr(self._local, 'last_write_at', None)
+        if last_write_at is not None and time.time() - last_write_at < self.sticky_seconds:
+            return self.primary
+        # 已经在本次请求中使用过的副本优先，保证同一请求内读到一致的数据
+        connections = self._connections()
+        for replica in self.replicas:
+            if replica.name in connections:
+                return replica
+        candidates = list(self.replicas)
+        random.shuffle(candidates)
+        for replica in candidates:
+            lag = self.replica_lag(replica)
+            if lag is not None and lag <= self.max_replica_lag:
+                return replica
+        return self.primary
+
+    def _connections(self):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        return connections
+
+    def _endpoint(self, name):
+        for endpoint in [self.primary] + self.replicas:
+            if endpoint.name == name:
+                return endpoint
+        raise KeyError(name)
+
+    def _after_fork(self):
+        """fork 后的子进程丢弃从父进程继承的连接"""
+        for endpoint in [self.primary] + self.replicas:
+            if endpoint is not None:
+                endpoint.reset()
+        self._local = threading.local()
+        if self.config is not None:
+            self.connection = None
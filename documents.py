@@ -0,0 +1,257 @@
+"""
+教师总览文档（PDF / Excel）
+在服务端生成教师总览文档，代替页面截图导出：
+数据在调用方进程中查询（需要数据库连接），版面排布和文件生成这些 CPU 密集的工作
+交给独立的进程池完成，不占用请求线程，也不受 GIL 影响；批量生成时多位教师的文档并行渲染。
+
+reportlab（PDF）和 openpyxl（Excel）是可选依赖，未安装时对应的格式不可用。
+"""
+import concurrent.futures
+import datetime
+import decimal
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+
+from reports import COURSE_COLUMNS, PAPER_COLUMNS, PROJECT_COLUMNS
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:
+    pdfmetrics = None
+
+try:
+    import openpyxl
+    from openpyxl.styles import Font
+except ImportError:
+    openpyxl = None
+
+# 格式 -> (MIME 类型, 依赖的库)
+FORMATS = {
+    'pdf': ('application/pdf', 'reportlab'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'openpyxl'),
+}
+
+# 文档的各部分: (键, 标题, 服务层查询方法名, 列)
+SECTIONS = [
+    ('courses', "教学情况", 'get_teacher_courses', COURSE_COLUMNS),
+    ('papers', "论文发表情况", 'get_teacher_papers', PAPER_COLUMNS),
+    ('projects', "项目承担情况", 'get_teacher_projects', PROJECT_COLUMNS),
+]
+
+TEACHER_FIELDS = [("工号", 'teacher_id'), ("姓名", 'name'), ("性别", 'gender_text'), ("职称", 'title_text')]
+
+# reportlab 自带的中文字体，不需要字体文件
+PDF_FONT = 'STSong-Light'
+
+
+def available_formats():
+    """当前环境可以生成的文档格式"""
+    installed = {'reportlab': pdfmetrics is not None, 'openpyxl': openpyxl is not None}
+    return [fmt for fmt, (_, library) in FORMATS.items() if installed[library]]
+
+
+def overview_data(service, teacher_id, start_year=None, end_year=None):
+    """
+    查询生成文档需要的全部数据，返回 (success, data或错误信息)
+    data 只包含字符串和数字，可以直接传给渲染进程
+    """
+    success, teacher_info = service.get_teacher_info(teacher_id)
+    if not success:
+        return False, teacher_info
+    data = {
+        'teacher': {field: _plain(teacher_info.get(field)) for _, field in TEACHER_FIELDS},
+        'start_year': start_year,
+        'end_year': end_year,
+    }
+    for key, _, method, columns in SECTIONS:
+        success, rows = getattr(service, method)(teacher_id, start_year, end_year)
+        if not success:
+            return False, rows
+        data[key] = [[_plain(row.get(field)) for _, field in columns] for row in rows]
+    return True, data
+
+
+def _plain(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _years_text(data):
+    if data['start_year'] is not None and data['end_year'] is not None:
+        return f"{data['start_year']} - {data['end_year']} 年"
+    if data['start_year'] is not None:
+        return f"{data['start_year']} 年起"
+    if data['end_year'] is not None:
+        return f"截至 {data['end_year']} 年"
+    return "全部年份"
+
+
+# ========== 渲染（在渲染进程中执行） ==========
+def render(fmt, data):
+    """生成一份文档，返回文件内容"""
+    if fmt == 'pdf':
+        return render_pdf(data)
+    if fmt == 'xlsx':
+        return render_xlsx(data)
+    raise ValueError(f"不支持的文档格式: {fmt}")
+
+
+def render_pdf(data):
+    """教师总览 PDF：A4 横向，基本信息和各部分表格，表格跨页时重复表头"""
+    if pdfmetrics is None:
+        raise RuntimeError("未安装 reportlab，无法生成 PDF")
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(PDF_FONT))
+    title_style = ParagraphStyle('title', fontName=PDF_FONT, fontSize=16, leading=22, alignment=1)
+    heading_style = ParagraphStyle('heading', fontName=PDF_FONT, fontSize=12, leading=18, spaceBefore=8, spaceAfter=4)
+    text_style = ParagraphStyle('text', fontName=PDF_FONT, fontSize=10, leading=14)
+    cell_style = ParagraphStyle('cell', fontName=PDF_FONT, fontSize=8, leading=10, wordWrap='CJK')
+
+    teacher = data['teacher']
+    story = [
+        Paragraph("教师教学科研工作统计", title_style),
+        Paragraph(_years_text(data), ParagraphStyle('years', parent=text_style, alignment=1)),
+        Spacer(1, 4 * mm),
+        Paragraph("教师基本信息", heading_style),
+        Paragraph("　　".join(f"{title}: {_escape(teacher[field])}" for title, field in TEACHER_FIELDS), text_style),
+    ]
+    page_size = landscape(A4)
+    width = page_size[0] - 30 * mm
+    for key, title, _, columns in SECTIONS:
+        story.append(Paragraph(title, heading_style))
+        if not data[key]:
+            story.append(Paragraph("无记录", text_style))
+            continue
+        rows = [[Paragraph(_escape(column_title), cell_style) for column_title, _ in columns]]
+        rows += [[Paragraph(_escape(value), cell_style) for value in row] for row in data[key]]
+        table = Table(rows, colWidths=[width / len(columns)] * len(columns), repeatRows=1)
+        table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]))
+        story.append(table)
+
+    output = io.BytesIO()
+    document = SimpleDocTemplate(output, pagesize=page_size, leftMargin=15 * mm, rightMargin=15 * mm,
+                                 topMargin=15 * mm, bottomMargin=15 * mm,
+                                 title=f"教师教学科研工作统计 - {teacher['name']}")
+    document.build(story)
+    return output.getvalue()
+
+
+def _escape(value):
+    text = '' if value is None else str(value)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def render_xlsx(data):
+    """教师总览 Excel：基本信息和各部分各占一个工作表"""
+    if openpyxl is None:
+        raise RuntimeError("未安装 openpyxl，无法生成 Excel 文件")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "基本信息"
+    for title, field in TEACHER_FIELDS:
+        sheet.append([title, data['teacher'][field]])
+    sheet.append(["统计年份", _years_text(data)])
+    sheet.column_dimensions['A'].width = 12
+    sheet.column_dimensions['B'].width = 24
+
+    for key, title, _, columns in SECTIONS:
+        sheet = workbook.create_sheet(title)
+        sheet.append([column_title for column_title, _ in columns])
+        for cell in sheet[1]:
+            cell.font = Font(bold=True)
+        for row in data[key]:
+            sheet.append(row)
+        sheet.freeze_panes = 'A2'
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+# ========== 渲染进程池 ==========
+class DocumentRenderer:
+    """文档渲染进程池（每个 worker 进程在第一次使用时创建自己的进程池）"""
+
+    def __init__(self, workers=2, timeout=120):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def render(self, fmt, data):
+        """生成一份文档，返回 (success, 文件内容或错误信息)"""
+        if fmt not in available_formats():
+            return False, f"不支持的文档格式: {fmt}"
+        try:
+            return True, self._submit(fmt, data).result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            return False, "生成文档超时"
+        except Exception as e:
+            self._discard_broken(e)
+            return False, f"生成文档失败: {str(e)}"
+
+    def render_zip(self, fmt, documents, progress=None):
+        """
+        并行生成多份文档并打包为 zip，返回 zip 文件内容；任何一份失败时抛出异常
+        documents: [(文件名, data), ...]；progress(done, total, message) 可选
+        """
+        if fmt not in available_formats():
+            raise ValueError(f"不支持的文档格式: {fmt}")
+        futures = {self._submit(fmt, data): filename for filename, data in documents}
+        results = {}
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=self.timeout * max(1, len(futures))):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(len(results), len(futures), f"已生成 {len(results)}/{len(futures)} 份文档")
+        except Exception as e:
+            for future in futures:
+                future.cancel()
+            self._discard_broken(e)
+            raise
+
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for filename, _ in documents:
+                archive.writestr(filename, results[filename])
+        return output.getvalue()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _submit(self, fmt, data):
+        with self._lock:
+            # fork 继承来的进程池属于父进程，不能使用
+            if self._executor is None or self._pid != os.getpid():
+                # 使用 spawn 启动渲染进程，不复制 worker 进程的线程和数据库连接
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor.submit(render, fmt, data)
+
+    def _discard_broken(self, error):
+        """渲染进程异常退出后进程池不能再使用，丢弃后下次重新创建"""
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                self._executor = None
@@ -0,0 +1,61 @@
+"""
+页面片段缓存
+缓存结果页中按教师划分的表格片段（教学、论文、项目），缓存键包含该部分数据的版本号，
+数据变化后版本号递增，旧片段自然不会再被命中，只会被 LRU 淘汰
+"""
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """线程安全的 LRU 片段缓存（每个进程一份）"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fragment
+
+    def set(self, key, fragment):
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, key, render):
+        """
+        命中时直接返回缓存的片段，否则调用 render() 渲染
+        render() 返回 (html, 是否可缓存)，本函数返回 (Markup, 是否可缓存)
+        key 为 None 时不使用缓存
+        """
+        if key is not None:
+            fragment = self.get(key)
+            if fragment is not None:
+                return fragment, True
+        html, cacheable = render()
+        fragment = Markup(html)
+        if key is not None and cacheable:
+            self.set(key, fragment)
+        return fragment, cacheable
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
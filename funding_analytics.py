@@ -0,0 +1,128 @@
+"""
+项目经费按年分摊
+项目经费（参与者承担的经费）在库中是整个项目周期的总额，这里把每笔经费按分摊方式
+分配到项目的各个年度，再按教师 / 项目类型 / 项目来源汇总成逐年序列。
+
+所有参与记录放进数组后一次性计算：参与记录 × 年份 的分摊矩阵，再按分组累加，
+几千个项目也只需要几次数组运算。NumPy 为可选依赖，未安装时本功能不可用。
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 汇总维度 -> 查询结果中的字段
+GROUP_FIELDS = {
+    'teacher': 'teacher_id',
+    'project_type': 'project_type',
+    'project_source': 'project_source',
+}
+
+PROJECT_TYPE_TEXT = {1: "国家级项目", 2: "省部级项目", 3: "市厅级项目", 4: "企业合作项目", 5: "其它类型项目"}
+
+# 预设的分摊方式: 名称 -> 说明
+PROFILES = {
+    'uniform': "平均分摊",
+    'front': "前多后少（按剩余年数递减）",
+    'back': "前少后多（按已执行年数递增）",
+}
+
+
+def parse_profile(value):
+    """
+    解析分摊方式：预设名称，或逗号分隔的各年权重（如 "40,30,30"）
+    自定义权重依次对应项目第 1、2、3... 年，项目年数更多时其余年份沿用最后一个权重
+    返回 (success, 分摊方式或错误信息)
+    """
+    value = (value or 'uniform').strip()
+    if value in PROFILES:
+        return True, value
+    try:
+        weights = [float(item) for item in value.replace('，', ',').split(',') if item.strip()]
+    except ValueError:
+        return False, f"无效的分摊方式: {value}"
+    if not weights or any(weight < 0 for weight in weights) or weights[-1] <= 0:
+        return False, "分摊权重不能为负数，最后一个权重必须大于 0"
+    return True, tuple(weights)
+
+
+def yearly_series(rows, group_by=None, start_year=None, end_year=None, profile='uniform'):
+    """
+    按年分摊经费并分组汇总
+    rows: 服务层的参与记录 [{'teacher_id', 'name', 'project_type', 'project_source',
+          'start_year', 'end_year', 'funding'}, ...]
+    group_by: GROUP_FIELDS 中的维度，None 表示全部汇总为一个序列
+    返回 (success, {'years': [...], 'series': [{'key', 'label', 'values', 'total'}, ...], 'totals': [...]})
+    序列按合计从大到小排列，totals 为各年所有序列之和
+    """
+    if np is None:
+        return False, "未安装 numpy，无法进行经费分析"
+    if group_by is not None and group_by not in GROUP_FIELDS:
+        return False, f"未知的汇总维度: {group_by}"
+    if not rows:
+        return True, {'years': [], 'series': [], 'totals': []}
+
+    starts = np.array([row['start_year'] for row in rows], dtype=np.int64)
+    ends = np.maximum(np.array([row['end_year'] for row in rows], dtype=np.int64), starts)
+    amounts = np.array([float(row['funding'] or 0) for row in rows])
+    first = start_year if start_year is not None else int(starts.min())
+    last = end_year if end_year is not None else int(ends.max())
+    if first > last:
+        return False, "开始年份不能晚于结束年份"
+    years = np.arange(first, last + 1)
+
+    # 参与记录 × 年份：项目第几年（从 0 开始），不在项目周期内的位置权重为 0
+    durations = ends - starts + 1
+    offsets = years[None, :] - starts[:, None]
+    active = (offsets >= 0) & (offsets < durations[:, None])
+    weights, totals = _profile_weights(profile, offsets, durations)
+    # 自定义权重在较短的项目上可能全为 0，这些记录改为平均分摊
+    flat = totals <= 0
+    if flat.any():
+        weights = np.where(flat[:, None], 1.0, weights)
+        totals = np.where(flat, durations, totals)
+    shares = np.where(active, weights, 0.0) * (amounts / totals)[:, None]
+
+    if group_by is None:
+        keys, codes = [None], np.zeros(len(rows), dtype=np.int64)
+    else:
+        field = GROUP_FIELDS[group_by]
+        keys, codes = np.unique(np.array([str(row[field]) for row in rows]), return_inverse=True)
+        keys = keys.tolist()
+    sums = np.zeros((len(keys), len(years)))
+    np.add.at(sums, codes, shares)
+
+    labels = _labels(rows, group_by)
+    series = [{'key': key, 'label': labels.get(key, key), 'values': [round(value, 2) for value in values.tolist()],
+               'total': round(float(values.sum()), 2)}
+              for key, values in zip(keys, sums)]
+    series.sort(key=lambda item: (-item['total'], str(item['key'])))
+    return True, {'years': years.tolist(), 'series': series,
+                  'totals': [round(value, 2) for value in sums.sum(axis=0).tolist()]}
+
+
+def _profile_weights(profile, offsets, durations):
+    """各位置的分摊权重，以及每条记录整个项目周期的权重之和（用于归一化）"""
+    if profile == 'uniform':
+        return np.ones(offsets.shape), durations.astype(float)
+    if profile == 'front':
+        # 第 k 年权重 d - k，合计 d(d+1)/2
+        return (durations[:, None] - offsets).astype(float), durations * (durations + 1) / 2.0
+    if profile == 'back':
+        return (offsets + 1).astype(float), durations * (durations + 1) / 2.0
+    # 自定义权重：超出部分沿用最后一个权重
+    custom = np.array(profile, dtype=float)
+    prefix = np.concatenate(([0.0], np.cumsum(custom)))
+    weights = custom[np.clip(offsets, 0, len(custom) - 1)]
+    totals = prefix[np.minimum(durations, len(custom))] + np.maximum(durations - len(custom), 0) * custom[-1]
+    return weights, totals
+
+
+def _labels(rows, group_by):
+    if group_by == 'teacher':
+        return {str(row['teacher_id']): f"{row['name']}（{row['teacher_id']}）" for row in rows}
+    if group_by == 'project_type':
+        return {str(row['project_type']): PROJECT_TYPE_TEXT.get(row['project_type'], "未知类型") for row in rows}
+    if group_by is None:
+        return {None: "全部"}
+    return {}
@@ -0,0 +1,36 @@
+"""
+gunicorn 配置：多进程预派生 + 每进程多线程
+应用在 master 中预加载（启动时不连接数据库），每个 worker 在 fork 之后
+处理第一个请求时才创建自己的连接池，连接池大小与线程数一致
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+# 收到 SIGTERM 后等待进行中的请求完成的时间
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# 每个请求线程、后台任务线程、清理线程、变更日志消费线程和审计日志写出线程同一时刻最多占用一个连接
+os.environ.setdefault('DB_POOL_SIZE', str(threads + int(os.environ.get('JOB_WORKERS', 2)) + 3))
+# 每个变更推送（SSE）连接占用一个请求线程，最多用掉一半线程，其余线程留给普通请求
+os.environ.setdefault('CHANGE_FEED_MAX_STREAMS', str(max(threads // 2, 1)))
+
+
+def worker_exit(server, worker):
+    """worker 退出前等待后台任务和借出的连接结束、写完审计记录，再关闭连接池"""
+    from app import audit_log, change_broker, change_tailer, db_connector, document_renderer, job_queue, purger
+    change_broker.close()
+    job_queue.stop(timeout=graceful_timeout)
+    purger.stop()
+    change_tailer.stop()
+    document_renderer.shutdown()
+    if audit_log is not None:
+        audit_log.close(timeout=graceful_timeout)
+    if not db_connector.drain(timeout=graceful_timeout):
+        server.log.warning("worker %s 关闭时仍有数据库连接未归还", worker.pid)
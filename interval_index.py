@@ -0,0 +1,238 @@
+"""
+项目起止年份区间索引
+"某段时间内在研的项目" 是区间重叠查询（start_year <= 结束年份 AND end_year >= 开始年份），
+两个条件分别落在两列上，普通 B-tree 索引只能用上其中一个，全院范围的查询基本等于扫描 project 表。
+
+这里在内存中按 (start_year, project_id) 维护一棵树堆，每个节点记录子树中最大的 end_year，
+查询时整棵子树的 end_year 都早于开始年份、或节点的 start_year 已晚于结束年份时直接剪枝，
+期望代价 O(log n + k)，插入和删除期望 O(log n)。
+
+索引另外记录每位教师参与的项目，写操作后只重新读取涉及教师的项目；
+本进程的写操作由 TeacherService 的监听器记下涉及的教师，下一次查询时再增量更新，
+其他进程的写操作通过数据版本号发现。
+"""
+import random
+import threading
+
+from version_watch import VersionWatch
+
+
+class _Node:
+    __slots__ = ('start', 'key', 'end', 'max_end', 'priority', 'left', 'right')
+
+    def __init__(self, start, key, end, priority):
+        self.start = start
+        self.key = key
+        self.end = end
+        self.max_end = end
+        self.priority = priority
+        self.left = None
+        self.right = None
+
+    def update(self):
+        self.max_end = max(self.end,
+                           self.left.max_end if self.left else self.end,
+                           self.right.max_end if self.right else self.end)
+
+
+class IntervalTreap:
+    """区间树堆：按 (start, key) 排序，支持插入、删除和重叠查询（闭区间）"""
+
+    def __init__(self, seed=None):
+        self._root = None
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, key, start, end):
+        """插入区间 [start, end]，同一个 key 只能插入一次"""
+        node = _Node(start, key, end, self._random.random())
+        left, right = self._split(self._root, (start, key))
+        self._root = self._merge(self._merge(left, node), right)
+        self._size += 1
+
+    def remove(self, key, start):
+        """删除 key 对应的区间（需要提供插入时的 start），不存在时返回 False"""
+        self._root, removed = self._remove(self._root, (start, key))
+        if removed:
+            self._size -= 1
+        return removed
+
+    def overlapping(self, start, end):
+        """与闭区间 [start, end] 有交集的全部 key，按 (start, key) 排序"""
+        result = []
+        stack = []
+        node = self._root
+        # 中序遍历，按 max_end 和 start 剪枝
+        while stack or node is not None:
+            while node is not None and node.max_end >= start:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                break
+            node = stack.pop()
+            if node.start > end:
+                break
+            if node.end >= start:
+                result.append(node.key)
+            node = node.right
+        return result
+
+    def _split(self, node, position):
+        """拆分为 (< position, >= position) 两棵树"""
+        if node is None:
+            return None, None
+        if (node.start, node.key) < position:
+            node.right, right = self._split(node.right, position)
+            node.update()
+            return node, right
+        left, node.left = self._split(node.left, position)
+        node.update()
+        return left, node
+
+    def _merge(self, left, right):
+        """合并两棵树，left 中的全部节点都排在 right 之前"""
+        if left is None or right is None:
+            return left or right
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+    def _remove(self, node, position):
+        if node is None:
+            return None, False
+        current = (node.start, node.key)
+        if current == position:
+            return self._merge(node.left, node.right), True
+        if position < current:
+            node.left, removed = self._remove(node.left, position)
+        else:
+            node.right, removed = self._remove(node.right, position)
+        if removed:
+            node.update()
+        return node, removed
+
+
+class ProjectIntervalIndex:
+    """项目起止年份的区间索引（每个进程一份，线程安全，第一次查询时加载）"""
+
+    def __init__(self, teacher_service, sync_interval=5):
+        self.service = teacher_service
+        self._tree = IntervalTreap()
+        # project_id -> (start_year, end_year, {参与教师})
+        self._projects = {}
+        # teacher_id -> {project_id}
+        self._teacher_projects = {}
+        self._loaded = False
+        # 加载期间数据发生变化的教师，加载完成后补上；不在加载时为 None
+        self._loading = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # 增量更新的查询和应用串行执行，避免较早查到的数据覆盖较新的数据
+        self._refresh_lock = threading.Lock()
+        # 本进程写操作涉及、尚未重新读取的教师
+        self._dirty = set()
+        self._watch = VersionWatch(teacher_service, 'project', sync_interval)
+        teacher_service.add_listener(self._on_write)
+
+    # ========== 查询 ==========
+    def overlapping(self, start_year=None, end_year=None, teacher_id=None):
+        """
+        与 start_year..end_year 有交集的项目ID（按开始年份、项目ID排序），年份为 None 表示不限
+        指定 teacher_id 时只返回该教师参与的项目
+        """
+        success, error = self._ensure_loaded()
+        if not success:
+            return False, error
+        with self._lock:
+            project_ids = self._tree.overlapping(start_year if start_year is not None else float('-inf'),
+                                                 end_year if end_year is not None else float('inf'))
+            if teacher_id is not None:
+                mine = self._teacher_projects.get(teacher_id, set())
+                project_ids = [project_id for project_id in project_ids if project_id in mine]
+        return True, project_ids
+
+    # ========== 缓存维护 ==========
+    def _put(self, project_id, start_year, end_year, teacher_ids):
+        self._drop(project_id)
+        self._projects[project_id] = (start_year, end_year, teacher_ids)
+        self._tree.insert(project_id, start_year, end_year)
+        for teacher_id in teacher_ids:
+            self._teacher_projects.setdefault(teacher_id, set()).add(project_id)
+
+    def _drop(self, project_id):
+        project = self._projects.pop(project_id, None)
+        if project is None:
+            return
+        start_year, _, teacher_ids = project
+        self._tree.remove(project_id, start_year)
+        for teacher_id in teacher_ids:
+            self._teacher_projects.get(teacher_id, set()).discard(project_id)
+
+    def _apply(self, project_ids, rows):
+        """用查询结果替换 project_ids 中的项目，查询结果中没有的项目视为已删除"""
+        projects = {}
+        for project_id, start_year, end_year, teacher_id in rows:
+            _, _, teacher_ids = projects.setdefault(project_id, (start_year, end_year, set()))
+            if teacher_id is not None:
+                teacher_ids.add(teacher_id)
+        for project_id in set(project_ids) - set(projects):
+            self._drop(project_id)
+        for project_id, (start_year, end_year, teacher_ids) in projects.items():
+            self._put(project_id, start_year, end_year, teacher_ids)
+
+    def _ensure_loaded(self):
+        changed = self._watch.poll()
+        with self._lock:
+            changed |= self._dirty
+            self._dirty = set()
+        if changed:
+            self._refresh(changed)
+        if self._loaded:
+            return True, None
+        with self._load_lock:
+            if self._loaded:
+                return True, None
+            with self._lock:
+                self._loading = set()
+            success, rows = self.service.get_project_ranges()
+            with self._lock:
+                changed, self._loading = self._loading, None
+                if not success:
+                    return False, rows
+                self._tree, self._projects, self._teacher_projects = IntervalTreap(), {}, {}
+                self._apply((), rows)
+                self._loaded = True
+        if changed:
+            self._refresh(changed)
+        return True, None
+
+    def _on_write(self, event, data):
+        """写操作提交后在写请求的线程中调用：只记下涉及的教师，下一次查询时再更新，写请求不等待查询"""
+        if event == 'project':
+            with self._lock:
+                self._dirty.update(data['teacher_ids'])
+
+    def _refresh(self, teacher_ids):
+        """重新读取指定教师参与过的项目（包括索引中记录的、可能已被删除或移除该教师的项目）"""
+        with self._lock:
+            if self._loading is not None:
+                self._loading.update(teacher_ids)
+            if not self._loaded:
+                return
+        with self._refresh_lock:
+            with self._lock:
+                known = set().union(*(self._teacher_projects.get(teacher_id, ()) for teacher_id in teacher_ids))
+            success, rows = self.service.get_project_ranges(sorted(teacher_ids), sorted(known))
+            with self._lock:
+                if not success:
+                    # 无法增量更新时丢弃缓存，下次查询重新加载
+                    self._loaded = False
+                    return
+                self._apply(known, rows)
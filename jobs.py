@@ -0,0 +1,263 @@
+"""
+后台任务队列
+耗时的报表（全院总览、多年导出等）作为任务提交，由后台线程执行，请求立即返回任务ID，
+页面轮询任务进度，完成后下载结果文件。
+
+任务记录保存在本地 SQLite 文件中，同一台机器上的所有 worker 进程共享：
+任何进程的工作线程都可以领取排队中的任务，进程重启后未完成的任务会重新排队。
+结果文件保存在 result_dir/<任务ID>/ 下，超过 keep_days 的任务和结果会被清理。
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+STATUS_TEXT = {QUEUED: "排队中", RUNNING: "执行中", DONE: "已完成", FAILED: "失败"}
+
+
+class JobQueue:
+    """基于 SQLite 的持久化任务队列和工作线程池（每个进程一份）"""
+
+    def __init__(self, path, result_dir=None, workers=2, poll_interval=1.0, keep_days=7, recover_interval=60):
+        self.path = path
+        self.result_dir = result_dir or os.path.join(os.path.dirname(os.path.abspath(path)), 'job_results')
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.keep_days = keep_days
+        self.recover_interval = recover_interval
+        self._recovered_at = 0
+        self._handlers = {}
+        self._schema_ready = False
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def register(self, kind, handler):
+        """
+        注册任务类型，handler(params, progress) 返回 (文件名, 文件内容 bytes)
+        progress(done, total, message=None) 用于报告进度；抛出异常表示任务失败
+        """
+        self._handlers[kind] = handler
+
+    # ========== 提交与查询 ==========
+    def submit(self, kind, params):
+        """提交任务，返回任务ID"""
+        if kind not in self._handlers:
+            raise ValueError(f"未知的任务类型: {kind}")
+        self.start()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, kind, params, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), QUEUED, now, now)
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """查询任务，不存在时返回 None"""
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, limit=20):
+        """最近提交的任务"""
+        with self._connect() as connection:
+            rows = connection.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def result_path(self, job):
+        """已完成任务的结果文件路径"""
+        if job['status'] != DONE or not job['result_name']:
+            return None
+        return os.path.join(self.result_dir, job['job_id'], job['result_name'])
+
+    # ========== 工作线程 ==========
+    def start(self):
+        """启动本进程的工作线程（fork 之后每个进程处理第一个请求时启动，已启动时只比较一次进程号）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            self._stopping.clear()
+            os.makedirs(self.result_dir, exist_ok=True)
+            self._recover(startup=True)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=30):
+        """停止领取新任务，等待执行中的任务结束"""
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            job = self._claim()
+            if job is None:
+                # 空闲时定期回收其他进程退出时遗留的任务
+                if time.monotonic() - self._recovered_at > self.recover_interval:
+                    self._recover()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _claim(self):
+        """领取最早排队的一个本进程能处理的任务"""
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND kind IN ({', '.join('?' for _ in kinds)}) "
+                "ORDER BY created_at LIMIT 1",
+                [QUEUED] + kinds
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, pid = ?, started_at = ?, updated_at = ? WHERE job_id = ?",
+                (RUNNING, os.getpid(), time.time(), time.time(), row['job_id'])
+            )
+            connection.execute("COMMIT")
+            return self._to_dict(row)
+        finally:
+            connection.close()
+
+    def _run(self, job):
+        job_id = job['job_id']
+
+        def progress(done, total, message=None):
+            self._update(job_id, progress=round(done / total, 4) if total else 0, message=message)
+
+        try:
+            filename, content = self._handlers[job['kind']](job['params'], progress)
+            directory = os.path.join(self.result_dir, job_id)
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, f".{filename}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, os.path.join(directory, filename))
+            self._update(job_id, status=DONE, progress=1, result_name=filename, result_size=len(content),
+                         finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, message=f"任务执行失败: {str(e)}", finished_at=time.time())
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE job_id = ?",
+                list(fields.values()) + [job_id]
+            )
+
+    def _recover(self, startup=False):
+        """把执行进程已经不存在的任务重新排队，并清理过期的任务和结果"""
+        self._recovered_at = time.monotonic()
+        with self._connect() as connection:
+            for job_id, pid in connection.execute("SELECT job_id, pid FROM jobs WHERE status = ?",
+                                                  (RUNNING,)).fetchall():
+                # 本进程刚启动时，记录为本进程 PID 的任务来自重启前使用相同 PID 的进程
+                if (startup and pid == os.getpid()) or not _pid_alive(pid):
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, progress = 0, message = ?, pid = NULL WHERE job_id = ?",
+                        (QUEUED, "执行进程已退出，重新排队", job_id)
+                    )
+            expired = time.time() - self.keep_days * 86400
+            for (job_id,) in connection.execute(
+                    "SELECT job_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, expired)
+            ).fetchall():
+                shutil.rmtree(os.path.join(self.result_dir, job_id), ignore_errors=True)
+                connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    # ========== 存储 ==========
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            self._create_schema(connection)
+            self._schema_ready = True
+        return _AutoClose(connection)
+
+    def _create_schema(self, connection):
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                result_name TEXT,
+                result_size INTEGER,
+                pid INTEGER,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['status_text'] = STATUS_TEXT.get(job['status'], job['status'])
+        return job
+
+
+class _AutoClose:
+    """sqlite3 连接的包装：with 语句结束时关闭连接（sqlite3 自带的 with 只提交不关闭）"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self._connection
+
+    def __exit__(self, *exc):
+        self._connection.close()
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
@@ -0,0 +1,265 @@
+"""
+Flask 路由压测脚本
+按脚本化的用户操作流程（总览、查询论文、添加作者、调整排名）并发访问 Web 服务，
+统计每个路由的吞吐量和 p50/p95/p99 延迟。
+
+只依赖 HTTP，因此既可以压测 `python app.py` 启动的内置服务器，也可以压测
+gunicorn/uwsgi 等任意 WSGI 服务器，用于估算 worker 数量和连接池大小。
+
+示例:
+    python load_test.py --base-url http://127.0.0.1:5000 --concurrency 16 --duration 60 \\
+        --teacher 00001 --teacher 00002 --paper 0001 --author-teacher 00007
+"""
+import argparse
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+
+class LoadTestStats:
+    """线程安全地收集每个路由的延迟样本"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, elapsed, ok):
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, wall_time):
+        """生成每个路由的统计结果"""
+        rows = []
+        with self.lock:
+            for route in sorted(self.latencies):
+                samples = sorted(self.latencies[route])
+                rows.append({
+                    'route': route,
+                    'requests': len(samples),
+                    'errors': self.errors[route],
+                    'throughput': len(samples) / wall_time if wall_time else 0.0,
+                    'p50': percentile(samples, 50),
+                    'p95': percentile(samples, 95),
+                    'p99': percentile(samples, 99),
+                    'max': samples[-1] if samples else 0.0,
+                })
+        return rows
+
+
+def percentile(sorted_samples, pct):
+    """最近秩法计算百分位数（输入必须已排序）"""
+    if not sorted_samples:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """不自动跟随重定向，写操作成功时返回的 302 本身就是一次完整请求"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class UserSession:
+    """模拟一个用户，按路由名记录每次请求的耗时"""
+
+    def __init__(self, base_url, stats, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def request(self, route, path, form=None):
+        data = urllib.parse.urlencode(form).encode('utf-8') if form is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data)
+        start = time.perf_counter()
+        ok = True
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                body = resp.read()
+                # 服务层失败时页面会带上错误提示，但状态码仍是 200
+                ok = b'alert-danger' not in body
+        except urllib.error.HTTPError as e:
+            # 302 代表写操作成功后重定向
+            ok = e.code in (301, 302, 303, 304)
+            e.close()
+        except Exception:
+            ok = False
+        self.stats.record(route, time.perf_counter() - start, ok)
+        return ok
+
+
+# ========== 用户操作流程 ==========
+def query_path(path, args, rng):
+    """查询结果页的 GET 地址（查询表单提交后会重定向到这里）"""
+    params = {'teacher_id': rng.choice(args.teacher)}
+    if args.start_year:
+        params['start_year'] = args.start_year
+    if args.end_year:
+        params['end_year'] = args.end_year
+    return f"{path}?{urllib.parse.urlencode(params)}"
+
+
+def journey_overview(session, args, rng):
+    """打开总览页并查询一位教师"""
+    session.request('GET /overview', '/overview')
+    session.request('GET /overview?teacher_id', query_path('/overview', args, rng))
+
+
+def journey_query_papers(session, args, rng):
+    """查询教师论文"""
+    session.request('GET /papers/query', '/papers/query')
+    session.request('GET /papers/query?teacher_id', query_path('/papers/query', args, rng))
+
+
+def journey_add_author(session, args, rng):
+    """给论文添加作者，随后删除以恢复数据"""
+    paper_id = rng.choice(args.paper)
+    teacher_id = rng.choice(args.author_teacher)
+    added = session.request('POST /papers/authors/add', '/papers/authors/add', {
+        'paper_id': paper_id,
+        'teacher_id': teacher_id,
+        'author_rank': 1,
+    })
+    if added:
+        session.request('POST /papers/authors/delete', '/papers/authors/delete', {
+            'paper_id': paper_id,
+            'teacher_id': teacher_id,
+        })
+
+
+def journey_reorder_ranks(session, args, rng):
+    """添加作者后反复调整其排名，最后删除"""
+    paper_id = rng.choice(args.paper)
+    teacher_id = rng.choice(args.author_teacher)
+    added = session.request('POST /papers/authors/add', '/papers/authors/add', {
+        'paper_id': paper_id,
+        'teacher_id': teacher_id,
+        'author_rank': 1,
+    })
+    if not added:
+        return
+    for new_rank in (2, 1):
+        session.request('POST /papers/authors/update_rank', '/papers/authors/update_rank', {
+            'paper_id': paper_id,
+            'teacher_id': teacher_id,
+            'new_rank': new_rank,
+        })
+    session.request('POST /papers/authors/list', '/papers/authors/list', {'paper_id': paper_id})
+    session.request('POST /papers/authors/delete', '/papers/authors/delete', {
+        'paper_id': paper_id,
+        'teacher_id': teacher_id,
+    })
+
+
+JOURNEYS = {
+    'overview': journey_overview,
+    'query_papers': journey_query_papers,
+    'add_author': journey_add_author,
+    'reorder_ranks': journey_reorder_ranks,
+}
+
+# 默认流量配比：以读为主
+DEFAULT_MIX = 'overview=4,query_papers=4,add_author=1,reorder_ranks=1'
+
+
+def parse_mix(mix):
+    """解析 'name=weight,...' 形式的流量配比"""
+    names, weights = [], []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in JOURNEYS:
+            raise ValueError(f"未知的操作流程: {name}")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+def run_load_test(args):
+    """启动并发用户并返回 (统计结果, 实际耗时)"""
+    stats = LoadTestStats()
+    names, weights = parse_mix(args.mix)
+    if any(n in ('add_author', 'reorder_ranks') for n in names) and not (args.paper and args.author_teacher):
+        raise ValueError("写操作流程需要提供 --paper 和 --author-teacher")
+
+    deadline = time.monotonic() + args.duration
+    remaining = [args.iterations] if args.iterations else None
+    remaining_lock = threading.Lock()
+
+    def take_iteration():
+        if remaining is None:
+            return time.monotonic() < deadline
+        with remaining_lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        session = UserSession(args.base_url, stats, args.timeout)
+        while take_iteration():
+            name = rng.choices(names, weights)[0]
+            JOURNEYS[name](session, args, rng)
+            if args.think_time:
+                time.sleep(rng.uniform(0, args.think_time))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats, time.perf_counter() - start
+
+
+def print_report(rows, wall_time, concurrency):
+    total = sum(r['requests'] for r in rows)
+    errors = sum(r['errors'] for r in rows)
+    print(f"并发用户: {concurrency}  总耗时: {wall_time:.2f}s  "
+          f"总请求: {total}  错误: {errors}  吞吐量: {total / wall_time if wall_time else 0:.1f} req/s")
+    header = f"{'路由':<36}{'请求数':>8}{'错误':>6}{'req/s':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in rows:
+        print(f"{r['route']:<36}{r['requests']:>8}{r['errors']:>6}{r['throughput']:>9.1f}"
+              f"{r['p50'] * 1000:>10.1f}{r['p95'] * 1000:>10.1f}{r['p99'] * 1000:>10.1f}{r['max'] * 1000:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="教师教学科研登记系统 HTTP 压测")
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8, help="并发用户数")
+    parser.add_argument('--duration', type=float, default=30, help="压测时长（秒）")
+    parser.add_argument('--iterations', type=int, default=0, help="总操作流程次数，设置后忽略 --duration")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="流量配比，如 overview=4,add_author=1")
+    parser.add_argument('--teacher', action='append', default=[], help="查询用的教师ID，可重复")
+    parser.add_argument('--paper', action='append', default=[], help="写操作使用的论文ID，可重复")
+    parser.add_argument('--author-teacher', action='append', default=[],
+                        help="被添加为作者的教师ID（不应已是上述论文的作者），可重复")
+    parser.add_argument('--start-year', type=int)
+    parser.add_argument('--end-year', type=int)
+    parser.add_argument('--think-time', type=float, default=0.0, help="每个流程后的最大随机等待（秒）")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if not args.teacher:
+        parser.error("至少需要一个 --teacher")
+
+    stats, wall_time = run_load_test(args)
+    print_report(stats.report(wall_time), wall_time, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
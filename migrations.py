@@ -0,0 +1,446 @@
+"""
+数据库结构迁移
+每个迁移只执行一次，执行记录保存在 schema_migrations 表中
+
+    python migrations.py upgrade     # 执行所有未执行的迁移
+    python migrations.py status      # 查看迁移状态
+
+按年份分区的表需要定期维护：
+
+    python migrations.py add-partitions              # 预先建好未来几年的分区
+    python migrations.py archive --before 2015       # 把 2015 年之前的分区移入压缩的归档表
+"""
+import argparse
+import datetime
+import json
+
+# 作者/参与者排名键的初始间隔，与 teacher_service.RANK_KEY_GAP 一致
+RANK_KEY_GAP = 1 << 20
+
+# 按年份范围分区的表: 表名 -> (分区列, 分区后的主键, 数据版本号范围, 随之归档的子表 (表名, 关联列) 或 None,
+#                              编号登记表 (表名, 编号列) 或 None)
+# MySQL 要求主键包含分区列；原主键中的编号不再唯一，改由不分区的登记表的主键保证（服务层在同一事务中插入）
+# project_participant 没有年份列，不分区
+PARTITIONED_TABLES = {
+    'paper': ('pub_year', 'paper_id, pub_year', 'paper', ('paper_author', 'paper_id'), ('paper_registry', 'paper_id')),
+    'course_teaching': ('course_year', 'course_id, teacher_id, course_year, semester', 'course', None, None),
+}
+# 分区预留到当前年份之后的年数，之后的数据落在 pmax 分区
+PARTITION_AHEAD_YEARS = 2
+ARCHIVE_SUFFIX = '_archive'
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+
+def _index_exists(cursor, table, index_name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index_name)
+    )
+    return cursor.fetchone() is not None
+
+
+def _drop_indexes_on(cursor, table, column):
+    """删除包含指定列的所有非主键索引（线上索引名未知）"""
+    cursor.execute(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s "
+        "AND INDEX_NAME <> 'PRIMARY'",
+        (table, column)
+    )
+    for (index_name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX `{index_name}`")
+
+
+def rank_key_migration(table, parent_column, rank_column, key_column):
+    """
+    把连续排名列替换为稀疏排名键：新增键列并按原排名回填，删除原排名列及其索引
+    每一步都先检查当前结构，中途失败后可以重新执行
+    """
+    def step(cursor):
+        if not _column_exists(cursor, table, key_column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {key_column} BIGINT NULL")
+            cursor.execute(f"UPDATE {table} SET {key_column} = {rank_column} * {RANK_KEY_GAP}")
+            cursor.execute(f"ALTER TABLE {table} MODIFY {key_column} BIGINT NOT NULL")
+        if _column_exists(cursor, table, rank_column):
+            _drop_indexes_on(cursor, table, rank_column)
+            cursor.execute(f"ALTER TABLE {table} DROP COLUMN {rank_column}")
+        if not _index_exists(cursor, table, f"uk_{table}_rank_key"):
+            cursor.execute(f"ALTER TABLE {table} ADD UNIQUE KEY uk_{table}_rank_key ({parent_column}, {key_column})")
+    return [step]
+
+
+def _table_exists(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _partitions(cursor, table):
+    """表的分区 [(分区名, 上界)]，按分区顺序，MAXVALUE 分区的上界为 None；未分区时返回空列表"""
+    cursor.execute(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,)
+    )
+    return [(name, None if bound == 'MAXVALUE' else int(bound)) for name, bound in cursor.fetchall()]
+
+
+def _drop_foreign_keys(cursor, table):
+    """删除表上的外键和引用该表的外键（InnoDB 分区表不支持外键，级联删除改由服务层完成）"""
+    cursor.execute(
+        "SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)",
+        (table, table)
+    )
+    for owner, constraint_name in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {owner} DROP FOREIGN KEY `{constraint_name}`")
+
+
+def _year_partitions(first_year, last_year):
+    """p<年份> 分区保存该年的数据（第一个分区同时保存更早的数据），pmax 保存 last_year 之后的数据"""
+    partitions = [f"PARTITION p{year} VALUES LESS THAN ({year + 1})" for year in range(first_year, last_year + 1)]
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ", ".join(partitions)
+
+
+def member_summary_migration(table, child_table, id_column, key_column, count_column, names_column):
+    """
+    在论文/项目表上新增作者/参与者人数和姓名列表列并回填，之后由服务层在写作者/参与者时维护
+    回填可以重复执行（例如教师姓名修改后）
+    """
+    def step(cursor):
+        if not _column_exists(cursor, table, count_column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {count_column} INT NOT NULL DEFAULT 0")
+        if not _column_exists(cursor, table, names_column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {names_column} TEXT NULL")
+        # 默认的 1024 字节会截断人数较多的姓名列表
+        cursor.execute("SET SESSION group_concat_max_len = 1048576")
+        cursor.execute(
+            f"""
+            UPDATE {table} p SET
+                {count_column} = (SELECT COUNT(*) FROM {child_table} c WHERE c.{id_column} = p.{id_column}),
+                {names_column} = (SELECT GROUP_CONCAT(t.name ORDER BY c.{key_column} SEPARATOR ', ')
+                                  FROM {child_table} c JOIN teacher t ON c.teacher_id = t.teacher_id
+                                  WHERE c.{id_column} = p.{id_column})
+            """
+        )
+    return [step]
+
+
+def soft_delete_migration(table):
+    """新增删除时间列（墓碑）及索引，后台清理按删除时间分批查找"""
+    def step(cursor):
+        if not _column_exists(cursor, table, 'deleted_at'):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN deleted_at TIMESTAMP(6) NULL DEFAULT NULL")
+        if not _index_exists(cursor, table, f"idx_{table}_deleted_at"):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX idx_{table}_deleted_at (deleted_at)")
+    return [step]
+
+
+def partition_migration(table):
+    """
+    把表改为按年份范围分区：先建好编号登记表并回填，再删除相关外键，主键加上分区列，每年一个分区
+    已经分区的表直接跳过，中途失败后可以重新执行
+    """
+    column, primary_key, _, _, registry = PARTITIONED_TABLES[table]
+
+    def step(cursor):
+        if registry:
+            registry_table, id_column = registry
+            if not _table_exists(cursor, registry_table):
+                # 从原表复制编号列的类型
+                cursor.execute(f"CREATE TABLE {registry_table} (PRIMARY KEY ({id_column})) "
+                               f"SELECT {id_column} FROM {table} LIMIT 0")
+            cursor.execute(f"INSERT IGNORE INTO {registry_table} ({id_column}) SELECT {id_column} FROM {table}")
+        if _partitions(cursor, table):
+            return
+        _drop_foreign_keys(cursor, table)
+        last_year = datetime.date.today().year + PARTITION_AHEAD_YEARS
+        cursor.execute(f"SELECT MIN({column}) FROM {table}")
+        first_year = min(cursor.fetchone()[0] or last_year, last_year)
+        cursor.execute(
+            f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY ({primary_key}) "
+            f"PARTITION BY RANGE ({column}) ({_year_partitions(first_year, last_year)})"
+        )
+    return [step]
+
+
+# (迁移编号, 说明, [SQL语句...])，只能在末尾追加
+MIGRATIONS = [
+    ('0001_teacher_data_version', "教师数据版本号（HTTP 条件缓存）", [
+        """
+        CREATE TABLE IF NOT EXISTS teacher_data_version (
+            teacher_id VARCHAR(32) NOT NULL,
+            scope VARCHAR(16) NOT NULL,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            PRIMARY KEY (teacher_id, scope)
+        )
+        """,
+    ]),
+    ('0002_paper_author_rank_key', "论文作者排名改为稀疏排名键",
+     rank_key_migration('paper_author', 'paper_id', 'author_rank', 'author_rank_key')),
+    ('0003_project_participant_rank_key', "项目参与者排名改为稀疏排名键",
+     rank_key_migration('project_participant', 'project_id', 'participant_rank', 'participant_rank_key')),
+    ('0004_paper_partition_by_year', "论文表按发表年份分区（论文编号唯一性改由 paper_registry 保证）", partition_migration('paper')),
+    ('0005_course_teaching_partition_by_year', "教学任务表按授课年份分区", partition_migration('course_teaching')),
+    ('0006_paper_soft_delete', "论文删除改为标记删除", soft_delete_migration('paper')),
+    ('0007_project_soft_delete', "项目删除改为标记删除", soft_delete_migration('project')),
+    ('0008_paper_author_summary', "论文表冗余保存作者人数和姓名列表",
+     member_summary_migration('paper', 'paper_author', 'paper_id', 'author_rank_key', 'author_count', 'author_names')),
+    ('0009_project_participant_summary', "项目表冗余保存参与者人数和姓名列表",
+     member_summary_migration('project', 'project_participant', 'project_id', 'participant_rank_key',
+                              'participant_count', 'participant_names')),
+    ('0010_change_log', "变更日志及消费者位点（增量更新派生数据）", [
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            change_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            scope VARCHAR(16) NOT NULL,
+            action VARCHAR(64) NOT NULL,
+            entity_ids JSON NOT NULL,
+            teacher_ids JSON NOT NULL,
+            created_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            KEY idx_change_log_created_at (created_at)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS change_log_offset (
+            consumer VARCHAR(64) NOT NULL PRIMARY KEY,
+            change_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        )
+        """,
+    ]),
+    ('0011_audit_log', "审计日志（作者排名、经费、教学学时的修改记录）", [
+        """
+        CREATE TABLE IF NOT EXISTS audit_log (
+            audit_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            created_at TIMESTAMP(6) NOT NULL,
+            actor VARCHAR(64) NULL,
+            client VARCHAR(64) NULL,
+            action VARCHAR(64) NULL,
+            entity VARCHAR(32) NOT NULL,
+            entity_key JSON NOT NULL,
+            before_value JSON NULL,
+            after_value JSON NULL,
+            KEY idx_audit_log_created_at (created_at),
+            KEY idx_audit_log_entity (entity, created_at)
+        )
+        """,
+    ]),
+]
+
+
+def _ensure_migration_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            migration_id VARCHAR(64) NOT NULL PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def applied_migrations(db_connector):
+    """返回已执行的迁移编号集合"""
+    connection = db_connector.get_connection()
+    cursor = connection.cursor()
+    try:
+        _ensure_migration_table(cursor)
+        cursor.execute("SELECT migration_id FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def apply_migrations(db_connector, migrations=MIGRATIONS):
+    """按顺序执行未执行的迁移，返回本次执行的迁移编号列表"""
+    done = applied_migrations(db_connector)
+    connection = db_connector.get_connection()
+    cursor = connection.cursor()
+    executed = []
+    try:
+        for migration_id, description, statements in migrations:
+            if migration_id in done:
+                continue
+            print(f"执行迁移 {migration_id}: {description}")
+            # MySQL 的 DDL 会隐式提交，迁移中的语句需要能够重复执行
+            for statement in statements:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (migration_id) VALUES (%s)", (migration_id,))
+            connection.commit()
+            executed.append(migration_id)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return executed
+
+
+# ========== 分区维护 ==========
+def add_partitions(db_connector, until_year):
+    """把 pmax 分区拆分出截至 until_year 的年份分区，返回 {表名: [新增的分区名]}"""
+    connection = db_connector.get_connection()
+    cursor = connection.cursor()
+    added = {}
+    try:
+        for table in PARTITIONED_TABLES:
+            bounds = [bound for _, bound in _partitions(cursor, table) if bound is not None]
+            if not bounds or max(bounds) > until_year:
+                continue
+            # 已有分区的最大上界就是下一个要新建的年份
+            first_year = max(bounds)
+            cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO "
+                           f"({_year_partitions(first_year, until_year)})")
+            added[table] = [f"p{year}" for year in range(first_year, until_year + 1)]
+    finally:
+        cursor.close()
+    return added
+
+
+def archive_partitions(db_connector, before_year):
+    """
+    把 before_year 之前的年份分区（连同子表中的关联行）移入 <表名>_archive 压缩表，再删除原分区
+    归档后的数据不再出现在任何查询中（归档论文的编号仍保留在 paper_registry 中，不能重复使用）；
+    涉及教师的数据版本号递增，各进程的缓存随之刷新
+    每个分区的数据先在一个事务中复制，再删除分区，中途失败后可以重新执行
+    返回 {表名: [归档的分区名]}
+    """
+    connection = db_connector.get_connection()
+    cursor = connection.cursor()
+    archived = {}
+    try:
+        for table, (_, _, scope, child, _) in PARTITIONED_TABLES.items():
+            partitions = [name for name, bound in _partitions(cursor, table)
+                          if bound is not None and bound <= before_year]
+            if not partitions:
+                continue
+            _ensure_archive_table(cursor, table)
+            if child:
+                _ensure_archive_table(cursor, child[0])
+            for partition in partitions:
+                try:
+                    teacher_ids = _move_partition_rows(cursor, table, partition, child)
+                    _bump_versions(cursor, scope, teacher_ids)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                cursor.execute(f"ALTER TABLE {table} DROP PARTITION {partition}")
+            archived[table] = partitions
+    finally:
+        cursor.close()
+    return archived
+
+
+def _ensure_archive_table(cursor, table):
+    """创建与原表结构相同、不分区、压缩存储的归档表"""
+    archive = table + ARCHIVE_SUFFIX
+    if _table_exists(cursor, archive):
+        return
+    cursor.execute(f"CREATE TABLE {archive} LIKE {table}")
+    remove_partitioning = " REMOVE PARTITIONING" if _partitions(cursor, table) else ""
+    cursor.execute(f"ALTER TABLE {archive} ROW_FORMAT=COMPRESSED{remove_partitioning}")
+
+
+def _move_partition_rows(cursor, table, partition, child):
+    """把一个分区及子表中的关联行复制到归档表并删除子表中的行，返回涉及的教师ID"""
+    source = f"{table} PARTITION ({partition})"
+    if child:
+        child_table, key = child
+        rows = f"{child_table} c JOIN {source} t ON c.{key} = t.{key}"
+        cursor.execute(f"SELECT DISTINCT c.teacher_id FROM {rows}")
+        teacher_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"INSERT IGNORE INTO {child_table}{ARCHIVE_SUFFIX} SELECT c.* FROM {rows}")
+        cursor.execute(f"DELETE c FROM {rows}")
+    else:
+        cursor.execute(f"SELECT DISTINCT teacher_id FROM {source}")
+        teacher_ids = [row[0] for row in cursor.fetchall()]
+    # 重新执行时归档表中可能已有这些行
+    cursor.execute(f"INSERT IGNORE INTO {table}{ARCHIVE_SUFFIX} SELECT * FROM {source}")
+    return teacher_ids
+
+
+def _bump_versions(cursor, scope, teacher_ids):
+    """
+    递增教师数据版本号并追加变更日志，与 TeacherService._bump_versions 相同
+    一个分区的论文/教学任务可能很多，变更日志中不列出ID，只列出涉及的教师
+    """
+    teacher_ids = sorted(set(teacher_ids))
+    if not teacher_ids:
+        return
+    cursor.execute(
+        "INSERT INTO teacher_data_version (teacher_id, scope, version, updated_at) VALUES "
+        + ", ".join(["(%s, %s, 1, CURRENT_TIMESTAMP(6))"] * len(teacher_ids))
+        + " ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6)",
+        [value for teacher_id in teacher_ids for value in (teacher_id, scope)]
+    )
+    cursor.execute(
+        "INSERT INTO change_log (scope, action, entity_ids, teacher_ids) VALUES (%s, 'archive', '[]', %s)",
+        (scope, json.dumps(teacher_ids))
+    )
+
+
+def main(argv=None):
+    from app import DB_CONFIG
+    from db_connector import DatabaseConnector
+
+    parser = argparse.ArgumentParser(description="数据库结构迁移")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('upgrade', help="执行所有未执行的迁移")
+    subparsers.add_parser('status', help="查看迁移状态")
+    add_parser = subparsers.add_parser('add-partitions', help="为分区表新建年份分区")
+    add_parser.add_argument('--until', type=int, default=datetime.date.today().year + PARTITION_AHEAD_YEARS,
+                            help="新建分区直到该年份（默认当前年份之后 %d 年）" % PARTITION_AHEAD_YEARS)
+    archive_parser = subparsers.add_parser('archive', help="把早期的年份分区移入压缩的归档表")
+    archive_parser.add_argument('--before', type=int, required=True, help="归档该年份之前的数据")
+    args = parser.parse_args(argv)
+    if args.command == 'archive' and args.before > datetime.date.today().year:
+        parser.error("只能归档当前年份之前的数据")
+
+    db_connector = DatabaseConnector()
+    db_connector.connect(host=DB_CONFIG['host'], database=DB_CONFIG['database'],
+                         user=DB_CONFIG['user'], password=DB_CONFIG['password'])
+    try:
+        if args.command == 'upgrade':
+            executed = apply_migrations(db_connector)
+            print(f"执行了 {len(executed)} 个迁移" if executed else "数据库已是最新结构")
+        elif args.command == 'add-partitions':
+            added = add_partitions(db_connector, args.until)
+            for table, partitions in added.items():
+                print(f"{table}: 新增分区 {', '.join(partitions)}")
+            if not added:
+                print(f"分区已覆盖到 {args.until} 年")
+        elif args.command == 'archive':
+            archived = archive_partitions(db_connector, args.before)
+            for table, partitions in archived.items():
+                print(f"{table}: 已归档分区 {', '.join(partitions)}")
+            if not archived:
+                print(f"没有 {args.before} 年之前的分区")
+        else:
+            done = applied_migrations(db_connector)
+            for migration_id, description, _ in MIGRATIONS:
+                print(f"[{'x' if migration_id in done else ' '}] {migration_id}  {description}")
+    finally:
+        db_connector.disconnect()
+
+
+if __name__ == '__main__':
+    main()
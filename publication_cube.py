@@ -0,0 +1,225 @@
+"""
+论文统计立方体
+在内存中维护 教师 × 发表年份 × 论文级别 × 论文类型 × 作者角色 的论文篇数（NumPy 稠密数组），
+任意维度的切片和汇总都只是一次数组索引加求和，不需要逐个教师查询论文再计数。
+
+作者角色是两位的位掩码：1 表示第一作者，2 表示通讯作者（3 为两者兼有，0 为其他作者）。
+
+与 collaboration.py 相同：第一次查询时整体加载，本进程的论文写操作后记下涉及的教师，
+下一次查询时只重新统计这些教师；其他进程的写操作通过数据版本号发现。
+NumPy 为可选依赖，未安装时本功能不可用。
+"""
+import threading
+
+from version_watch import VersionWatch
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PAPER_LEVEL_TEXT = {1: "CCF-A", 2: "CCF-B", 3: "CCF-C", 4: "中文CCF-A", 5: "中文CCF-B", 6: "无级别"}
+PAPER_TYPE_TEXT = {1: "full paper", 2: "short paper", 3: "poster paper", 4: "demo paper"}
+
+FIRST_AUTHOR = 1
+CORRESPONDING_AUTHOR = 2
+# 角色筛选 -> 符合条件的角色位掩码
+ROLES = {
+    'first': (FIRST_AUTHOR, FIRST_AUTHOR | CORRESPONDING_AUTHOR),
+    'corresponding': (CORRESPONDING_AUTHOR, FIRST_AUTHOR | CORRESPONDING_AUTHOR),
+    'first_or_corresponding': (FIRST_AUTHOR, CORRESPONDING_AUTHOR, FIRST_AUTHOR | CORRESPONDING_AUTHOR),
+}
+ROLE_TEXT = {'first': "第一作者", 'corresponding': "通讯作者", 'first_or_corresponding': "第一或通讯作者"}
+
+# 可以分组的维度（角色只用于筛选）
+DIMENSIONS = ('teacher', 'year', 'level', 'type')
+
+
+class PublicationCube:
+    """论文统计立方体（每个进程一份，线程安全，第一次查询时加载）"""
+
+    def __init__(self, teacher_service, sync_interval=5):
+        self.service = teacher_service
+        self.teacher_names = {}
+        # 教师轴和年份轴的编号
+        self._teachers = []
+        self._teacher_index = {}
+        self._first_year = None
+        # shape: (教师, 年份, 级别, 类型, 角色)，级别和类型按枚举值减一编号
+        self._counts = None
+        self._loaded = False
+        # 加载期间数据发生变化的教师，加载完成后补上；不在加载时为 None
+        self._loading = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # 增量更新的查询和应用串行执行，避免较早查到的数据覆盖较新的数据
+        self._refresh_lock = threading.Lock()
+        # 本进程写操作涉及、尚未重新统计的教师
+        self._dirty = set()
+        self._watch = VersionWatch(teacher_service, 'paper', sync_interval)
+        teacher_service.add_listener(self._on_write)
+
+    # ========== 查询 ==========
+    def count(self, teacher_ids=None, start_year=None, end_year=None, levels=None, types=None, role=None):
+        """符合条件的论文篇数（按作者计，同一篇论文的多位作者各计一次）"""
+        success, rows = self.slice((), teacher_ids, start_year, end_year, levels, types, role)
+        if not success:
+            return False, rows
+        return True, rows[0]['count'] if rows else 0
+
+    def slice(self, group_by=('year',), teacher_ids=None, start_year=None, end_year=None, levels=None, types=None,
+              role=None):
+        """
+        按 group_by 中的维度分组统计符合条件的论文篇数，筛选条件为 None 表示不限
+        返回格式: [{'teacher_id': ..., 'year': ..., 'level': ..., 'type': ..., 'count': n}, ...]
+        只包含参与分组的维度和篇数不为 0 的组合，按分组维度排序
+        """
+        if np is None:
+            return False, "未安装 numpy，无法进行论文统计"
+        for dimension in group_by:
+            if dimension not in DIMENSIONS:
+                return False, f"未知的分组维度: {dimension}"
+        if len(set(group_by)) != len(group_by):
+            return False, "分组维度不能重复"
+        if role is not None and role not in ROLES:
+            return False, f"未知的作者角色: {role}"
+        success, error = self._ensure_loaded()
+        if not success:
+            return False, error
+
+        with self._lock:
+            if self._first_year is None:
+                return True, []
+            if teacher_ids is None:
+                teacher_axis = list(range(len(self._teachers)))
+            else:
+                teacher_axis = [self._teacher_index[teacher_id] for teacher_id in dict.fromkeys(teacher_ids)
+                                if teacher_id in self._teacher_index]
+            last_year = self._first_year + self._counts.shape[1] - 1
+            year_axis = list(range(max(start_year or self._first_year, self._first_year) - self._first_year,
+                                   min(end_year or last_year, last_year) - self._first_year + 1))
+            level_axis = [level - 1 for level in (levels or PAPER_LEVEL_TEXT) if level in PAPER_LEVEL_TEXT]
+            type_axis = [paper_type - 1 for paper_type in (types or PAPER_TYPE_TEXT) if paper_type in PAPER_TYPE_TEXT]
+            role_axis = list(ROLES[role]) if role is not None else [0, 1, 2, 3]
+            axes = [teacher_axis, year_axis, level_axis, type_axis]
+            if not all(axes):
+                return True, []
+            block = self._counts[np.ix_(teacher_axis, year_axis, level_axis, type_axis, role_axis)]
+            teachers, first_year = self._teachers, self._first_year
+
+        keep = [DIMENSIONS.index(dimension) for dimension in group_by]
+        totals = block.sum(axis=tuple(axis for axis in range(5) if axis not in keep))
+        values = {
+            'teacher': lambda i: teachers[teacher_axis[i]],
+            'year': lambda i: first_year + year_axis[i],
+            'level': lambda i: level_axis[i] + 1,
+            'type': lambda i: type_axis[i] + 1,
+        }
+        names = {'teacher': 'teacher_id', 'year': 'year', 'level': 'level', 'type': 'type'}
+        rows = []
+        for position in zip(*np.nonzero(totals)) if keep else [()]:
+            row = {names[dimension]: values[dimension](int(index))
+                   for dimension, index in zip(sorted(group_by, key=DIMENSIONS.index), position)}
+            row['count'] = int(totals[position])
+            rows.append(row)
+        if not keep and not rows[0]['count']:
+            return True, []
+        for row in rows:
+            if 'teacher_id' in row:
+                row['teacher_name'] = self.teacher_names.get(row['teacher_id'])
+            if 'level' in row:
+                row['level_text'] = PAPER_LEVEL_TEXT[row['level']]
+            if 'type' in row:
+                row['type_text'] = PAPER_TYPE_TEXT[row['type']]
+        rows.sort(key=lambda row: [row[names[dimension]] for dimension in group_by])
+        return True, rows
+
+    # ========== 缓存维护 ==========
+    def _fill(self, cells):
+        """把服务层的统计行累加到立方体中（必要时扩展教师轴和年份轴）"""
+        for teacher_id, year, level, paper_type, is_first, is_corresponding, count in cells:
+            if level not in PAPER_LEVEL_TEXT or paper_type not in PAPER_TYPE_TEXT:
+                continue
+            teacher = self._teacher_axis(teacher_id)
+            self._extend_years(year)
+            role = (FIRST_AUTHOR if is_first else 0) | (CORRESPONDING_AUTHOR if is_corresponding else 0)
+            self._counts[teacher, year - self._first_year, level - 1, paper_type - 1, role] += count
+
+    def _teacher_axis(self, teacher_id):
+        index = self._teacher_index.get(teacher_id)
+        if index is None:
+            index = self._teacher_index[teacher_id] = len(self._teachers)
+            self._teachers.append(teacher_id)
+            if index >= self._counts.shape[0]:
+                # 容量翻倍，新增教师时不必每次都复制整个数组
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts[:max(index, 1)])])
+        return index
+
+    def _extend_years(self, year):
+        if self._first_year is None:
+            self._first_year = year
+        year_count = self._counts.shape[1]
+        if year < self._first_year:
+            self._counts = np.pad(self._counts, ((0, 0), (self._first_year - year, 0), (0, 0), (0, 0), (0, 0)))
+            self._first_year = year
+        elif year >= self._first_year + year_count:
+            self._counts = np.pad(self._counts, ((0, 0), (0, year - self._first_year - year_count + 1),
+                                                 (0, 0), (0, 0), (0, 0)))
+
+    def _ensure_loaded(self):
+        changed = self._watch.poll()
+        with self._lock:
+            changed |= self._dirty
+            self._dirty = set()
+        if changed:
+            self._refresh(changed)
+        if self._loaded:
+            return True, None
+        with self._load_lock:
+            if self._loaded:
+                return True, None
+            with self._lock:
+                self._loading = set()
+            success, result = self.service.list_teachers()
+            if success:
+                teachers = result
+                success, result = self.service.get_publication_cells()
+            with self._lock:
+                changed, self._loading = self._loading, None
+                if not success:
+                    return False, result
+                self.teacher_names = {teacher['teacher_id']: teacher['name'] for teacher in teachers}
+                self._teachers, self._teacher_index, self._first_year = [], {}, None
+                self._counts = np.zeros((max(len(teachers), 1), 0, len(PAPER_LEVEL_TEXT), len(PAPER_TYPE_TEXT), 4),
+                                        dtype=np.int32)
+                for teacher in teachers:
+                    self._teacher_axis(teacher['teacher_id'])
+                self._fill(result)
+                self._loaded = True
+        if changed:
+            self._refresh(changed)
+        return True, None
+
+    def _on_write(self, event, data):
+        """写操作提交后在写请求的线程中调用：只记下涉及的教师，下一次查询时再更新，写请求不等待查询"""
+        if event == 'paper':
+            with self._lock:
+                self._dirty.update(data['teacher_ids'])
+
+    def _refresh(self, teacher_ids):
+        """重新统计指定教师的全部论文"""
+        with self._lock:
+            if self._loading is not None:
+                self._loading.update(teacher_ids)
+            if not self._loaded:
+                return
+        with self._refresh_lock:
+            success, cells = self.service.get_publication_cells(sorted(teacher_ids))
+            with self._lock:
+                if not success:
+                    # 无法增量更新时丢弃缓存，下次查询重新加载
+                    self._loaded = False
+                    return
+                for teacher_id in teacher_ids:
+                    self._counts[self._teacher_axis(teacher_id)] = 0
+                self._fill(cells)
@@ -0,0 +1,111 @@
+"""
+已删除数据的后台清理
+删除论文/项目时只设置 deleted_at（墓碑），请求不必等待作者/参与者行的删除和相应的锁；
+这里的后台线程分小批物理删除墓碑：每批一个短事务（见 TeacherService.purge_deleted），
+批与批之间暂停一段时间，清理完后每隔 interval 秒再检查一次。
+每个 worker 进程各有一个清理线程，每批只领取其他进程没有锁住的墓碑（SKIP LOCKED），互不等待。
+同一个线程也分批删除已过保留期、且仍在运行的持久消费者都已处理过的变更日志（见 changelog.py）。
+
+Web 进程中的清理线程在 fork 之后第一次处理请求时启动；也可以单独运行（例如放在定时任务中）:
+    python purger.py             # 清理全部墓碑后退出
+"""
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+
+from teacher_service import PURGE_BATCH_SIZE, SOFT_DELETE_TABLES
+
+
+class Purger:
+    """已删除论文/项目及过期变更日志的后台清理线程（每个进程一份）"""
+
+    def __init__(self, teacher_service, batch_size=PURGE_BATCH_SIZE, pause=0.2, interval=60):
+        self.service = teacher_service
+        self.batch_size = batch_size
+        # 两批之间的暂停（秒），给正常的写事务让出锁和 I/O
+        self.pause = pause
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        """启动本进程的清理线程（interval 不大于 0 时不启动）"""
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._loop, name="purger", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """停止清理线程，等待进行中的一批结束"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def purge(self):
+        """
+        分批清理全部墓碑和过期的变更日志，直到没有剩余或被停止
+        返回 (success, {类型: 删除条数} 或错误信息)，变更日志的类型为 change_log
+        """
+        steps = [(kind, functools.partial(self.service.purge_deleted, kind)) for kind in SOFT_DELETE_TABLES]
+        steps.append(('change_log', self.service.prune_change_log))
+        purged = {}
+        for kind, purge_batch in steps:
+            purged[kind] = 0
+            while not self._stopping.is_set():
+                try:
+                    success, count = purge_batch(limit=self.batch_size)
+                finally:
+                    # 暂停期间不占用连接池
+                    self.service.db.release_connection()
+                if not success:
+                    return False, count
+                purged[kind] += count
+                if count < self.batch_size:
+                    break
+                self._stopping.wait(self.pause)
+        return True, purged
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            success, result = self.purge()
+            if not success:
+                print(f"清理已删除数据失败: {result}", file=sys.stderr)
+            self._stopping.wait(self.interval)
+
+
+def main(argv=None):
+    from app import DB_CONFIG
+    from db_connector import DatabaseConnector
+    from teacher_service import TeacherService
+
+    parser = argparse.ArgumentParser(description="清理已删除的论文和项目，以及过期的变更日志")
+    parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE, help="每批删除的论文/项目数")
+    parser.add_argument('--pause', type=float, default=0.2, help="两批之间暂停的秒数")
+    args = parser.parse_args(argv)
+
+    db_connector = DatabaseConnector()
+    db_connector.configure(**DB_CONFIG)
+    purger = Purger(TeacherService(db_connector), batch_size=args.batch_size, pause=args.pause)
+    started_at = time.monotonic()
+    try:
+        success, result = purger.purge()
+    finally:
+        db_connector.drain()
+    if not success:
+        raise SystemExit(result)
+    print(f"清理完成（{time.monotonic() - started_at:.1f} 秒）: "
+          + "，".join(f"{kind} {count} 条" for kind, count in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+报表数据导出
+把多位教师、多个年份的教学、论文、项目数据导出为 CSV 文件并打包为 zip，
+供后台任务（见 jobs.py）调用，不依赖 Flask 请求上下文。
+"""
+import csv
+import io
+import zipfile
+
+# 各部分的列: [(列名, 字段名), ...]，字段名对应服务层查询结果
+COURSE_COLUMNS = [
+    ("课程号", 'course_id'), ("课程名", 'course_name'), ("课程类型", 'course_type_text'),
+    ("年份", 'course_year'), ("学期", 'semester_text'), ("主讲学时", 'teaching_hours'),
+    ("学时占比(%)", 'hours_percentage'), ("主讲教师", 'all_teachers'),
+]
+PAPER_COLUMNS = [
+    ("论文ID", 'paper_id'), ("题目", 'title'), ("期刊/会议", 'journal'), ("年份", 'pub_year'),
+    ("类型", 'paper_type_text'), ("级别", 'paper_level_text'), ("排名", 'author_rank'),
+    ("通讯作者", 'is_corresponding_text'), ("全部作者", 'all_authors'),
+]
+PROJECT_COLUMNS = [
+    ("项目ID", 'project_id'), ("项目名称", 'project_name'), ("项目来源", 'project_source'),
+    ("项目类型", 'project_type_text'), ("起止年份", 'duration'), ("总经费", 'total_funding'),
+    ("排名", 'participant_rank'), ("承担经费", 'funding'), ("经费占比(%)", 'funding_percentage'),
+    ("全部参与者", 'all_participants'),
+]
+
+# 每个 CSV 文件: (文件名, 服务层查询方法名, 列)
+EXPORT_TABLES = [
+    ('courses.csv', 'get_teacher_courses', COURSE_COLUMNS),
+    ('papers.csv', 'get_teacher_papers', PAPER_COLUMNS),
+    ('projects.csv', 'get_teacher_projects', PROJECT_COLUMNS),
+]
+
+
+def export_zip(service, teachers, start_year=None, end_year=None, progress=None):
+    """
+    导出教师数据，返回 zip 文件内容
+    teachers: [{'teacher_id': ..., 'name': ...}, ...]；progress(done, total, message) 可选
+    """
+    buffers = {}
+    writers = {}
+    for filename, _, columns in EXPORT_TABLES:
+        # 带 BOM，Excel 直接打开不会乱码
+        buffers[filename] = io.StringIO()
+        buffers[filename].write('\ufeff')
+        writers[filename] = csv.writer(buffers[filename])
+        writers[filename].writerow(["工号", "姓名"] + [title for title, _ in columns])
+
+    for i, teacher in enumerate(teachers, 1):
+        for filename, method, columns in EXPORT_TABLES:
+            success, rows = getattr(service, method)(teacher['teacher_id'], start_year, end_year)
+            if not success:
+                raise RuntimeError(rows)
+            for row in rows:
+                writers[filename].writerow([teacher['teacher_id'], teacher['name']]
+                                           + [row.get(field) for _, field in columns])
+        if progress:
+            progress(i, len(teachers), f"已导出 {i}/{len(teachers)} 位教师")
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, buffer in buffers.items():
+            archive.writestr(filename, buffer.getvalue().encode('utf-8'))
+    return output.getvalue()
@@ -0,0 +1,296 @@
+"""
+只读快照后端
+把线上 MySQL 的教学科研数据导出到本地 SQLite 文件，并提供与 mysql.connector
+接口兼容的只读连接，让 TeacherService 的查询方法直接在快照上运行：
+离线报表可以在笔记本上按本地磁盘速度运行，基准测试也不需要数据库服务器。
+
+导出快照:
+    python snapshot.py dump --output snapshot.db
+使用快照启动应用（所有写操作都会返回失败）:
+    DB_SNAPSHOT=snapshot.db python app.py
+"""
+import argparse
+import datetime
+import decimal
+import os
+import re
+import sqlite3
+import threading
+
+# 导出的表（按外键依赖顺序）；数据版本号和变更日志与数据在同一个事务中导出，
+# 快照上的条件 GET（ETag / Last-Modified）和各缓存的版本号检查照常工作
+SNAPSHOT_TABLES = [
+    'teacher',
+    'paper',
+    'paper_author',
+    'project',
+    'project_participant',
+    'course',
+    'course_teaching',
+    'teacher_data_version',
+    'change_log',
+]
+
+# 查询需要的索引: (索引名, 表, 列, 是否唯一)
+SNAPSHOT_INDEXES = [
+    ('pk_teacher', 'teacher', ['teacher_id'], True),
+    ('pk_paper', 'paper', ['paper_id'], True),
+    ('idx_paper_year', 'paper', ['pub_year'], False),
+    ('pk_paper_author', 'paper_author', ['paper_id', 'teacher_id'], True),
+    ('uk_paper_author_rank_key', 'paper_author', ['paper_id', 'author_rank_key'], True),
+    ('idx_paper_author_teacher', 'paper_author', ['teacher_id'], False),
+    ('pk_project', 'project', ['project_id'], True),
+    ('idx_project_years', 'project', ['start_year', 'end_year'], False),
+    ('pk_project_participant', 'project_participant', ['project_id', 'teacher_id'], True),
+    ('uk_project_participant_rank_key', 'project_participant', ['project_id', 'participant_rank_key'], True),
+    ('idx_project_participant_teacher', 'project_participant', ['teacher_id'], False),
+    ('pk_course', 'course', ['course_id'], True),
+    ('pk_course_teaching', 'course_teaching', ['course_id', 'teacher_id', 'course_year', 'semester'], True),
+    ('idx_course_teaching_teacher', 'course_teaching', ['teacher_id', 'course_year'], False),
+    ('idx_course_teaching_semester', 'course_teaching', ['course_id', 'course_year', 'semester'], False),
+    ('pk_teacher_data_version', 'teacher_data_version', ['teacher_id', 'scope'], True),
+    ('idx_teacher_data_version_updated', 'teacher_data_version', ['scope', 'updated_at'], False),
+    ('pk_change_log', 'change_log', ['change_id'], True),
+]
+
+# mysql.connector 字段类型名 -> SQLite 列类型
+_INTEGER_TYPES = {'TINY', 'SHORT', 'LONG', 'LONGLONG', 'INT24', 'YEAR', 'BIT'}
+_REAL_TYPES = {'DECIMAL', 'NEWDECIMAL', 'FLOAT', 'DOUBLE'}
+# 时间列声明为 TIMESTAMP，读取时转换回 datetime（版本号的 updated_at 要参与比较和生成 Last-Modified）
+_TIMESTAMP_TYPES = {'TIMESTAMP', 'DATETIME'}
+
+sqlite3.register_adapter(decimal.Decimal, float)
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(sep=' '))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+
+# ========== 导出 ==========
+def _sqlite_column_type(type_code):
+    from mysql.connector import FieldType
+    name = FieldType.get_info(type_code)
+    if name in _INTEGER_TYPES:
+        return 'INTEGER'
+    if name in _REAL_TYPES:
+        return 'REAL'
+    if name in _TIMESTAMP_TYPES:
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def dump_snapshot(db_connector, output_path, batch_size=5000, tables=SNAPSHOT_TABLES):
+    """
+    把各表导出到 SQLite 文件，返回 {表名: 行数}
+    所有表在同一个一致性快照事务中读取；先写临时文件，完成后再原子替换目标文件
+    """
+    tmp_path = f"{output_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = db_connector.get_connection()
+    cursor = connection.cursor()
+    target = sqlite3.connect(tmp_path)
+    counts = {}
+    try:
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        for table in tables:
+            cursor.execute(f"SELECT * FROM {table}")
+            columns = [(d[0], _sqlite_column_type(d[1])) for d in cursor.description]
+            column_defs = ', '.join(f'"{name}" {col_type}' for name, col_type in columns)
+            target.execute(f'CREATE TABLE "{table}" ({column_defs})')
+            insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in columns)})'
+            counts[table] = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                target.executemany(insert, rows)
+                counts[table] += len(rows)
+        connection.commit()
+
+        existing = {t: {r[1] for r in target.execute(f'PRAGMA table_info("{t}")')} for t in tables}
+        for index_name, table, columns, unique in SNAPSHOT_INDEXES:
+            # 快照结构跟随线上表结构，缺少的列直接跳过对应索引
+            if table not in existing or not set(columns) <= existing[table]:
+                continue
+            target.execute(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX "{index_name}" '
+                f'ON "{table}" ({", ".join(columns)})'
+            )
+        target.execute("ANALYZE")
+        target.commit()
+    except Exception:
+        connection.rollback()
+        target.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        cursor.close()
+    target.close()
+    os.replace(tmp_path, output_path)
+    return counts
+
+
+# ========== 只读后端 ==========
+class _OrderedConcat:
+    """GROUP_CONCAT(expr ORDER BY key SEPARATOR sep) 的 SQLite 实现"""
+
+    def __init__(self):
+        self.items = []
+        self.separator = ','
+
+    def step(self, value, key, separator):
+        if value is not None:
+            self.items.append((key, value))
+        self.separator = separator
+
+    def finalize(self):
+        if not self.items:
+            return None
+        self.items.sort(key=lambda item: (item[0] is None, item[0]))
+        return self.separator.join(str(value) for _, value in self.items)
+
+
+_GROUP_CONCAT = re.compile(
+    r"GROUP_CONCAT\(\s*(?P<expr>[^()]+?)\s+ORDER BY\s+(?P<key>[^()]+?)\s+SEPARATOR\s+(?P<sep>'[^']*')\s*\)",
+    re.IGNORECASE,
+)
+# 列与列相除，MySQL 返回小数而 SQLite 做整数除法
+_COLUMN_DIVISION = re.compile(r"\b(?P<left>[A-Za-z_][\w]*\.[A-Za-z_]\w*)\s*/\s*(?P<right>[A-Za-z_][\w]*\.[A-Za-z_]\w*)")
+_FOR_UPDATE = re.compile(r"\s+FOR\s+(UPDATE|SHARE)(\s+NOWAIT|\s+SKIP\s+LOCKED)?\b", re.IGNORECASE)
+
+
+def translate_query(query):
+    """把服务层使用的 MySQL 方言改写为 SQLite 可执行的语句"""
+    query = _GROUP_CONCAT.sub(lambda m: f"ORDERED_CONCAT({m['expr']}, {m['key']}, {m['sep']})", query)
+    query = _COLUMN_DIVISION.sub(lambda m: f"CAST({m['left']} AS REAL)/{m['right']}", query)
+    query = _FOR_UPDATE.sub('', query)
+    return query.replace('%s', '?')
+
+
+class SnapshotCursor:
+    """兼容 mysql.connector 游标接口的 SQLite 游标"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate_query(query), tuple(params or ()))
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(translate_query(query), [tuple(p) for p in seq_of_params])
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: value for d, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SnapshotConnection:
+    """兼容 mysql.connector 连接接口的只读 SQLite 连接，写语句会抛出异常"""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                                           detect_types=sqlite3.PARSE_DECLTYPES)
+        self._connection.create_aggregate('ORDERED_CONCAT', 3, _OrderedConcat)
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def cursor(self, dictionary=False):
+        return SnapshotCursor(self._connection.cursor(), dictionary)
+
+    def start_transaction(self, isolation_level=None, readonly=None):
+        pass
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._connection.execute("SELECT 1")
+
+    def close(self):
+        self._connection.close()
+
+
+class SnapshotBackend:
+    """每个线程一个只读 SQLite 连接"""
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"快照文件不存在: {path}")
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = SnapshotConnection(self.path)
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def main(argv=None):
+    from app import DB_CONFIG
+    from db_connector import DatabaseConnector
+
+    parser = argparse.ArgumentParser(description="导出教学科研数据只读快照")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    dump = subparsers.add_parser('dump', help="从 MySQL 导出快照")
+    dump.add_argument('--output', default='snapshot.db')
+    dump.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    db_connector = DatabaseConnector()
+    db_connector.connect(host=DB_CONFIG['host'], database=DB_CONFIG['database'],
+                         user=DB_CONFIG['user'], password=DB_CONFIG['password'])
+    try:
+        counts = dump_snapshot(db_connector, args.output, args.batch_size)
+    finally:
+        db_connector.disconnect()
+    for table, count in counts.items():
+        print(f"{table}: {count} 行")
+    print(f"快照已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+写路径并发压测
+多个线程同时对同一篇论文、同一个项目反复执行添加作者/参与者、调整排名、删除，
+统计吞吐量、失败次数和死锁重试次数，结束后检查排名是否仍然是连续且唯一的 1..n
+
+示例:
+    python stress_test.py --paper 0001 --project PROJ0001 --teacher 00002 --teacher 00003 \\
+        --teacher 00004 --threads 8 --duration 30
+每个线程使用一位教师，这些教师在压测开始前不能已经是该论文的作者或项目的参与者
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+
+from db_connector import DatabaseConnector
+from teacher_service import TeacherService
+
+
+def paper_worker(service, paper_id, teacher_id, deadline, results, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        ok, _ = service.add_paper_author(paper_id, teacher_id, 1, False)
+        results['add_paper_author', ok] += 1
+        if not ok:
+            continue
+        for _ in range(2):
+            ok, authors = service.get_paper_authors(paper_id)
+            new_rank = rng.randint(1, len(authors)) if ok and authors else 1
+            ok, _ = service.update_paper_author_rank(paper_id, teacher_id, new_rank)
+            results['update_paper_author_rank', ok] += 1
+        ok, _ = service.delete_paper_author(paper_id, teacher_id)
+        results['delete_paper_author', ok] += 1
+
+
+def project_worker(service, project_id, teacher_id, deadline, results, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        ok, _ = service.add_project_participant(project_id, teacher_id, 1, 1000)
+        results['add_project_participant', ok] += 1
+        if not ok:
+            continue
+        ok, participants = service.get_project_participants(project_id)
+        new_rank = rng.randint(1, len(participants)) if ok and participants else 1
+        ok, _ = service.update_project_participant_rank(project_id, teacher_id, new_rank)
+        results['update_project_participant_rank', ok] += 1
+        ok, _ = service.delete_project_participant(project_id, teacher_id)
+        results['delete_project_participant', ok] += 1
+
+
+def check_ranks(service, paper_id, project_id):
+    """检查排名是否为连续且唯一的 1..n"""
+    problems = []
+    if paper_id:
+        ok, authors = service.get_paper_authors(paper_id)
+        ranks = [a['author_rank'] for a in authors] if ok else []
+        if ranks != list(range(1, len(ranks) + 1)):
+            problems.append(f"论文 {paper_id} 作者排名异常: {ranks}")
+    if project_id:
+        ok, participants = service.get_project_participants(project_id)
+        ranks = [p['participant_rank'] for p in participants] if ok else []
+        if ranks != list(range(1, len(ranks) + 1)):
+            problems.append(f"项目 {project_id} 参与者排名异常: {ranks}")
+    return problems
+
+
+def main(argv=None):
+    from app import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="写路径并发压测")
+    parser.add_argument('--paper', help="压测使用的论文ID")
+    parser.add_argument('--project', help="压测使用的项目ID")
+    parser.add_argument('--teacher', action='append', default=[], help="参与压测的教师ID，可重复")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30)
+    args = parser.parse_args(argv)
+    if not args.teacher or not (args.paper or args.project):
+        parser.error("需要 --teacher 以及 --paper 或 --project")
+
+    db_connector = DatabaseConnector()
+    config = dict(DB_CONFIG)
+    config['pool_size'] = args.threads + 1
+    config['replicas'] = []
+    db_connector.configure(**config)
+    service = TeacherService(db_connector)
+
+    results = Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def run(target, entity_id, teacher_id, seed):
+        local = Counter()
+        try:
+            target(service, entity_id, teacher_id, deadline, local, seed)
+        finally:
+            db_connector.release_connection()
+            with lock:
+                results.update(local)
+
+    threads = []
+    for i in range(args.threads):
+        teacher_id = args.teacher[i % len(args.teacher)]
+        if args.paper and (not args.project or i % 2 == 0):
+            threads.append(threading.Thread(target=run, args=(paper_worker, args.paper, teacher_id, i)))
+        else:
+            threads.append(threading.Thread(target=run, args=(project_worker, args.project, teacher_id, i)))
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(results.values())
+    print(f"线程数: {args.threads}  耗时: {elapsed:.2f}s  写操作: {total}  "
+          f"吞吐量: {total / elapsed:.1f} 次/s  死锁重试: {service.write_retries}")
+    for name in sorted({name for name, _ in results}):
+        print(f"  {name:<36} 成功 {results[name, True]:>6}  失败 {results[name, False]:>6}")
+    problems = check_ranks(service, args.paper, args.project)
+    db_connector.release_connection()
+    db_connector.drain()
+    for problem in problems:
+        print(problem)
+    print("排名检查通过" if not problems else "排名检查失败")
+
+
+if __name__ == '__main__':
+    main()
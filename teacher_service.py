@@ -1,365 +1,445 @@
+import datetime
+import functools
+import json
+import random
+import sys
+import threading
+import time
 from db_connector import DatabaseConnector
+from course_planner import diff_plan, validate_plan
+from funding_analytics import yearly_series
+
+# 教师数据版本号的范围，对应总览页的三个部分
+DATA_SCOPES = ('paper', 'project', 'course')
+
+# 写事务遇到死锁（1213）或锁等待超时（1205）时整体重试，带抖动的指数退避
+RETRYABLE_ERRNOS = (1205, 1213)
+WRITE_MAX_ATTEMPTS = 5
+WRITE_RETRY_BASE_DELAY = 0.02
+WRITE_RETRY_MAX_DELAY = 0.5
+
+# 批量写入时每条多行语句包含的最大行数
+BULK_CHUNK_SIZE = 500
+
+# 作者/参与者排名在库中保存为稀疏排名键，相邻键之间的初始间隔
+# 插入和移动只改写一行；某个位置的间隔用尽时才把整篇论文（项目）的键重新等距排列
+# 对外（服务返回值和模板）仍然是连续的 1..n 排名
+RANK_KEY_GAP = 1 << 20
+
+# 论文/项目行上冗余保存的作者/参与者人数和按排名排列的姓名列表，作者/参与者变化时在同一事务中更新
+# 主表 -> (关联表, ID列, 排名键列, 人数列, 姓名列)
+MEMBER_SUMMARY_COLUMNS = {
+    'paper': ('paper_author', 'paper_id', 'author_rank_key', 'author_count', 'author_names'),
+    'project': ('project_participant', 'project_id', 'participant_rank_key', 'participant_count', 'participant_names'),
+}
+
+# 合作关系的来源: source -> (关联表, 主表, 论文/项目ID列)
+COLLABORATION_TABLES = {
+    'paper': ('paper_author', 'paper', 'paper_id'),
+    'project': ('project_participant', 'project', 'project_id'),
+}
+
+# 论文和项目删除时只设置 deleted_at（墓碑），所有查询都排除已删除的行，
+# 由后台清理线程（见 purger.py）分小批物理删除: 类型 -> (主表, 关联表, ID列, 编号登记表或 None)
+# paper 分区后主键包含 pub_year，论文编号的唯一性由不分区的 paper_registry 表保证，物理删除时一并删除
+SOFT_DELETE_TABLES = {
+    'paper': ('paper', 'paper_author', 'paper_id', 'paper_registry'),
+    'project': ('project', 'project_participant', 'project_id', None),
+}
+# 每批物理删除的论文/项目数
+PURGE_BATCH_SIZE = 100
+
+# 变更日志（change_log）：每个写事务在同一事务中追加一行，消费者按 change_id 顺序增量读取（见 changelog.py）
+# 每次读取的最大行数
+CHANGE_LOG_BATCH_SIZE = 500
+# change_id 在插入时分配，较小的 change_id 可能较晚提交，事务回滚后则永远不会出现。
+# 读取时遇到缺口先停在缺口前：在主库上读取时，information_schema.innodb_trx 中已没有早于缺口之后那条变更开始的
+# 其他事务，说明缺口对应的事务已经结束，立即跳过；否则（或者在副本上读取、无法查询 innodb_trx 时）
+# 从本进程第一次看到缺口起等待这么多秒再跳过。变更日志是每个写事务提交前的最后一条语句，
+# 插入到提交之间只有提交本身（通常几毫秒），副本按主库的提交顺序回放，5 秒足以等到较晚提交的变更
+CHANGE_LOG_GAP_TIMEOUT = 5
+# 变更日志保留的天数，所有持久消费者都已处理且超过保留期的记录由清理线程删除
+CHANGE_LOG_RETENTION_DAYS = 7
+# 持久消费者的位点超过这么久没有更新（消费者已停止）时，清理变更日志不再等待它；
+# 它恢复运行时从最新的变更重新开始，并由处理函数重建派生数据（见 consume_changes）
+CHANGE_LOG_CONSUMER_TIMEOUT = datetime.timedelta(days=1)
+
+def _utcnow():
+    """当前 UTC 时间（不带时区，与数据库会话时区 UTC 下的 TIMESTAMP 值比较）"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def write_transaction(error_prefix, isolation_level="READ COMMITTED"):
+    """
+    写操作装饰器：被装饰的方法额外接收一个 cursor 参数并返回 (success, message)
+    方法在一个事务中执行，成功时提交，返回失败时回滚；死锁或锁等待超时时自动重试
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            return self._run_write(error_prefix, isolation_level,
+                                   lambda cursor: method(self, cursor, *args, **kwargs), method.__name__)
+        return wrapper
+    return decorator
 
 class TeacherService:
     def __init__(self, db_connector):
         # 初始化函数，接收一个数据库连接器作为参数
         self.db = db_connector
+        # 因死锁或锁等待超时而重试的次数，用于压测统计
+        self.write_retries = 0
+        self._retry_lock = threading.Lock()
+        # 写操作监听器，事务提交后调用 listener(event, data)
+        self._listeners = []
+        self._local = threading.local()
+        # 变更日志中缺少的 change_id -> 本进程第一次看到这个缺口的时间（time.monotonic()）
+        self._change_log_gaps = {}
+        # 无法查询 information_schema.innodb_trx 时不再尝试，缺口只按 CHANGE_LOG_GAP_TIMEOUT 跳过
+        self._innodb_trx_available = True
     
-    # ========== 论文相关操作 ==========
-    def add_paper(self, paper_id, title, journal, pub_year, paper_type, paper_level, authors):
+    def add_listener(self, listener):
         """
-        添加论文及作者信息
-        authors格式: [(teacher_id, author_rank, is_corresponding), ...]
+        注册写操作监听器，写事务提交后在执行写操作的线程中调用 listener(event, data)
+        event 为数据范围（paper/project/course），data 中的 teacher_ids 为数据发生变化的教师，
+        ids 为被修改的论文/项目/课程ID；event 为 audit 时 data 为一条审计信息（见 _audit）
         """
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            # 检查论文类型和级别是否有效
-            if paper_type not in [1, 2, 3, 4] or paper_level not in range(1, 7):
-                return False, "无效的论文类型或级别"
-            
-            # 检查是否有且只有一位通讯作者
-            corresponding_authors = [a for a in authors if a[2]]
-            if len(corresponding_authors) != 1:
-                return False, "一篇论文必须有且只有一位通讯作者"
-            
-            # 检查作者排名是否唯一
-            ranks = [a[1] for a in authors]
-            if len(ranks) != len(set(ranks)):
-                return False, "作者排名不能重复"
-            max_rank = max(rank for _, rank, _ in authors)
-            
-            # 检查作者排名是否连续
-            if max_rank != len(set(authors)):
-                return False, "作者排名必须连续"
-            
-            # 插入论文信息
-            cursor.execute(
-                "INSERT INTO paper (paper_id, title, journal, pub_year, paper_type, paper_level) "
-                "VALUES (%s, %s, %s, %s, %s, %s)",
-                (paper_id, title, journal, pub_year, paper_type, paper_level)
-            )
-            
-            # 插入作者信息
-            for teacher_id, rank, is_corresponding in authors:
-                cursor.execute(
-                    "INSERT INTO paper_author (paper_id, teacher_id, author_rank, is_corresponding) "
-                    "VALUES (%s, %s, %s, %s)",
-                    (paper_id, teacher_id, rank, is_corresponding)
-                )
-            
-            connection.commit()
-            return True, "论文添加成功"
-        except Exception as e:
-            connection.rollback()
-            return False, f"添加论文失败: {str(e)}"
-        finally:
-            cursor.close()
+        self._listeners.append(listener)
     
-    def update_paper(self, paper_id, title=None, journal=None, year=None, paper_type=None, paper_level=None):
-        """更新论文基本信息"""
+    # ========== 教师相关操作 ==========
+    def get_teacher_info(self, teacher_id):
+        """查询教师基本信息"""
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            # 构建更新语句
-            updates = []
-            params = []
-            if title is not None:
-                updates.append("title = %s")
-                params.append(title)
-            if journal is not None:
-                updates.append("journal = %s")
-                params.append(journal)
-            if year is not None:
-                updates.append("pub_year = %s")
-                params.append(year)
-            if paper_type is not None:
-                if paper_type not in [1, 2, 3, 4]:
-                    return False, "无效的论文类型"
-                updates.append("paper_type = %s")
-                params.append(paper_type)
-            if paper_level is not None:
-                if paper_level not in range(1, 7):
-                    return False, "无效的论文级别"
-                updates.append("paper_level = %s")
-                params.append(paper_level)
-            
-            if not updates:
-                return False, "没有提供更新内容"
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor(dictionary=True)
             
-            params.append(paper_id)
-            query = f"UPDATE paper SET {', '.join(updates)} WHERE paper_id = %s"
-            cursor.execute(query, params)
-            connection.commit()
-            return True, "论文更新成功"
+            cursor.execute("SELECT * FROM teacher WHERE teacher_id = %s", (teacher_id,))
+            teacher_info = cursor.fetchone()
+            if not teacher_info:
+                return False, "找不到指定的教师"
+            return True, self._describe_teacher(teacher_info)
         except Exception as e:
-            connection.rollback()
-            return False, f"更新论文失败: {str(e)}"
+            return False, f"查询教师失败: {str(e)}"
         finally:
             cursor.close()
-    
-    def delete_paper(self, paper_id):
-        """删除论文及其作者关联"""
+
+    def _describe_teacher(self, teacher_info):
+        """转换枚举值为可读文本"""
+        gender_map = {1: "男", 2: "女"}
+        title_map = {
+            1: "博士后", 2: "助教", 3: "讲师", 4: "副教授", 5: "特任教授",
+            6: "教授", 7: "助理研究员", 8: "特任副研究员", 
+            9: "副研究员", 10: "特任研究员", 11: "研究员"
+        }
+        
+        teacher_info['gender_text'] = gender_map.get(teacher_info['gender'], "未知")
+        teacher_info['title_text'] = title_map.get(teacher_info['title'], "未知")
+        return teacher_info
+
+    def list_teachers(self):
+        """查询全部教师的工号和姓名（按工号排序）"""
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            cursor.execute("DELETE FROM paper WHERE paper_id = %s", (paper_id,))
-            connection.commit()
-            return True, "论文删除成功"
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor(dictionary=True)
+
+            cursor.execute("SELECT teacher_id, name FROM teacher ORDER BY teacher_id")
+            return True, cursor.fetchall()
         except Exception as e:
-            connection.rollback()
-            return False, f"删除论文失败: {str(e)}"
+            return False, f"查询教师失败: {str(e)}"
         finally:
             cursor.close()
+
+    # ========== 论文相关操作 ==========
+    @write_transaction("添加论文失败")
+    def add_paper(self, cursor, paper_id, title, journal, pub_year, paper_type, paper_level, authors):
+        """
+        添加论文及作者信息
+        authors格式: [(teacher_id, author_rank, is_corresponding), ...]
+        """
+        # 检查论文类型和级别是否有效
+        if paper_type not in [1, 2, 3, 4] or paper_level not in range(1, 7):
+            return False, "无效的论文类型或级别"
+        
+        # 检查是否有且只有一位通讯作者
+        corresponding_authors = [a for a in authors if a[2]]
+        if len(corresponding_authors) != 1:
+            return False, "一篇论文必须有且只有一位通讯作者"
+        
+        # 检查作者排名是否唯一
+        ranks = [a[1] for a in authors]
+        if len(ranks) != len(set(ranks)):
+            return False, "作者排名不能重复"
+        max_rank = max(rank for _, rank, _ in authors)
+        
+        # 检查作者排名是否连续
+        if max_rank != len(set(authors)):
+            return False, "作者排名必须连续"
+        
+        # 分区后 paper 的主键包含 pub_year，论文编号的唯一性由 paper_registry 的主键保证（已删除但尚未清理的论文也占用编号）
+        # 并发添加同一编号时，后一个事务在这里等待前一个提交，之后得到重复而不会插入第二行
+        cursor.execute("INSERT IGNORE INTO paper_registry (paper_id) VALUES (%s)", (paper_id,))
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT deleted_at FROM paper WHERE paper_id = %s", (paper_id,))
+            existing = cursor.fetchone()
+            if existing and existing[0] is not None:
+                return False, "该编号的论文已删除，清理完成前不能重复使用"
+            return False, "论文编号已存在"
+
+        # 插入论文信息
+        cursor.execute(
+            "INSERT INTO paper (paper_id, title, journal, pub_year, paper_type, paper_level) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (paper_id, title, journal, pub_year, paper_type, paper_level)
+        )
+        
+        # 插入作者信息
+        for teacher_id, rank, is_corresponding in authors:
+            cursor.execute(
+                "INSERT INTO paper_author (paper_id, teacher_id, author_rank_key, is_corresponding) "
+                "VALUES (%s, %s, %s, %s)",
+                (paper_id, teacher_id, rank * RANK_KEY_GAP, is_corresponding)
+            )
+        
+        self._refresh_member_summary(cursor, 'paper', paper_id)
+        self._bump_versions(cursor, 'paper', [a[0] for a in authors], ids=[paper_id])
+        return True, "论文添加成功"
+    
+    @write_transaction("更新论文失败")
+    def update_paper(self, cursor, paper_id, title=None, journal=None, year=None, paper_type=None, paper_level=None):
+        """更新论文基本信息"""
+        # 构建更新语句
+        updates = []
+        params = []
+        if title is not None:
+            updates.append("title = %s")
+            params.append(title)
+        if journal is not None:
+            updates.append("journal = %s")
+            params.append(journal)
+        if year is not None:
+            updates.append("pub_year = %s")
+            params.append(year)
+        if paper_type is not None:
+            if paper_type not in [1, 2, 3, 4]:
+                return False, "无效的论文类型"
+            updates.append("paper_type = %s")
+            params.append(paper_type)
+        if paper_level is not None:
+            if paper_level not in range(1, 7):
+                return False, "无效的论文级别"
+            updates.append("paper_level = %s")
+            params.append(paper_level)
+        
+        if not updates:
+            return False, "没有提供更新内容"
+        if not self._lock_paper(cursor, paper_id):
+            return False, "论文不存在"
+        
+        params.append(paper_id)
+        query = f"UPDATE paper SET {', '.join(updates)} WHERE paper_id = %s"
+        cursor.execute(query, params)
+        self._bump_versions(cursor, 'paper', self._paper_teachers(cursor, paper_id), ids=[paper_id])
+        return True, "论文更新成功"
+    
+    @write_transaction("删除论文失败")
+    def delete_paper(self, cursor, paper_id):
+        """删除论文：只标记为已删除，论文行和作者关联由后台清理（见 purge_deleted）"""
+        self._lock_paper(cursor, paper_id)
+        teacher_ids = self._paper_teachers(cursor, paper_id)
+        cursor.execute("UPDATE paper SET deleted_at = CURRENT_TIMESTAMP(6) WHERE paper_id = %s AND deleted_at IS NULL",
+                       (paper_id,))
+        self._bump_versions(cursor, 'paper', teacher_ids, ids=[paper_id])
+        return True, "论文删除成功"
     
     def get_teacher_papers(self, teacher_id, start_year=None, end_year=None):
         """查询教师发表的论文及详细作者信息"""
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor(dictionary=True)
-            
-            # 查询论文基本信息及作者在该论文中的详细信息
-            query = """
-                SELECT 
-                    p.paper_id,
-                    p.title,
-                    p.journal,
-                    p.pub_year,
-                    p.paper_type,
-                    p.paper_level,
-                    pa.author_rank,
-                    pa.is_corresponding,
-                    (SELECT COUNT(*) FROM paper_author WHERE paper_id = p.paper_id) AS author_count,
-                    (SELECT GROUP_CONCAT(t.name ORDER BY pa2.author_rank SEPARATOR ', ') 
-                     FROM paper_author pa2 
-                     JOIN teacher t ON pa2.teacher_id = t.teacher_id 
-                     WHERE pa2.paper_id = p.paper_id) AS all_authors
-                FROM paper p
-                JOIN paper_author pa ON p.paper_id = pa.paper_id
-                WHERE pa.teacher_id = %s
-            """
-            params = [teacher_id]
-            
-            if start_year and end_year:
-                query += " AND p.pub_year BETWEEN %s AND %s"
-                params.extend([start_year, end_year])
-            
-            query += " ORDER BY p.pub_year DESC, pa.author_rank"
-            
-            cursor.execute(query, params)
-            papers = cursor.fetchall()
-            
-            # 转换枚举值为可读文本
-            paper_type_map = {1: "full paper", 2: "short paper", 3: "poster paper", 4: "demo paper"}
-            paper_level_map = {
-                1: "CCF-A", 2: "CCF-B", 3: "CCF-C", 
-                4: "中文CCF-A", 5: "中文CCF-B", 6: "无级别"
-            }
-            
-            for paper in papers:
-                paper['paper_type_text'] = paper_type_map.get(paper['paper_type'], "未知类型")
-                paper['paper_level_text'] = paper_level_map.get(paper['paper_level'], "未知级别")
-                paper['is_corresponding_text'] = "是" if paper['is_corresponding'] else "否"
-            
-            return True, papers
+            return True, self._query_teacher_papers(cursor, [teacher_id], start_year, end_year)
         except Exception as e:
             return False, f"查询论文失败: {str(e)}"
         finally:
             cursor.close()
 
-    def add_paper_author(self, paper_id, teacher_id, author_rank, is_corresponding):
-        """添加论文作者关系，插入到指定排名，后续排名自动后移"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
+    def _query_teacher_papers(self, cursor, teacher_ids, start_year=None, end_year=None):
+        """查询多位教师发表的论文，结果中的 teacher_id 为所查询的教师"""
+        # 查询论文基本信息及作者在该论文中的详细信息
+        query = f"""
+            SELECT 
+                pa.teacher_id,
+                p.paper_id,
+                p.title,
+                p.journal,
+                p.pub_year,
+                p.paper_type,
+                p.paper_level,
+                (SELECT COUNT(*) FROM paper_author pa3
+                 WHERE pa3.paper_id = pa.paper_id AND pa3.author_rank_key <= pa.author_rank_key) AS author_rank,
+                pa.is_corresponding,
+                p.author_count,
+                p.author_names AS all_authors
+            FROM paper p
+            JOIN paper_author pa ON p.paper_id = pa.paper_id
+            WHERE p.deleted_at IS NULL AND pa.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})
+        """
+        params = list(teacher_ids)
+        
+        condition, year_params = self._year_condition('p.pub_year', start_year, end_year)
+        query += condition
+        params.extend(year_params)
+        
+        query += " ORDER BY p.pub_year DESC, author_rank"
+        
+        cursor.execute(query, params)
+        papers = cursor.fetchall()
+        
+        # 转换枚举值为可读文本
+        paper_type_map = {1: "full paper", 2: "short paper", 3: "poster paper", 4: "demo paper"}
+        paper_level_map = {
+            1: "CCF-A", 2: "CCF-B", 3: "CCF-C", 
+            4: "中文CCF-A", 5: "中文CCF-B", 6: "无级别"
+        }
+        
+        for paper in papers:
+            paper['paper_type_text'] = paper_type_map.get(paper['paper_type'], "未知类型")
+            paper['paper_level_text'] = paper_level_map.get(paper['paper_level'], "未知级别")
+            paper['is_corresponding_text'] = "是" if paper['is_corresponding'] else "否"
+        
+        return papers
 
-            # 检查论文和教师是否存在
-            cursor.execute("SELECT 1 FROM paper WHERE paper_id = %s", (paper_id,))
-            if not cursor.fetchone():
-                return False, "论文不存在"
-            
-            cursor.execute("SELECT 1 FROM teacher WHERE teacher_id = %s", (teacher_id,))
-            if not cursor.fetchone():
-                return False, "教师不存在"
+    @write_transaction("添加作者失败")
+    def add_paper_author(self, cursor, paper_id, teacher_id, author_rank, is_corresponding):
+        """添加论文作者关系，插入到指定排名，后续排名自动后移"""
+        # 先锁论文行，再按排名顺序锁全部作者行，所有改排名的写操作都遵循这个加锁顺序
+        if not self._lock_paper(cursor, paper_id):
+            return False, "论文不存在"
+        authors = self._lock_paper_authors(cursor, paper_id)
+        
+        cursor.execute("SELECT 1 FROM teacher WHERE teacher_id = %s", (teacher_id,))
+        if not cursor.fetchone():
+            return False, "教师不存在"
 
-            # 检查是否已经是作者
-            cursor.execute(
-                "SELECT 1 FROM paper_author WHERE paper_id = %s AND teacher_id = %s",
-                (paper_id, teacher_id)
-            )
-            if cursor.fetchone():
-                return False, "该教师已经是这篇论文的作者"
+        # 检查是否已经是作者
+        if any(author[0] == teacher_id for author in authors):
+            return False, "该教师已经是这篇论文的作者"
 
-            # 检查通讯作者数量
-            if is_corresponding:
-                cursor.execute(
-                    "SELECT COUNT(*) FROM paper_author WHERE paper_id = %s AND is_corresponding = TRUE",
-                    (paper_id,)
-                )
-                if cursor.fetchone()[0] >= 1:
-                    return False, "一篇论文最多只能有一位通讯作者"
+        # 检查通讯作者数量
+        if is_corresponding and any(author[2] for author in authors):
+            return False, "一篇论文最多只能有一位通讯作者"
 
-            # 获取当前最大排名
-            cursor.execute(
-                "SELECT COALESCE(MAX(author_rank), 0) FROM paper_author WHERE paper_id = %s",
-                (paper_id,)
-            )
-            max_rank = cursor.fetchone()[0]
+        # 获取当前最大排名
+        max_rank = len(authors)
 
-            # 检查排名是否有效（必须>=1）
-            if author_rank < 1 or author_rank > max_rank + 1:
-                return False, "排名必须大于等于1并不大于总人数"
+        # 检查排名是否有效（必须>=1）
+        if author_rank < 1 or author_rank > max_rank + 1:
+            return False, "排名必须大于等于1并不大于总人数"
 
-            # 如果插入位置在现有排名范围内，需要后移后续排名
-            if author_rank <= max_rank:
-                cursor.execute(
-                    "UPDATE paper_author SET author_rank = author_rank + 1 "
-                    "WHERE paper_id = %s AND author_rank >= %s",
-                    (paper_id, author_rank)
-                )
+        # 在前后两位作者的排名键之间取一个新键，后续作者的排名自然后移，不需要改写
+        rank_key = self._rank_key_at([author[3] for author in authors], author_rank)
+        if rank_key is None:
+            keys = self._renumber_rank_keys(cursor, 'paper_author', 'paper_id', 'author_rank_key',
+                                            paper_id, [author[0] for author in authors])
+            rank_key = self._rank_key_at(keys, author_rank)
 
-            # 插入新作者
-            cursor.execute(
-                "INSERT INTO paper_author (paper_id, teacher_id, author_rank, is_corresponding) "
-                "VALUES (%s, %s, %s, %s)",
-                (paper_id, teacher_id, author_rank, is_corresponding)
-            )
+        # 插入新作者
+        cursor.execute(
+            "INSERT INTO paper_author (paper_id, teacher_id, author_rank_key, is_corresponding) "
+            "VALUES (%s, %s, %s, %s)",
+            (paper_id, teacher_id, rank_key, is_corresponding)
+        )
 
-            connection.commit()
-            return True, "作者添加成功，排名已调整"
-        except Exception as e:
-            connection.rollback()
-            return False, f"添加作者失败: {str(e)}"
-        finally:
-            cursor.close()
+        self._audit('paper_author', {'paper_id': paper_id, 'teacher_id': teacher_id},
+                    after={'author_rank': author_rank, 'is_corresponding': bool(is_corresponding)})
+        self._refresh_member_summary(cursor, 'paper', paper_id)
+        self._bump_versions(cursor, 'paper', [author[0] for author in authors] + [teacher_id], ids=[paper_id])
+        return True, "作者添加成功，排名已调整"
 
-    def delete_paper_author(self, paper_id, teacher_id):
+    @write_transaction("删除作者失败")
+    def delete_paper_author(self, cursor, paper_id, teacher_id):
         """删除论文作者关系，并将后续排名前移"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-
-            # 获取被删除作者的排名
-            cursor.execute(
-                "SELECT author_rank FROM paper_author "
-                "WHERE paper_id = %s AND teacher_id = %s",
-                (paper_id, teacher_id)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return False, "找不到指定的作者关系"
+        if not self._lock_paper(cursor, paper_id):
+            return False, "论文不存在"
+        authors = self._lock_paper_authors(cursor, paper_id)
 
-            deleted_rank = result[0]
+        teacher_ids = [author[0] for author in authors]
+        if teacher_id not in teacher_ids:
+            return False, "找不到指定的作者关系"
+        author = authors[teacher_ids.index(teacher_id)]
 
-            # 删除作者
-            cursor.execute(
-                "DELETE FROM paper_author WHERE paper_id = %s AND teacher_id = %s",
-                (paper_id, teacher_id)
-            )
-
-            # 将后续排名前移
-            cursor.execute(
-                "UPDATE paper_author SET author_rank = author_rank - 1 "
-                "WHERE paper_id = %s AND author_rank > %s",
-                (paper_id, deleted_rank)
-            )
+        # 删除作者，后续作者的排名键不变，排名自然前移
+        cursor.execute(
+            "DELETE FROM paper_author WHERE paper_id = %s AND teacher_id = %s",
+            (paper_id, teacher_id)
+        )
+        self._audit('paper_author', {'paper_id': paper_id, 'teacher_id': teacher_id},
+                    before={'author_rank': author[1], 'is_corresponding': bool(author[2])})
 
-            connection.commit()
-            return True, "作者删除成功，排名已调整"
-        except Exception as e:
-            connection.rollback()
-            return False, f"删除作者失败: {str(e)}"
-        finally:
-            cursor.close()
+        self._refresh_member_summary(cursor, 'paper', paper_id)
+        self._bump_versions(cursor, 'paper', teacher_ids, ids=[paper_id])
+        return True, "作者删除成功，排名已调整"
 
-    def update_paper_author_rank(self, paper_id, teacher_id, new_rank):
+    @write_transaction("更新作者排名失败")
+    def update_paper_author_rank(self, cursor, paper_id, teacher_id, new_rank):
         """更新作者排名，自动调整其他作者的排名"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
+        if not self._lock_paper(cursor, paper_id):
+            return False, "论文不存在"
+        authors = self._lock_paper_authors(cursor, paper_id)
 
-            # 获取当前排名
-            cursor.execute(
-                "SELECT author_rank FROM paper_author "
-                "WHERE paper_id = %s AND teacher_id = %s",
-                (paper_id, teacher_id)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return False, "找不到指定的作者关系"
+        # 获取当前排名
+        ranks = {author[0]: author[1] for author in authors}
+        if teacher_id not in ranks:
+            return False, "找不到指定的作者关系"
 
-            current_rank = result[0]
+        current_rank = ranks[teacher_id]
 
-            if current_rank == new_rank:
-                return True, "排名未改变"
+        if current_rank == new_rank:
+            return True, "排名未改变"
 
-            # 获取当前最大排名
-            cursor.execute(
-                "SELECT COALESCE(MAX(author_rank), 0) FROM paper_author WHERE paper_id = %s",
-                (paper_id,)
-            )
-            max_rank = cursor.fetchone()[0]
+        # 获取当前最大排名
+        max_rank = len(authors)
 
-            if new_rank < 1 or new_rank > max_rank + 1:
-                return False, f"新排名必须在1到{max_rank + 1}之间"
+        if new_rank < 1 or new_rank > max_rank:
+            return False, f"新排名必须在1到{max_rank}之间"
 
-            # 临时将当前作者的排名设置为0（避免唯一约束冲突）
+        # 在新位置前后两位作者的排名键之间取一个新键，只改写被移动的作者
+        others = [author for author in authors if author[0] != teacher_id]
+        rank_key = self._rank_key_at([author[3] for author in others], new_rank)
+        if rank_key is None:
+            # 间隔已用尽，按移动后的顺序重新排列整篇论文的排名键
+            order = [author[0] for author in others]
+            order.insert(new_rank - 1, teacher_id)
+            self._renumber_rank_keys(cursor, 'paper_author', 'paper_id', 'author_rank_key', paper_id, order)
+        else:
             cursor.execute(
-                "UPDATE paper_author SET author_rank = 0 "
+                "UPDATE paper_author SET author_rank_key = %s "
                 "WHERE paper_id = %s AND teacher_id = %s",
-                (paper_id, teacher_id)
+                (rank_key, paper_id, teacher_id)
             )
+        self._audit('paper_author', {'paper_id': paper_id, 'teacher_id': teacher_id},
+                    before={'author_rank': current_rank}, after={'author_rank': new_rank})
 
-            # 调整其他作者的排名
-            if new_rank > current_rank:
-                # 排名后移（从current_rank+1到new_rank-1的排名减1）
-                cursor.execute(
-                    "UPDATE paper_author SET author_rank = author_rank - 1 "
-                    "WHERE paper_id = %s AND author_rank > %s AND author_rank <= %s",
-                    (paper_id, current_rank, new_rank - 1)
-                )
-            else:
-                # 排名前移（从new_rank到current_rank-1的排名加1）
-                cursor.execute(
-                    "UPDATE paper_author SET author_rank = author_rank + 1 "
-                    "WHERE paper_id = %s AND author_rank >= %s AND author_rank < %s",
-                    (paper_id, new_rank, current_rank)
-                )
-
-            # 设置新排名
-            cursor.execute(
-                "UPDATE paper_author SET author_rank = %s "
-                "WHERE paper_id = %s AND teacher_id = %s AND author_rank = 0",
-                (new_rank, paper_id, teacher_id)
-            )
-
-            connection.commit()
-            return True, "作者排名更新成功"
-        except Exception as e:
-            connection.rollback()
-            return False, f"更新作者排名失败: {str(e)}"
-        finally:
-            cursor.close()
+        self._refresh_member_summary(cursor, 'paper', paper_id)
+        self._bump_versions(cursor, 'paper', list(ranks), ids=[paper_id])
+        return True, "作者排名更新成功"
     
     def get_paper_authors(self, paper_id):
         """获取论文的所有作者信息（按排名排序）"""
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor(dictionary=True)
             
             cursor.execute(
-                "SELECT pa.teacher_id, t.name, pa.author_rank, pa.is_corresponding "
+                "SELECT pa.teacher_id, t.name, pa.is_corresponding "
                 "FROM paper_author pa "
+                "JOIN paper p ON pa.paper_id = p.paper_id "
                 "JOIN teacher t ON pa.teacher_id = t.teacher_id "
-                "WHERE pa.paper_id = %s "
-                "ORDER BY pa.author_rank",
+                "WHERE pa.paper_id = %s AND p.deleted_at IS NULL "
+                "ORDER BY pa.author_rank_key",
                 (paper_id,)
             )
             
             authors = cursor.fetchall()
+            for rank, author in enumerate(authors, 1):
+                author['author_rank'] = rank
             return True, authors
         except Exception as e:
             return False, f"查询论文作者失败: {str(e)}"
@@ -367,618 +447,1382 @@ class TeacherService:
             cursor.close()
     
     # ========== 项目相关操作 ==========
-    def add_project(self, project_id, name, source, project_type, start_year, end_year, total_funding, participants):
+    @write_transaction("添加项目失败")
+    def add_project(self, cursor, project_id, name, source, project_type, start_year, end_year, total_funding, participants):
         """
         添加项目及参与者信息
         participants格式: [(teacher_id, rank, funding), ...]
         """
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            # 检查项目类型是否有效
-            if project_type not in range(1, 6):
-                return False, "无效的项目类型"
-            
-            # 检查参与者经费总和是否等于项目总经费
-            total_participant_funding = sum(p[2] for p in participants)
-            if abs(total_participant_funding - total_funding) > 0.01:  # 允许浮点误差
-                return False, "参与者经费总和必须等于项目总经费"
-            
-            # 检查排名是否唯一
-            ranks = [p[1] for p in participants]
-            if len(ranks) != len(set(ranks)):
-                return False, "参与者排名不能重复"
-            
-            # 检查排名是否连续
-            max_rank = max(rank for _, rank, _ in participants)
-            if max_rank != len(set(participants)):
-                return False, "参与者排名必须连续"
-            
-            if start_year >= end_year:
-                return False, "项目开始年份必须小于结束年份"
-            
-            # 插入项目信息
+        # 检查项目类型是否有效
+        if project_type not in range(1, 6):
+            return False, "无效的项目类型"
+        
+        # 检查参与者经费总和是否等于项目总经费
+        total_participant_funding = sum(p[2] for p in participants)
+        if abs(total_participant_funding - total_funding) > 0.01:  # 允许浮点误差
+            return False, "参与者经费总和必须等于项目总经费"
+        
+        # 检查排名是否唯一
+        ranks = [p[1] for p in participants]
+        if len(ranks) != len(set(ranks)):
+            return False, "参与者排名不能重复"
+        
+        # 检查排名是否连续
+        max_rank = max(rank for _, rank, _ in participants)
+        if max_rank != len(set(participants)):
+            return False, "参与者排名必须连续"
+        
+        if start_year >= end_year:
+            return False, "项目开始年份必须小于结束年份"
+
+        # 已删除但尚未清理的项目也占用编号
+        cursor.execute("SELECT deleted_at FROM project WHERE project_id = %s FOR UPDATE", (project_id,))
+        existing = cursor.fetchone()
+        if existing:
+            return False, "项目编号已存在" if existing[0] is None else "该编号的项目已删除，清理完成前不能重复使用"
+
+        # 插入项目信息
+        cursor.execute(
+            "INSERT INTO project (project_id, project_name, project_source, project_type, start_year, end_year, total_funding) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (project_id, name, source, project_type, start_year, end_year, total_funding)
+        )
+        
+        # 插入参与者信息
+        for teacher_id, rank, funding in participants:
             cursor.execute(
-                "INSERT INTO project (project_id, project_name, project_source, project_type, start_year, end_year, total_funding) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (project_id, name, source, project_type, start_year, end_year, total_funding)
+                "INSERT INTO project_participant (project_id, teacher_id, participant_rank_key, funding) "
+                "VALUES (%s, %s, %s, %s)",
+                (project_id, teacher_id, rank * RANK_KEY_GAP, funding)
             )
-            
-            # 插入参与者信息
-            for teacher_id, rank, funding in participants:
-                cursor.execute(
-                    "INSERT INTO project_participant (project_id, teacher_id, participant_rank, funding) "
-                    "VALUES (%s, %s, %s, %s)",
-                    (project_id, teacher_id, rank, funding)
-                )
-            
-            connection.commit()
-            return True, "项目添加成功"
-        except Exception as e:
-            connection.rollback()
-            return False, f"添加项目失败: {str(e)}"
-        finally:
-            cursor.close()
-            
+        
+        self._refresh_member_summary(cursor, 'project', project_id)
+        self._bump_versions(cursor, 'project', [p[0] for p in participants], ids=[project_id])
+        return True, "项目添加成功"
+        
 
-    def delete_project(self, project_id):
-        """删除项目及其参与者关联"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            cursor.execute("DELETE FROM project WHERE project_id = %s", (project_id,))
-            connection.commit()
-            return True, "项目删除成功"
-        except Exception as e:
-            connection.rollback()
-            return False, f"删除项目失败: {str(e)}"
-        finally:
-            cursor.close()
+    @write_transaction("删除项目失败")
+    def delete_project(self, cursor, project_id):
+        """删除项目：只标记为已删除，项目行和参与者关联由后台清理（见 purge_deleted）"""
+        self._lock_project(cursor, project_id)
+        teacher_ids = self._project_teachers(cursor, project_id)
+        cursor.execute(
+            "UPDATE project SET deleted_at = CURRENT_TIMESTAMP(6) WHERE project_id = %s AND deleted_at IS NULL",
+            (project_id,)
+        )
+        self._bump_versions(cursor, 'project', teacher_ids, ids=[project_id])
+        return True, "项目删除成功"
 
-    def update_project(self, project_id, project_name=None, project_source=None, project_type=None, start_year=None, end_year=None):
+    @write_transaction("更新项目失败")
+    def update_project(self, cursor, project_id, project_name=None, project_source=None, project_type=None, start_year=None, end_year=None):
         """更新项目基本信息"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            # 构建更新语句
-            updates = []
-            params = []
-            if project_name is not None:
-                updates.append("project_name = %s")
-                params.append(project_name)
-            if project_source is not None:
-                updates.append("project_source = %s")
-                params.append(project_source)
-            if project_type is not None:
-                if project_type not in [1, 2, 3, 4, 5]:
-                    return False, "无效的论文类型"
-                updates.append("project_type = %s")
-                params.append(project_type)
-            if start_year is not None:
-                updates.append("start_year = %s")
-                params.append(start_year)
-            if end_year is not None:
-                updates.append("end_year = %s")
-                params.append(end_year)
-            cursor.execute(
-                "SELECT start_year, end_year FROM project "
-                "WHERE project_id = %s",
-                (project_id,)
-            )
-            result = cursor.fetchone()
-            start_year_check = max(result[0], start_year) if start_year is not None else result[0]
-            end_year_check = min(result[1], end_year) if end_year is not None else result[1]
-            if start_year_check >= end_year_check:
-                return False, "项目开始年份必须小于结束年份"
-            if not updates:
-                return False, "没有提供更新内容"
-            
-            params.append(project_id)
-            query = f"UPDATE project SET {', '.join(updates)} WHERE project_id = %s"
-            cursor.execute(query, params)
-            connection.commit()
-            return True, "项目更新成功"
-        except Exception as e:
-            connection.rollback()
-            return False, f"更新项目失败: {str(e)}"
-        finally:
-            cursor.close()
+        # 构建更新语句
+        updates = []
+        params = []
+        if project_name is not None:
+            updates.append("project_name = %s")
+            params.append(project_name)
+        if project_source is not None:
+            updates.append("project_source = %s")
+            params.append(project_source)
+        if project_type is not None:
+            if project_type not in [1, 2, 3, 4, 5]:
+                return False, "无效的论文类型"
+            updates.append("project_type = %s")
+            params.append(project_type)
+        if start_year is not None:
+            updates.append("start_year = %s")
+            params.append(start_year)
+        if end_year is not None:
+            updates.append("end_year = %s")
+            params.append(end_year)
+        result = self._lock_project(cursor, project_id)
+        if not result:
+            return False, "项目不存在"
+        start_year_check = max(result[0], start_year) if start_year is not None else result[0]
+        end_year_check = min(result[1], end_year) if end_year is not None else result[1]
+        if start_year_check >= end_year_check:
+            return False, "项目开始年份必须小于结束年份"
+        if not updates:
+            return False, "没有提供更新内容"
+        
+        params.append(project_id)
+        query = f"UPDATE project SET {', '.join(updates)} WHERE project_id = %s"
+        cursor.execute(query, params)
+        self._bump_versions(cursor, 'project', self._project_teachers(cursor, project_id), ids=[project_id])
+        return True, "项目更新成功"
     
     def get_teacher_projects(self, teacher_id, start_year=None, end_year=None):
         """查询教师参与的项目及详细参与信息"""
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor(dictionary=True)
-            
-            # 查询项目基本信息及教师在该项目中的详细信息
-            query = """
-                SELECT 
-                    p.project_id,
-                    p.project_name,
-                    p.project_source,
-                    p.project_type,
-                    p.start_year,
-                    p.end_year,
-                    p.total_funding,
-                    pp.participant_rank,
-                    pp.funding,
-                    pp.funding/p.total_funding*100 AS funding_percentage,
-                    (SELECT COUNT(*) FROM project_participant WHERE project_id = p.project_id) AS participant_count,
-                    (SELECT GROUP_CONCAT(t.name ORDER BY pp2.participant_rank SEPARATOR ', ') 
-                     FROM project_participant pp2 
-                     JOIN teacher t ON pp2.teacher_id = t.teacher_id 
-                     WHERE pp2.project_id = p.project_id) AS all_participants
-                FROM project p
-                JOIN project_participant pp ON p.project_id = pp.project_id
-                WHERE pp.teacher_id = %s
-            """
-            params = [teacher_id]
-            
-            if start_year and end_year:
-                query += " AND (p.start_year <= %s AND p.end_year >= %s)"
-                params.extend([end_year, start_year])
-            
-            query += " ORDER BY p.start_year DESC, pp.participant_rank"
-            
-            cursor.execute(query, params)
-            projects = cursor.fetchall()
-            
-            # 转换枚举值为可读文本
-            project_type_map = {
-                1: "国家级项目", 2: "省部级项目", 3: "市厅级项目",
-                4: "企业合作项目", 5: "其它类型项目"
-            }
-            
-            for project in projects:
-                project['project_type_text'] = project_type_map.get(project['project_type'], "未知类型")
-                project['duration'] = f"{project['start_year']}-{project['end_year']}"
-                project['funding_percentage'] = round(project['funding_percentage'], 2)
-            
-            return True, projects
+            return True, self._query_teacher_projects(cursor, [teacher_id], start_year, end_year)
         except Exception as e:
             return False, f"查询项目失败: {str(e)}"
         finally:
             cursor.close()
+
+    def _query_teacher_projects(self, cursor, teacher_ids, start_year=None, end_year=None):
+        """查询多位教师参与的项目，结果中的 teacher_id 为所查询的教师"""
+        # 查询项目基本信息及教师在该项目中的详细信息
+        query = f"""
+            SELECT 
+                pp.teacher_id,
+                p.project_id,
+                p.project_name,
+                p.project_source,
+                p.project_type,
+                p.start_year,
+                p.end_year,
+                p.total_funding,
+                (SELECT COUNT(*) FROM project_participant pp3
+                 WHERE pp3.project_id = pp.project_id
+                   AND pp3.participant_rank_key <= pp.participant_rank_key) AS participant_rank,
+                pp.funding,
+                pp.funding/p.total_funding*100 AS funding_percentage,
+                p.participant_count,
+                p.participant_names AS all_participants
+            FROM project p
+            JOIN project_participant pp ON p.project_id = pp.project_id
+            WHERE p.deleted_at IS NULL AND pp.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})
+        """
+        params = list(teacher_ids)
+        
+        # 项目与年份范围有交集，只给出一端时只检查这一端
+        if end_year is not None:
+            query += " AND p.start_year <= %s"
+            params.append(end_year)
+        if start_year is not None:
+            query += " AND p.end_year >= %s"
+            params.append(start_year)
+        
+        query += " ORDER BY p.start_year DESC, participant_rank"
+        
+        cursor.execute(query, params)
+        projects = cursor.fetchall()
+        
+        # 转换枚举值为可读文本
+        project_type_map = {
+            1: "国家级项目", 2: "省部级项目", 3: "市厅级项目",
+            4: "企业合作项目", 5: "其它类型项目"
+        }
+        
+        for project in projects:
+            project['project_type_text'] = project_type_map.get(project['project_type'], "未知类型")
+            project['duration'] = f"{project['start_year']}-{project['end_year']}"
+            project['funding_percentage'] = round(project['funding_percentage'], 2)
+        
+        return projects
     
-    def add_project_participant(self, project_id, teacher_id, participant_rank, funding):
+    @write_transaction("添加参与者失败")
+    def add_project_participant(self, cursor, project_id, teacher_id, participant_rank, funding):
         """添加项目参与者，插入到指定排名，后续排名自动后移，并更新项目总经费"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-
-            # 检查项目和教师是否存在
-            cursor.execute("SELECT 1 FROM project WHERE project_id = %s", (project_id,))
-            if not cursor.fetchone():
-                return False, "项目不存在"
-            
-            cursor.execute("SELECT 1 FROM teacher WHERE teacher_id = %s", (teacher_id,))
-            if not cursor.fetchone():
-                return False, "教师不存在"
+        # 先锁项目行，再按排名顺序锁全部参与者行，所有改排名或经费的写操作都遵循这个加锁顺序
+        if not self._lock_project(cursor, project_id):
+            return False, "项目不存在"
+        participants = self._lock_project_participants(cursor, project_id)
+        
+        cursor.execute("SELECT 1 FROM teacher WHERE teacher_id = %s", (teacher_id,))
+        if not cursor.fetchone():
+            return False, "教师不存在"
 
-            # 检查是否已经是参与者
-            cursor.execute(
-                "SELECT 1 FROM project_participant WHERE project_id = %s AND teacher_id = %s",
-                (project_id, teacher_id)
-            )
-            if cursor.fetchone():
-                return False, "该教师已经是这个项目的参与者"
-            # 获取当前最大排名和总经费
-            cursor.execute(
-                "SELECT COALESCE(MAX(participant_rank), 0), total_funding FROM project "
-                "LEFT JOIN project_participant USING(project_id) "
-                "WHERE project_id = %s GROUP BY project_id",
-                (project_id,)
-            )
-            result = cursor.fetchone()
-            max_rank = result[0]
-            current_total_funding = result[1]
+        # 检查是否已经是参与者
+        if any(participant[0] == teacher_id for participant in participants):
+            return False, "该教师已经是这个项目的参与者"
+        # 获取当前最大排名
+        max_rank = len(participants)
 
-            # 检查排名是否有效（必须>=1）
-            if participant_rank < 1 or participant_rank > max_rank + 1:
-                return False, "排名必须大于等于1并不大于总人数"
+        # 检查排名是否有效（必须>=1）
+        if participant_rank < 1 or participant_rank > max_rank + 1:
+            return False, "排名必须大于等于1并不大于总人数"
 
-            # 如果插入位置在现有排名范围内，需要后移后续排名
-            if participant_rank <= max_rank:
-                cursor.execute(
-                    "UPDATE project_participant SET participant_rank = participant_rank + 1 "
-                    "WHERE project_id = %s AND participant_rank >= %s",
-                    (project_id, participant_rank)
-                )
+        # 在前后两位参与者的排名键之间取一个新键，后续参与者的排名自然后移，不需要改写
+        rank_key = self._rank_key_at([participant[3] for participant in participants], participant_rank)
+        if rank_key is None:
+            keys = self._renumber_rank_keys(cursor, 'project_participant', 'project_id', 'participant_rank_key',
+                                            project_id, [participant[0] for participant in participants])
+            rank_key = self._rank_key_at(keys, participant_rank)
 
-            # 插入新参与者
-            cursor.execute(
-                "INSERT INTO project_participant (project_id, teacher_id, participant_rank, funding) "
-                "VALUES (%s, %s, %s, %s)",
-                (project_id, teacher_id, participant_rank, funding)
-            )
+        # 插入新参与者
+        cursor.execute(
+            "INSERT INTO project_participant (project_id, teacher_id, participant_rank_key, funding) "
+            "VALUES (%s, %s, %s, %s)",
+            (project_id, teacher_id, rank_key, funding)
+        )
+        self._audit('project_participant', {'project_id': project_id, 'teacher_id': teacher_id},
+                    after={'participant_rank': participant_rank, 'funding': float(funding)})
 
-            # 更新项目总经费
-            cursor.execute(
-                "UPDATE project SET total_funding = total_funding + %s "
-                "WHERE project_id = %s",
-                (funding, project_id)
-            )
+        # 更新项目总经费
+        cursor.execute(
+            "UPDATE project SET total_funding = total_funding + %s "
+            "WHERE project_id = %s",
+            (funding, project_id)
+        )
 
-            connection.commit()
-            return True, "参与者添加成功，排名和总经费已调整"
-        except Exception as e:
-            connection.rollback()
-            return False, f"添加参与者失败: {str(e)}"
-        finally:
-            cursor.close()
+        self._refresh_member_summary(cursor, 'project', project_id)
+        self._bump_versions(cursor, 'project', [participant[0] for participant in participants] + [teacher_id], ids=[project_id])
+        return True, "参与者添加成功，排名和总经费已调整"
 
-    def delete_project_participant(self, project_id, teacher_id):
+    @write_transaction("删除参与者失败")
+    def delete_project_participant(self, cursor, project_id, teacher_id):
         """删除项目参与者，并将后续排名前移，同时更新项目总经费"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
+        if not self._lock_project(cursor, project_id):
+            return False, "项目不存在"
+        participants = self._lock_project_participants(cursor, project_id)
 
-            # 获取被删除参与者的排名和经费
-            cursor.execute(
-                "SELECT participant_rank, funding FROM project_participant "
-                "WHERE project_id = %s AND teacher_id = %s",
-                (project_id, teacher_id)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return False, "找不到指定的参与者关系"
+        # 获取被删除参与者的排名和经费
+        result = next((p for p in participants if p[0] == teacher_id), None)
+        if not result:
+            return False, "找不到指定的参与者关系"
 
-            deleted_rank = result[0]
-            deleted_funding = result[1]
+        deleted_funding = result[2]
 
-            # 删除参与者
-            cursor.execute(
-                "DELETE FROM project_participant WHERE project_id = %s AND teacher_id = %s",
-                (project_id, teacher_id)
-            )
+        # 删除参与者，后续参与者的排名键不变，排名自然前移
+        cursor.execute(
+            "DELETE FROM project_participant WHERE project_id = %s AND teacher_id = %s",
+            (project_id, teacher_id)
+        )
+        self._audit('project_participant', {'project_id': project_id, 'teacher_id': teacher_id},
+                    before={'participant_rank': result[1], 'funding': float(deleted_funding)})
+
+        # 更新项目总经费
+        cursor.execute(
+            "UPDATE project SET total_funding = total_funding - %s "
+            "WHERE project_id = %s",
+            (deleted_funding, project_id)
+        )
+
+        self._refresh_member_summary(cursor, 'project', project_id)
+        self._bump_versions(cursor, 'project', [p[0] for p in participants], ids=[project_id])
+        return True, "参与者删除成功，排名和总经费已调整"
+
+    @write_transaction("更新项目经费失败")
+    def update_project_funding(self, cursor, project_id, teacher_id, new_funding):
+        """更新项目参与者经费，同时调整项目总经费"""
+        if not self._lock_project(cursor, project_id):
+            return False, "项目不存在"
+        participants = self._lock_project_participants(cursor, project_id)
+        
+        # 获取当前经费
+        result = next((p for p in participants if p[0] == teacher_id), None)
+        if not result:
+            return False, "找不到指定的项目参与者"
+        
+        old_funding = result[2]
+        funding_diff = new_funding - float(old_funding)
+        
+        # 更新参与者经费
+        cursor.execute(
+            "UPDATE project_participant SET funding = %s "
+            "WHERE project_id = %s AND teacher_id = %s",
+            (new_funding, project_id, teacher_id)
+        )
+        self._audit('project_participant', {'project_id': project_id, 'teacher_id': teacher_id},
+                    before={'funding': float(old_funding)}, after={'funding': float(new_funding)})
+        
+        # 更新项目总经费
+        cursor.execute(
+            "UPDATE project SET total_funding = total_funding + %s "
+            "WHERE project_id = %s",
+            (funding_diff, project_id)
+        )
+        
+        self._bump_versions(cursor, 'project', [p[0] for p in participants], ids=[project_id])
+        return True, "项目经费更新成功"
+
+    @write_transaction("调整项目经费分配失败")
+    def rebalance_project_funding(self, cursor, project_id, allocation, total_funding=None):
+        """
+        一次调整项目多位参与者的经费，未列出的参与者经费不变
+        allocation格式: {teacher_id: funding, ...}；提供 total_funding 时，调整后的经费总和必须等于它
+        所有参与者经费用一条语句更新，项目总经费只更新一次
+        """
+        if not allocation:
+            return False, "没有提供经费分配"
+
+        if not self._lock_project(cursor, project_id):
+            return False, "项目不存在"
+        participants = self._lock_project_participants(cursor, project_id)
+
+        fundings = {p[0]: float(p[2]) for p in participants}
+        unknown = [teacher_id for teacher_id in allocation if teacher_id not in fundings]
+        if unknown:
+            return False, f"以下教师不是该项目的参与者: {', '.join(unknown)}"
+        if any(funding < 0 for funding in allocation.values()):
+            return False, "经费不能为负数"
+
+        previous = dict(fundings)
+        fundings.update(allocation)
+        new_total = round(sum(fundings.values()), 2)
+        if total_funding is not None and abs(new_total - total_funding) > 0.01:  # 允许浮点误差
+            return False, "参与者经费总和必须等于项目总经费"
+
+        # 按教师ID顺序更新参与者经费，与其他写操作的加锁顺序一致
+        teacher_ids = sorted(allocation)
+        cursor.execute(
+            "UPDATE project_participant SET funding = CASE teacher_id "
+            + " ".join("WHEN %s THEN %s" for _ in teacher_ids)
+            + f" END WHERE project_id = %s AND teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})",
+            [value for teacher_id in teacher_ids for value in (teacher_id, allocation[teacher_id])]
+            + [project_id] + teacher_ids
+        )
+        for teacher_id in teacher_ids:
+            self._audit('project_participant', {'project_id': project_id, 'teacher_id': teacher_id},
+                        before={'funding': previous[teacher_id]}, after={'funding': float(allocation[teacher_id])})
+
+        # 更新项目总经费
+        cursor.execute(
+            "UPDATE project SET total_funding = %s WHERE project_id = %s",
+            (new_total, project_id)
+        )
+
+        self._bump_versions(cursor, 'project', list(fundings), ids=[project_id])
+        return True, "项目经费分配调整成功"
+
+    @write_transaction("更新参与者排名失败")
+    def update_project_participant_rank(self, cursor, project_id, teacher_id, new_rank):
+        """更新参与者排名，自动调整其他参与者的排名"""
+        if not self._lock_project(cursor, project_id):
+            return False, "项目不存在"
+        participants = self._lock_project_participants(cursor, project_id)
+
+        # 获取当前排名
+        ranks = {p[0]: p[1] for p in participants}
+        if teacher_id not in ranks:
+            return False, "找不到指定的参与者关系"
+
+        current_rank = ranks[teacher_id]
+
+        if current_rank == new_rank:
+            return True, "排名未改变"
+
+        # 获取当前最大排名
+        max_rank = len(participants)
 
-            # 将后续排名前移
+        if new_rank < 1 or new_rank > max_rank:
+            return False, f"新排名必须在1到{max_rank}之间"
+
+        # 在新位置前后两位参与者的排名键之间取一个新键，只改写被移动的参与者
+        others = [p for p in participants if p[0] != teacher_id]
+        rank_key = self._rank_key_at([p[3] for p in others], new_rank)
+        if rank_key is None:
+            # 间隔已用尽，按移动后的顺序重新排列整个项目的排名键
+            order = [p[0] for p in others]
+            order.insert(new_rank - 1, teacher_id)
+            self._renumber_rank_keys(cursor, 'project_participant', 'project_id', 'participant_rank_key',
+                                     project_id, order)
+        else:
             cursor.execute(
-                "UPDATE project_participant SET participant_rank = participant_rank - 1 "
-                "WHERE project_id = %s AND participant_rank > %s",
-                (project_id, deleted_rank)
+                "UPDATE project_participant SET participant_rank_key = %s "
+                "WHERE project_id = %s AND teacher_id = %s",
+                (rank_key, project_id, teacher_id)
             )
+        self._audit('project_participant', {'project_id': project_id, 'teacher_id': teacher_id},
+                    before={'participant_rank': current_rank}, after={'participant_rank': new_rank})
+
+        self._refresh_member_summary(cursor, 'project', project_id)
+        self._bump_versions(cursor, 'project', list(ranks), ids=[project_id])
+        return True, "参与者排名更新成功"
+
+    def get_project_participants(self, project_id):
+        """获取项目的所有参与者信息（按排名排序）"""
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor(dictionary=True)
 
-            # 更新项目总经费
             cursor.execute(
-                "UPDATE project SET total_funding = total_funding - %s "
-                "WHERE project_id = %s",
-                (deleted_funding, project_id)
+                "SELECT pp.teacher_id, t.name, pp.funding "
+                "FROM project_participant pp "
+                "JOIN project p ON pp.project_id = p.project_id "
+                "JOIN teacher t ON pp.teacher_id = t.teacher_id "
+                "WHERE pp.project_id = %s AND p.deleted_at IS NULL "
+                "ORDER BY pp.participant_rank_key",
+                (project_id,)
             )
 
-            connection.commit()
-            return True, "参与者删除成功，排名和总经费已调整"
+            participants = cursor.fetchall()
+            for rank, participant in enumerate(participants, 1):
+                participant['participant_rank'] = rank
+            return True, participants
         except Exception as e:
-            connection.rollback()
-            return False, f"删除参与者失败: {str(e)}"
+            return False, f"查询项目参与者失败: {str(e)}"
         finally:
             cursor.close()
+    # ========== 课程相关操作 ==========
+    @write_transaction("分配课程教学任务失败")
+    def assign_course_teaching(self, cursor, course_id, teacher_id, year, semester, hours):
+        """分配课程教学任务"""
+        # 获取课程总学时，同时锁住课程行，同一课程的教学任务修改串行执行
+        result = self._lock_course(cursor, course_id)
+        if not result:
+            return False, "找不到指定的课程"
+        
+        total_hours = result[0]
 
-    def update_project_funding(self, project_id, teacher_id, new_funding):
-        """更新项目参与者经费，同时调整项目总经费"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            # 获取当前经费和项目总经费
-            cursor.execute(
-                "SELECT funding FROM project_participant "
-                "WHERE project_id = %s AND teacher_id = %s",
-                (project_id, teacher_id)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return False, "找不到指定的项目参与者"
-            
-            old_funding = result[0]
-            funding_diff = new_funding - old_funding
-            
-            # 更新参与者经费
+        cursor.execute("SELECT 1 FROM teacher WHERE teacher_id = %s", (teacher_id,))
+        if not cursor.fetchone():
+            return False, "教师不存在"
+        
+        # 获取当前学期该课程已分配的总学时
+        cursor.execute(
+            "SELECT SUM(teaching_hours) FROM course_teaching "
+            "WHERE course_id = %s AND course_year = %s AND semester = %s",
+            (course_id, year, semester)
+        )
+        current_total = cursor.fetchone()[0] or 0
+        
+        # 检查分配后是否超过总学时
+        if current_total == 0 and hours == total_hours:
+        
+            # 插入或更新教学任务
             cursor.execute(
-                "UPDATE project_participant SET funding = %s "
-                "WHERE project_id = %s AND teacher_id = %s",
-                (new_funding, project_id, teacher_id)
-            )
-            
-            # 更新项目总经费
-            cursor.execute(
-                "UPDATE project SET total_funding = total_funding + %s "
-                "WHERE project_id = %s",
-                (funding_diff, project_id)
+                "INSERT INTO course_teaching (course_id, teacher_id, course_year, semester, teaching_hours) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE teaching_hours = teaching_hours + %s",
+                (course_id, teacher_id, year, semester, hours, hours)
             )
-            
-            connection.commit()
-            return True, "项目经费更新成功"
-        except Exception as e:
-            connection.rollback()
-            return False, f"更新项目经费失败: {str(e)}"
-        finally:
-            cursor.close()
+            self._audit('course_teaching',
+                        {'course_id': course_id, 'teacher_id': teacher_id, 'course_year': year, 'semester': semester},
+                        after={'teaching_hours': hours})
+            
+            self._bump_versions(cursor, 'course', self._course_teachers(cursor, course_id, year, semester), ids=[course_id])
+            return True, "课程教学任务分配成功"
+        else:
+            return False, "同学期已有分配，无法增加"
+    
+    @write_transaction("调整课程教学任务失败")
+    def adjust_course_teaching(self, cursor, course_id, teacher_id_from, teacher_id_to, year, semester, hours):
+        """
+        调整课程教学任务，从一个教师转移学时到另一个教师
+        确保总学时不变
+        """
+        # 检查两个教师是否不同
+        if teacher_id_from == teacher_id_to:
+            return False, "不能在同一教师之间转移学时"
+        
+        self._lock_course(cursor, course_id)
 
-    def update_project_participant_rank(self, project_id, teacher_id, new_rank):
-        """更新参与者排名，自动调整其他参与者的排名"""
-        try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM teacher WHERE teacher_id = %s", (teacher_id_to,))
+        if not cursor.fetchone():
+            return False, "转入教师不存在"
+        
+        # 检查转出教师是否有足够的学时
+        cursor.execute(
+            "SELECT teaching_hours FROM course_teaching "
+            "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s",
+            (course_id, teacher_id_from, year, semester)
+        )
+        result = cursor.fetchone()
+        if not result or result[0] < hours:
+            return False, "转出教师没有足够的学时可以转移"
+        
+        # 减少转出教师的学时
+        cursor.execute("DELETE FROM course_teaching "
+            "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s", 
+            (course_id, teacher_id_from, year, semester)
+        )
+        
+        cursor.execute(
+            "INSERT INTO course_teaching (course_id, teacher_id, course_year, semester, teaching_hours) "
+            "VALUES (%s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE teaching_hours = teaching_hours + %s",
+            (course_id, teacher_id_to, year, semester, hours, hours)
+        )
+        # 学时从一位教师转给另一位教师，记为一条
+        self._audit('course_teaching', {'course_id': course_id, 'course_year': year, 'semester': semester},
+                    before={'teacher_id': teacher_id_from, 'teaching_hours': result[0]},
+                    after={'teacher_id': teacher_id_to, 'teaching_hours': hours})
+        
+        self._bump_versions(cursor, 'course',
+                            self._course_teachers(cursor, course_id, year, semester) + [teacher_id_from], ids=[course_id])
+        return True, "课程教学任务调整成功"
+    
+    @write_transaction("移除课程教学任务失败")
+    def remove_course_teaching(self, cursor, course_id, teacher_id, year, semester):
+        """移除教师的部分课程教学任务"""
+        # 获取课程总学时
+        result2 = self._lock_course(cursor, course_id)
+        if not result2:
+            return False, "找不到指定的课程"
+        
+        total_hours = result2[0]
+        
+        # 检查教师是否有足够的学时可以移除
+        cursor.execute(
+            "SELECT teaching_hours FROM course_teaching "
+            "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s",
+            (course_id, teacher_id, year, semester)
+        )
+        result1 = cursor.fetchone()
+        if not result1:
+            return False, "找不到指定的课程教学任务"
+        current_hours = result1[0]
+        
+        if current_hours != total_hours:
+            return False, "该课程不是由该教师主讲，无法移除"
+        teacher_ids = self._course_teachers(cursor, course_id, year, semester)
 
-            # 获取当前排名
-            cursor.execute(
-                "SELECT participant_rank FROM project_participant "
-                "WHERE project_id = %s AND teacher_id = %s",
-                (project_id, teacher_id)
-            )
-            result = cursor.fetchone()
-            if not result:
-                return False, "找不到指定的参与者关系"
+        cursor.execute("DELETE FROM course_teaching "
+            "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s", 
+            (course_id, teacher_id, year, semester)
+        )
+        self._audit('course_teaching',
+                    {'course_id': course_id, 'teacher_id': teacher_id, 'course_year': year, 'semester': semester},
+                    before={'teaching_hours': current_hours})
+        
+        self._bump_versions(cursor, 'course', teacher_ids, ids=[course_id])
+        return True, "课程教学任务移除成功"
 
-            current_rank = result[0]
+    @write_transaction("应用学期排课计划失败")
+    def apply_semester_plan(self, cursor, year, semester, plan):
+        """
+        按整个学期的排课计划批量更新教学任务
+        plan格式: {course_id: [(teacher_id, hours), ...]}，见 course_planner
+        所有课程一次校验，差异在一个事务内用多行语句写入，任何一门课程不合法则整体不生效
+        """
+        if not plan:
+            return False, "计划为空"
+        course_ids = sorted(plan)
 
-            if current_rank == new_rank:
-                return True, "排名未改变"
+        # 按课程ID顺序锁住计划中的全部课程行，并一次取出总学时
+        cursor.execute(
+            f"SELECT course_id, total_hours FROM course WHERE course_id IN ({', '.join(['%s'] * len(course_ids))}) "
+            "ORDER BY course_id FOR UPDATE",
+            course_ids
+        )
+        course_hours = dict(cursor.fetchall())
 
-            # 获取当前最大排名
+        planned_teachers = sorted({teacher_id for assignments in plan.values() for teacher_id, _ in assignments})
+        existing_teachers = set()
+        if planned_teachers:
             cursor.execute(
-                "SELECT COALESCE(MAX(participant_rank), 0) FROM project_participant "
-                "WHERE project_id = %s",
-                (project_id,)
+                f"SELECT teacher_id FROM teacher WHERE teacher_id IN ({', '.join(['%s'] * len(planned_teachers))})",
+                planned_teachers
             )
-            max_rank = cursor.fetchone()[0]
+            existing_teachers = {row[0] for row in cursor.fetchall()}
+
+        problems = validate_plan(plan, course_hours, existing_teachers)
+        if problems:
+            more = f"等{len(problems)}个问题" if len(problems) > 5 else ""
+            return False, "；".join(problems[:5]) + more
 
-            if new_rank < 1 or new_rank > max_rank:
-                return False, f"新排名必须在1到{max_rank}之间"
+        cursor.execute(
+            "SELECT course_id, teacher_id, teaching_hours FROM course_teaching "
+            f"WHERE course_year = %s AND semester = %s AND course_id IN ({', '.join(['%s'] * len(course_ids))})",
+            [year, semester] + course_ids
+        )
+        current = {(course_id, teacher_id): hours for course_id, teacher_id, hours in cursor.fetchall()}
 
-            # 临时将当前参与者的排名设置为0（避免唯一约束冲突）
+        upserts, deletes = diff_plan(plan, current)
+        for start in range(0, len(deletes), BULK_CHUNK_SIZE):
+            chunk = deletes[start:start + BULK_CHUNK_SIZE]
             cursor.execute(
-                "UPDATE project_participant SET participant_rank = 0 "
-                "WHERE project_id = %s AND teacher_id = %s",
-                (project_id, teacher_id)
+                "DELETE FROM course_teaching WHERE course_year = %s AND semester = %s "
+                f"AND (course_id, teacher_id) IN ({', '.join(['(%s, %s)'] * len(chunk))})",
+                [year, semester] + [value for key in chunk for value in key]
             )
-
-            # 调整其他参与者的排名
-            if new_rank > current_rank:
-                # 排名后移（从current_rank+1到new_rank的排名减1）
-                cursor.execute(
-                    "UPDATE project_participant SET participant_rank = participant_rank - 1 "
-                    "WHERE project_id = %s AND participant_rank > %s AND participant_rank <= %s",
-                    (project_id, current_rank, new_rank)
-                )
-            else:
-                # 排名前移（从new_rank到current_rank-1的排名加1）
-                cursor.execute(
-                    "UPDATE project_participant SET participant_rank = participant_rank + 1 "
-                    "WHERE project_id = %s AND participant_rank >= %s AND participant_rank < %s",
-                    (project_id, new_rank, current_rank)
-                )
-
-            # 设置新排名
+        for start in range(0, len(upserts), BULK_CHUNK_SIZE):
+            chunk = upserts[start:start + BULK_CHUNK_SIZE]
             cursor.execute(
-                "UPDATE project_participant SET participant_rank = %s "
-                "WHERE project_id = %s AND teacher_id = %s AND participant_rank = 0",
-                (new_rank, project_id, teacher_id)
+                "INSERT INTO course_teaching (course_id, teacher_id, course_year, semester, teaching_hours) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))} "
+                "ON DUPLICATE KEY UPDATE teaching_hours = VALUES(teaching_hours)",
+                [value for course_id, teacher_id, hours in chunk
+                 for value in (course_id, teacher_id, year, semester, hours)]
             )
 
-            connection.commit()
-            return True, "参与者排名更新成功"
+        for course_id, teacher_id in deletes:
+            self._audit('course_teaching',
+                        {'course_id': course_id, 'teacher_id': teacher_id, 'course_year': year, 'semester': semester},
+                        before={'teaching_hours': current[(course_id, teacher_id)]})
+        for course_id, teacher_id, hours in upserts:
+            old_hours = current.get((course_id, teacher_id))
+            self._audit('course_teaching',
+                        {'course_id': course_id, 'teacher_id': teacher_id, 'course_year': year, 'semester': semester},
+                        before=None if old_hours is None else {'teaching_hours': old_hours},
+                        after={'teaching_hours': hours})
+
+        # 涉及课程的新旧主讲教师的数据都发生了变化
+        changed_courses = {course_id for course_id, _, _ in upserts} | {course_id for course_id, _ in deletes}
+        self._bump_versions(cursor, 'course',
+                            [teacher_id for (course_id, teacher_id) in current if course_id in changed_courses]
+                            + [teacher_id for course_id in changed_courses for teacher_id, _ in plan[course_id]], ids=changed_courses)
+        inserted = sum(1 for course_id, teacher_id, _ in upserts if (course_id, teacher_id) not in current)
+        return True, (f"学期计划已应用：新增 {inserted} 条，修改 {len(upserts) - inserted} 条，"
+                      f"删除 {len(deletes)} 条")
+    
+    def get_teacher_courses(self, teacher_id, start_year=None, end_year=None):
+        """查询教师主讲的课程及详细教学信息"""
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor(dictionary=True)
+            return True, self._query_teacher_courses(cursor, [teacher_id], start_year, end_year)
         except Exception as e:
-            connection.rollback()
-            return False, f"更新参与者排名失败: {str(e)}"
+            return False, f"查询课程失败: {str(e)}"
         finally:
             cursor.close()
 
-    def get_project_participants(self, project_id):
-        """获取项目的所有参与者信息（按排名排序）"""
+    def _query_teacher_courses(self, cursor, teacher_ids, start_year=None, end_year=None):
+        """查询多位教师主讲的课程，结果中的 teacher_id 为所查询的教师"""
+        # 查询课程基本信息及教师在该课程中的详细信息
+        query = f"""
+            SELECT 
+                ct.teacher_id,
+                c.course_id,
+                c.course_name,
+                c.total_hours,
+                c.course_type,
+                ct.course_year,
+                ct.semester,
+                ct.teaching_hours,
+                ct.teaching_hours/c.total_hours*100 AS hours_percentage,
+                (SELECT SUM(teaching_hours) FROM course_teaching 
+                 WHERE course_id = c.course_id AND course_year = ct.course_year 
+                 AND semester = ct.semester) AS total_assigned_hours,
+                (SELECT COUNT(*) FROM course_teaching 
+                 WHERE course_id = c.course_id AND course_year = ct.course_year 
+                 AND semester = ct.semester) AS teacher_count,
+                (SELECT GROUP_CONCAT(t.name ORDER BY ct2.teacher_id SEPARATOR ', ') 
+                 FROM course_teaching ct2 
+                 JOIN teacher t ON ct2.teacher_id = t.teacher_id 
+                 WHERE ct2.course_id = c.course_id AND ct2.course_year = ct.course_year 
+                 AND ct2.semester = ct.semester) AS all_teachers
+            FROM course c
+            JOIN course_teaching ct ON c.course_id = ct.course_id
+            WHERE ct.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})
+        """
+        params = list(teacher_ids)
+        
+        condition, year_params = self._year_condition('ct.course_year', start_year, end_year)
+        query += condition
+        params.extend(year_params)
+        
+        query += " ORDER BY ct.course_year DESC, ct.semester"
+        
+        cursor.execute(query, params)
+        courses = cursor.fetchall()
+        
+        # 转换枚举值为可读文本
+        course_type_map = {1: "本科生课程", 2: "研究生课程"}
+        semester_map = {1: "春季学期", 2: "夏季学期", 3: "秋季学期"}
+        
+        for course in courses:
+            course['course_type_text'] = course_type_map.get(course['course_type'], "未知类型")
+            course['semester_text'] = semester_map.get(course['semester'], "未知学期")
+            course['year_semester'] = f"{course['course_year']} {course['semester_text']}"
+            course['hours_percentage'] = round(course['hours_percentage'], 2)
+        
+        return courses
+    
+    # ========== 多教师对比 ==========
+    def compare_teachers(self, teacher_ids, start_year=None, end_year=None):
+        """
+        查询多位教师的总览数据用于对比：教师、课程、论文、项目各一次 IN 查询，再按教师分组
+        返回格式: [{'teacher': ..., 'courses': [...], 'papers': [...], 'projects': [...], 'summary': {...}}, ...]
+        顺序与 teacher_ids 相同（重复的ID只保留一次）
+        """
+        teacher_ids = list(dict.fromkeys(teacher_ids))
+        if not teacher_ids:
+            return False, "请至少指定一位教师"
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor(dictionary=True)
 
             cursor.execute(
-                "SELECT pp.teacher_id, t.name, pp.participant_rank, pp.funding "
-                "FROM project_participant pp "
-                "JOIN teacher t ON pp.teacher_id = t.teacher_id "
-                "WHERE pp.project_id = %s "
-                "ORDER BY pp.participant_rank",
-                (project_id,)
+                f"SELECT * FROM teacher WHERE teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})",
+                teacher_ids
             )
+            teachers = {teacher['teacher_id']: self._describe_teacher(teacher) for teacher in cursor.fetchall()}
+            missing = [teacher_id for teacher_id in teacher_ids if teacher_id not in teachers]
+            if missing:
+                return False, f"找不到教师: {', '.join(missing)}"
 
-            participants = cursor.fetchall()
-            return True, participants
+            result = {teacher_id: {'teacher': teachers[teacher_id], 'courses': [], 'papers': [], 'projects': []}
+                      for teacher_id in teacher_ids}
+            # 分组保持查询结果的顺序，与单个教师的查询结果一致
+            for key, query in (('courses', self._query_teacher_courses),
+                               ('papers', self._query_teacher_papers),
+                               ('projects', self._query_teacher_projects)):
+                for row in query(cursor, teacher_ids, start_year, end_year):
+                    result[row['teacher_id']][key].append(row)
+
+            for item in result.values():
+                item['summary'] = {
+                    'course_count': len(item['courses']),
+                    'teaching_hours': sum(course['teaching_hours'] for course in item['courses']),
+                    'paper_count': len(item['papers']),
+                    'first_author_count': sum(1 for paper in item['papers'] if paper['author_rank'] == 1),
+                    'corresponding_count': sum(1 for paper in item['papers'] if paper['is_corresponding']),
+                    'project_count': len(item['projects']),
+                    'funding': sum(project['funding'] for project in item['projects']),
+                }
+            return True, list(result.values())
         except Exception as e:
-            return False, f"查询项目参与者失败: {str(e)}"
+            return False, f"查询教师对比数据失败: {str(e)}"
         finally:
             cursor.close()
-    # ========== 课程相关操作 ==========
-    def assign_course_teaching(self, course_id, teacher_id, year, semester, hours):
-        """分配课程教学任务"""
+
+    # ========== 数据版本号 ==========
+    def get_data_versions(self, teacher_id):
+        """
+        查询教师各类数据的版本号
+        返回格式: {scope: (version, updated_at)}，scope 为 paper/project/course，从未修改过的为 (0, None)
+        """
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor()
             
-            # 获取课程总学时
             cursor.execute(
-                "SELECT total_hours FROM course WHERE course_id = %s",
-                (course_id,)
+                "SELECT scope, version, updated_at FROM teacher_data_version WHERE teacher_id = %s",
+                (teacher_id,)
             )
-            result = cursor.fetchone()
-            if not result:
-                return False, "找不到指定的课程"
-            
-            total_hours = result[0]
-            
-            # 获取当前学期该课程已分配的总学时
-            cursor.execute(
-                "SELECT SUM(teaching_hours) FROM course_teaching "
-                "WHERE course_id = %s AND course_year = %s AND semester = %s",
-                (course_id, year, semester)
-            )
-            current_total = cursor.fetchone()[0] or 0
-            
-            # 检查分配后是否超过总学时
-            if current_total == 0 and hours == total_hours:
-            
-                # 插入或更新教学任务
-                cursor.execute(
-                    "INSERT INTO course_teaching (course_id, teacher_id, course_year, semester, teaching_hours) "
-                    "VALUES (%s, %s, %s, %s, %s) "
-                    "ON DUPLICATE KEY UPDATE teaching_hours = teaching_hours + %s",
-                    (course_id, teacher_id, year, semester, hours, hours)
-                )
-                
-                connection.commit()
-                return True, "课程教学任务分配成功"
-            else:
-                return False, "同学期已有分配，无法增加"
+            versions = {scope: (0, None) for scope in DATA_SCOPES}
+            for scope, version, updated_at in cursor.fetchall():
+                versions[scope] = (version, updated_at)
+            return True, versions
         except Exception as e:
-            connection.rollback()
-            return False, f"分配课程教学任务失败: {str(e)}"
+            return False, f"查询数据版本失败: {str(e)}"
         finally:
             cursor.close()
-    
-    def adjust_course_teaching(self, course_id, teacher_id_from, teacher_id_to, year, semester, hours):
+
+    def get_changed_teachers(self, scope, since):
         """
-        调整课程教学任务，从一个教师转移学时到另一个教师
-        确保总学时不变
+        查询 since 之后（含）某类数据发生变化的教师
+        返回格式: [(teacher_id, version, updated_at), ...]
         """
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor()
-            
-            # 检查两个教师是否不同
-            if teacher_id_from == teacher_id_to:
-                return False, "不能在同一教师之间转移学时"
-            
-            # 检查转出教师是否有足够的学时
-            cursor.execute(
-                "SELECT teaching_hours FROM course_teaching "
-                "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s",
-                (course_id, teacher_id_from, year, semester)
-            )
-            result = cursor.fetchone()
-            if not result or result[0] < hours:
-                return False, "转出教师没有足够的学时可以转移"
-            
-            # 减少转出教师的学时
-            cursor.execute("DELETE FROM course_teaching "
-                "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s", 
-                (course_id, teacher_id_from, year, semester)
-            )
-            
+
             cursor.execute(
-                "INSERT INTO course_teaching (course_id, teacher_id, course_year, semester, teaching_hours) "
-                "VALUES (%s, %s, %s, %s, %s) "
-                "ON DUPLICATE KEY UPDATE teaching_hours = teaching_hours + %s",
-                (course_id, teacher_id_to, year, semester, hours, hours)
+                "SELECT teacher_id, version, updated_at FROM teacher_data_version "
+                "WHERE scope = %s AND updated_at >= %s",
+                (scope, since)
             )
-            
-            connection.commit()
-            return True, "课程教学任务调整成功"
+            return True, cursor.fetchall()
         except Exception as e:
-            connection.rollback()
-            return False, f"调整课程教学任务失败: {str(e)}"
+            return False, f"查询数据版本失败: {str(e)}"
         finally:
             cursor.close()
-    
-    def remove_course_teaching(self, course_id, teacher_id, year, semester):
-        """移除教师的部分课程教学任务"""
+
+    # ========== 教学工作量 ==========
+    def get_workload_cells(self, years, teacher_ids=None):
+        """
+        按 年份 × 教师 × 学期 × 课程类型 汇总主讲学时，只返回有学时的组合
+        返回格式: [(course_year, teacher_id, name, semester, course_type, hours), ...]
+        """
+        if not years or teacher_ids == []:
+            return True, []
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor()
-            
-            # 检查教师是否有足够的学时可以移除
-            cursor.execute(
-                "SELECT teaching_hours FROM course_teaching "
-                "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s",
-                (course_id, teacher_id, year, semester)
-            )
-            result1 = cursor.fetchone()
-            if not result1:
-                return False, "找不到指定的课程教学任务"
-            current_hours = result1[0]
-            
-            # 获取课程总学时
+
+            query = f"""
+                SELECT ct.course_year, ct.teacher_id, t.name, ct.semester, c.course_type,
+                       SUM(ct.teaching_hours) AS hours
+                FROM course_teaching ct
+                JOIN course c ON ct.course_id = c.course_id
+                JOIN teacher t ON ct.teacher_id = t.teacher_id
+                WHERE ct.course_year IN ({', '.join(['%s'] * len(years))})
+            """
+            params = list(years)
+
+            if teacher_ids is not None:
+                query += f" AND ct.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})"
+                params.extend(teacher_ids)
+
+            query += " GROUP BY ct.course_year, ct.teacher_id, t.name, ct.semester, c.course_type"
+
+            cursor.execute(query, params)
+            return True, [(year, teacher_id, name, semester, course_type, int(hours))
+                          for year, teacher_id, name, semester, course_type, hours in cursor.fetchall()]
+        except Exception as e:
+            return False, f"查询教学工作量失败: {str(e)}"
+        finally:
+            cursor.close()
+
+    # ========== 论文统计 ==========
+    def get_publication_cells(self, teacher_ids=None):
+        """
+        按 教师 × 发表年份 × 级别 × 类型 × 作者角色 统计论文篇数
+        返回格式: [(teacher_id, pub_year, paper_level, paper_type, is_first, is_corresponding, count), ...]
+        """
+        if teacher_ids == []:
+            return True, []
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor()
+
+            query = """
+                SELECT pa.teacher_id, p.pub_year, p.paper_level, p.paper_type,
+                       pa.author_rank_key = (SELECT MIN(author_rank_key) FROM paper_author
+                                             WHERE paper_id = pa.paper_id) AS is_first,
+                       pa.is_corresponding, COUNT(*)
+                FROM paper_author pa
+                JOIN paper p ON pa.paper_id = p.paper_id
+                WHERE p.deleted_at IS NULL
+            """
+            params = []
+
+            if teacher_ids is not None:
+                query += f" AND pa.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})"
+                params.extend(teacher_ids)
+
+            query += " GROUP BY pa.teacher_id, p.pub_year, p.paper_level, p.paper_type, is_first, pa.is_corresponding"
+
+            cursor.execute(query, params)
+            return True, [(teacher_id, year, level, paper_type, bool(is_first), bool(is_corresponding), int(count))
+                          for teacher_id, year, level, paper_type, is_first, is_corresponding, count
+                          in cursor.fetchall()]
+        except Exception as e:
+            return False, f"查询论文统计失败: {str(e)}"
+        finally:
+            cursor.close()
+
+    # ========== 项目区间 ==========
+    def get_project_ranges(self, teacher_ids=None, project_ids=()):
+        """
+        查询项目的起止年份和参与教师，用于建立区间索引
+        teacher_ids 为 None 时返回全部项目；否则返回这些教师参与的项目以及 project_ids 中的项目
+        返回格式: [(project_id, start_year, end_year, teacher_id), ...]，没有参与者的项目 teacher_id 为 None
+        """
+        if teacher_ids is not None and not teacher_ids and not project_ids:
+            return True, []
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor()
+
+            query = """
+                SELECT p.project_id, p.start_year, p.end_year, pp.teacher_id
+                FROM project p
+                LEFT JOIN project_participant pp ON p.project_id = pp.project_id
+            """
+            conditions = []
+            params = []
+
+            if teacher_ids:
+                conditions.append(
+                    "p.project_id IN (SELECT project_id FROM project_participant "
+                    f"WHERE teacher_id IN ({', '.join(['%s'] * len(teacher_ids))}))"
+                )
+                params.extend(teacher_ids)
+            if project_ids:
+                conditions.append(f"p.project_id IN ({', '.join(['%s'] * len(project_ids))})")
+                params.extend(project_ids)
+            query += " WHERE p.deleted_at IS NULL"
+            if conditions:
+                query += " AND (" + " OR ".join(conditions) + ")"
+
+            cursor.execute(query, params)
+            return True, cursor.fetchall()
+        except Exception as e:
+            return False, f"查询项目年份失败: {str(e)}"
+        finally:
+            cursor.close()
+
+    def get_projects(self, project_ids):
+        """按项目ID查询项目及其参与者（按开始年份从近到远排列）"""
+        if not project_ids:
+            return True, []
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor(dictionary=True)
+
             cursor.execute(
-                "SELECT total_hours FROM course WHERE course_id = %s",
-                (course_id,)
+                f"""
+                SELECT 
+                    p.project_id,
+                    p.project_name,
+                    p.project_source,
+                    p.project_type,
+                    p.start_year,
+                    p.end_year,
+                    p.total_funding,
+                    p.participant_count,
+                    p.participant_names AS all_participants
+                FROM project p
+                WHERE p.deleted_at IS NULL AND p.project_id IN ({', '.join(['%s'] * len(project_ids))})
+                ORDER BY p.start_year DESC, p.project_id
+                """,
+                list(project_ids)
             )
-            result2 = cursor.fetchone()
-            if not result2:
-                return False, "找不到指定的课程"
+            projects = cursor.fetchall()
             
-            total_hours = result2[0]
+            # 转换枚举值为可读文本
+            project_type_map = {
+                1: "国家级项目", 2: "省部级项目", 3: "市厅级项目",
+                4: "企业合作项目", 5: "其它类型项目"
+            }
             
-            if current_hours != total_hours:
-                return False, "该课程不是由该教师主讲，无法移除"
-
-            cursor.execute("DELETE FROM course_teaching "
-                "WHERE course_id = %s AND teacher_id = %s AND course_year = %s AND semester = %s", 
-                (course_id, teacher_id, year, semester)
-            )
+            for project in projects:
+                project['project_type_text'] = project_type_map.get(project['project_type'], "未知类型")
+                project['duration'] = f"{project['start_year']}-{project['end_year']}"
             
-            connection.commit()
-            return True, "课程教学任务移除成功"
+            return True, projects
         except Exception as e:
-            connection.rollback()
-            return False, f"移除课程教学任务失败: {str(e)}"
+            return False, f"查询项目失败: {str(e)}"
         finally:
             cursor.close()
-    
-    def get_teacher_courses(self, teacher_id, start_year=None, end_year=None):
-        """查询教师主讲的课程及详细教学信息"""
+
+    # ========== 经费分析 ==========
+    def get_funding_series(self, group_by=None, start_year=None, end_year=None, profile='uniform', teacher_ids=None):
+        """
+        把参与者承担的项目经费按年分摊后汇总为逐年序列（见 funding_analytics.yearly_series）
+        group_by: 'teacher' / 'project_type' / 'project_source'，None 为全院合计
+        只统计与 start_year..end_year 有交集的项目；teacher_ids 不为 None 时只统计这些教师
+        """
+        if teacher_ids == []:
+            return True, {'years': [], 'series': [], 'totals': []}
         try:
-            connection = self.db.get_connection()
+            connection = self.db.get_connection(readonly=True)
             cursor = connection.cursor(dictionary=True)
-            
-            # 查询课程基本信息及教师在该课程中的详细信息
+
             query = """
-                SELECT 
-                    c.course_id,
-                    c.course_name,
-                    c.total_hours,
-                    c.course_type,
-                    ct.course_year,
-                    ct.semester,
-                    ct.teaching_hours,
-                    ct.teaching_hours/c.total_hours*100 AS hours_percentage,
-                    (SELECT SUM(teaching_hours) FROM course_teaching 
-                     WHERE course_id = c.course_id AND course_year = ct.course_year 
-                     AND semester = ct.semester) AS total_assigned_hours,
-                    (SELECT COUNT(*) FROM course_teaching 
-                     WHERE course_id = c.course_id AND course_year = ct.course_year 
-                     AND semester = ct.semester) AS teacher_count,
-                    (SELECT GROUP_CONCAT(t.name ORDER BY ct2.teacher_id SEPARATOR ', ') 
-                     FROM course_teaching ct2 
-                     JOIN teacher t ON ct2.teacher_id = t.teacher_id 
-                     WHERE ct2.course_id = c.course_id AND ct2.course_year = ct.course_year 
-                     AND ct2.semester = ct.semester) AS all_teachers
-                FROM course c
-                JOIN course_teaching ct ON c.course_id = ct.course_id
-                WHERE ct.teacher_id = %s
+                SELECT pp.teacher_id, t.name, p.project_type, p.project_source,
+                       p.start_year, p.end_year, pp.funding
+                FROM project_participant pp
+                JOIN project p ON pp.project_id = p.project_id
+                JOIN teacher t ON pp.teacher_id = t.teacher_id
             """
-            params = [teacher_id]
-            
-            if start_year and end_year:
-                query += " AND ct.course_year BETWEEN %s AND %s"
-                params.extend([start_year, end_year])
-            
-            query += " ORDER BY ct.course_year DESC, ct.semester"
-            
+            conditions = ["p.deleted_at IS NULL"]
+            params = []
+
+            if start_year is not None:
+                conditions.append("p.end_year >= %s")
+                params.append(start_year)
+            if end_year is not None:
+                conditions.append("p.start_year <= %s")
+                params.append(end_year)
+            if teacher_ids is not None:
+                conditions.append(f"pp.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})")
+                params.extend(teacher_ids)
+            query += " WHERE " + " AND ".join(conditions)
+
             cursor.execute(query, params)
-            courses = cursor.fetchall()
-            
-            # 转换枚举值为可读文本
-            course_type_map = {1: "本科生课程", 2: "研究生课程"}
-            semester_map = {1: "春季学期", 2: "夏季学期", 3: "秋季学期"}
-            
-            for course in courses:
-                course['course_type_text'] = course_type_map.get(course['course_type'], "未知类型")
-                course['semester_text'] = semester_map.get(course['semester'], "未知学期")
-                course['year_semester'] = f"{course['course_year']} {course['semester_text']}"
-                course['hours_percentage'] = round(course['hours_percentage'], 2)
-            
-            return True, courses
+            rows = cursor.fetchall()
         except Exception as e:
-            return False, f"查询课程失败: {str(e)}"
+            return False, f"查询项目经费失败: {str(e)}"
         finally:
             cursor.close()
+        return yearly_series(rows, group_by, start_year, end_year, profile)
+
+    # ========== 合作关系 ==========
+    def get_collaboration_edges(self, source, teacher_ids=None):
+        """
+        统计教师两两合作的论文数（source='paper'）或项目数（source='project'）
+        teacher_ids 不为 None 时只返回这些教师的合作关系；每对教师两个方向各返回一行
+        返回格式: [(teacher_id, collaborator_id, count), ...]
+        """
+        if source not in COLLABORATION_TABLES:
+            return False, f"未知的合作关系类型: {source}"
+        if teacher_ids == []:
+            return True, []
+        table, parent_table, parent_column = COLLABORATION_TABLES[source]
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor()
+
+            query = f"""
+                SELECT a.teacher_id, b.teacher_id, COUNT(*)
+                FROM {table} a
+                JOIN {table} b ON a.{parent_column} = b.{parent_column} AND a.teacher_id <> b.teacher_id
+                JOIN {parent_table} p ON a.{parent_column} = p.{parent_column}
+                WHERE p.deleted_at IS NULL
+            """
+            params = []
+
+            if teacher_ids is not None:
+                query += f" AND a.teacher_id IN ({', '.join(['%s'] * len(teacher_ids))})"
+                params.extend(teacher_ids)
+
+            query += " GROUP BY a.teacher_id, b.teacher_id"
+
+            cursor.execute(query, params)
+            return True, [(teacher_id, collaborator_id, int(count))
+                          for teacher_id, collaborator_id, count in cursor.fetchall()]
+        except Exception as e:
+            return False, f"查询合作关系失败: {str(e)}"
+        finally:
+            cursor.close()
+
+    # ========== 变更日志 ==========
+    def get_change_log_tail(self):
+        """变更日志中最新的 change_id（没有记录时为 0）"""
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor()
+            cursor.execute("SELECT MAX(change_id) FROM change_log")
+            return True, cursor.fetchone()[0] or 0
+        except Exception as e:
+            return False, f"查询变更日志失败: {str(e)}"
+        finally:
+            cursor.close()
+
+    def get_changes(self, after_id, limit=CHANGE_LOG_BATCH_SIZE):
+        """
+        按 change_id 顺序读取 after_id 之后的至多 limit 条变更（遇到尚未补上的缺口时只返回缺口之前的部分）
+        返回格式: [{'change_id', 'scope', 'action', 'ids', 'teacher_ids', 'created_at'}, ...]
+        """
+        try:
+            connection = self.db.get_connection(readonly=True)
+            cursor = connection.cursor()
+            return True, self._read_changes(cursor, after_id, limit)
+        except Exception as e:
+            return False, f"查询变更日志失败: {str(e)}"
+        finally:
+            cursor.close()
+
+    @write_transaction("消费变更日志失败")
+    def consume_changes(self, cursor, consumer, handler, limit=CHANGE_LOG_BATCH_SIZE, from_start=False):
+        """
+        持久消费者处理一批变更：在一个事务中锁住消费者的位点，读取位点之后的变更，调用 handler(cursor, changes)，
+        再推进位点。handler 通过同一个 cursor 写入的数据与位点一起提交；handler 抛出异常时整批回滚，下次重新处理。
+        同一消费者在多个进程中运行时，位点上的行锁保证同一时刻只有一个进程在处理。
+        消费者第一次运行（from_start 为 False）或位点已过期时，位点移到最新的变更之后，并调用 handler(cursor, None)，
+        表示之前的变更不会再送达，派生数据需要重新加载。没有新变更时也定期刷新位点的更新时间，表示消费者仍在运行。
+        返回 (True, 本批处理的变更数)
+        """
+        cursor.execute("SELECT change_id, updated_at FROM change_log_offset WHERE consumer = %s FOR UPDATE",
+                       (consumer,))
+        row = cursor.fetchone()
+        now = _utcnow()
+        if row is None and from_start:
+            cursor.execute("INSERT IGNORE INTO change_log_offset (consumer, change_id, updated_at) VALUES (%s, 0, %s)",
+                           (consumer, now))
+            cursor.execute("SELECT change_id, updated_at FROM change_log_offset WHERE consumer = %s FOR UPDATE",
+                           (consumer,))
+            row = cursor.fetchone()
+        if row is None or now - row[1] > CHANGE_LOG_CONSUMER_TIMEOUT:
+            # 位点已过期时，清理线程可能已经删除了它之后尚未处理的变更
+            cursor.execute("SELECT MAX(change_id) FROM change_log")
+            start = cursor.fetchone()[0] or 0
+            handler(cursor, None)
+            cursor.execute(
+                "INSERT INTO change_log_offset (consumer, change_id, updated_at) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE change_id = VALUES(change_id), updated_at = VALUES(updated_at)",
+                (consumer, start, now)
+            )
+            return True, 0
+        changes = self._read_changes(cursor, row[0], limit, on_primary=True)
+        if changes:
+            handler(cursor, changes)
+            cursor.execute("UPDATE change_log_offset SET change_id = %s, updated_at = %s WHERE consumer = %s",
+                           (changes[-1]['change_id'], now, consumer))
+        elif now - row[1] > CHANGE_LOG_CONSUMER_TIMEOUT / 4:
+            cursor.execute("UPDATE change_log_offset SET updated_at = %s WHERE consumer = %s", (now, consumer))
+        return True, len(changes)
+
+    @write_transaction("清理变更日志失败")
+    def prune_change_log(self, cursor, retention_days=CHANGE_LOG_RETENTION_DAYS, limit=CHANGE_LOG_BATCH_SIZE):
+        """
+        删除超过保留期、且所有仍在运行的持久消费者都已处理过的至多 limit 条变更日志，返回 (True, 删除条数)
+        位点超过 CHANGE_LOG_CONSUMER_TIMEOUT 没有更新的消费者不再阻止清理，超过保留期的位点本身也一并删除
+        """
+        now = _utcnow()
+        cutoff = now - datetime.timedelta(days=retention_days)
+        # 锁住位点：正在判断位点是否过期的消费者等这一批删除提交后再读取变更
+        cursor.execute("SELECT change_id, updated_at FROM change_log_offset FOR UPDATE")
+        offsets = cursor.fetchall()
+        live = [change_id for change_id, updated_at in offsets if now - updated_at <= CHANGE_LOG_CONSUMER_TIMEOUT]
+        condition, params = "", [cutoff]
+        if live:
+            condition, params = " AND change_id <= %s", [cutoff, min(live)]
+        cursor.execute(
+            f"SELECT change_id FROM change_log WHERE created_at < %s{condition} ORDER BY change_id LIMIT %s",
+            params + [limit]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            cursor.execute(f"DELETE FROM change_log WHERE change_id IN ({', '.join(['%s'] * len(ids))})", ids)
+        if any(updated_at < cutoff for _, updated_at in offsets):
+            cursor.execute("DELETE FROM change_log_offset WHERE updated_at < %s", (cutoff,))
+        return True, len(ids)
+
+    def _read_changes(self, cursor, after_id, limit, on_primary=False):
+        """
+        读取 after_id 之后连续的变更。change_id 在插入时分配，较小的 change_id 可能较晚提交；
+        遇到缺口时，确认缺口对应的事务已经结束（见 _gap_settled）才跳过缺口，否则停在缺口前
+        on_primary 为 True 表示 cursor 连接的是主库，可以通过 innodb_trx 确认
+        """
+        cursor.execute(
+            "SELECT change_id, scope, action, entity_ids, teacher_ids, created_at FROM change_log "
+            "WHERE change_id > %s ORDER BY change_id LIMIT %s",
+            (after_id, limit)
+        )
+        changes = []
+        expected = after_id + 1
+        for change_id, scope, action, entity_ids, teacher_ids, created_at in cursor.fetchall():
+            if change_id != expected and not self._gap_settled(cursor, expected, created_at, on_primary):
+                break
+            changes.append({'change_id': change_id, 'scope': scope, 'action': action, 'ids': json.loads(entity_ids),
+                            'teacher_ids': json.loads(teacher_ids), 'created_at': created_at})
+            expected = change_id + 1
+        return changes
+
+    def _gap_settled(self, cursor, missing_id, created_at, on_primary):
+        """
+        change_id 为 missing_id 起的缺口是否可以跳过，created_at 为缺口之后那条变更的写入时间
+        缺口对应的事务在那条变更之前分配到 change_id，一定在 created_at 之前就已开始；
+        主库上已没有这样的其他事务时，它已经回滚，否则等本进程看到缺口 CHANGE_LOG_GAP_TIMEOUT 秒后再跳过
+        """
+        if len(self._change_log_gaps) > 1000:
+            self._change_log_gaps.clear()
+        first_seen = self._change_log_gaps.setdefault(missing_id, time.monotonic())
+        settled = time.monotonic() - first_seen >= CHANGE_LOG_GAP_TIMEOUT
+        if not settled and on_primary and self._innodb_trx_available:
+            try:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM information_schema.innodb_trx "
+                    "WHERE trx_started <= %s AND trx_mysql_thread_id <> CONNECTION_ID()",
+                    (created_at,)
+                )
+                settled = cursor.fetchone()[0] == 0
+            except Exception as e:
+                self._innodb_trx_available = False
+                print(f"无法查询 innodb_trx，变更日志的缺口等待 {CHANGE_LOG_GAP_TIMEOUT} 秒后跳过: {e}", file=sys.stderr)
+        if settled:
+            self._change_log_gaps.pop(missing_id, None)
+        return settled
+
+    # ========== 已删除数据清理 ==========
+    @write_transaction("清理已删除数据失败")
+    def purge_deleted(self, cursor, kind, limit=PURGE_BATCH_SIZE):
+        """
+        物理删除最早删除的至多 limit 篇论文（kind='paper'）或个项目（kind='project'）及其关联行
+        每次调用是一个短事务，只锁住这一批行；返回 (True, 本批删除的论文/项目数)
+        每个 worker 进程都有清理线程，SKIP LOCKED 让它们各自领取不同的墓碑，不互相等待行锁
+        """
+        if kind not in SOFT_DELETE_TABLES:
+            return False, f"未知的数据类型: {kind}"
+        table, child_table, id_column, registry_table = SOFT_DELETE_TABLES[kind]
+        cursor.execute(
+            f"SELECT {id_column} FROM {table} WHERE deleted_at IS NOT NULL "
+            f"ORDER BY deleted_at, {id_column} LIMIT %s FOR UPDATE SKIP LOCKED",
+            (limit,)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f"DELETE FROM {child_table} WHERE {id_column} IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM {table} WHERE {id_column} IN ({placeholders}) AND deleted_at IS NOT NULL",
+                           ids)
+            if registry_table:
+                cursor.execute(f"DELETE FROM {registry_table} WHERE {id_column} IN ({placeholders})", ids)
+        return True, len(ids)
+
+    def _bump_versions(self, cursor, scope, teacher_ids, ids=()):
+        """
+        在当前事务中递增教师数据版本号（按教师ID顺序加锁，避免死锁），并追加一行变更日志
+        ids 为本次修改的论文/项目/课程ID，随事件一起通知监听器
+        """
+        teacher_ids = sorted(set(teacher_ids))
+        ids = sorted(set(ids))
+        if teacher_ids:
+            self._notify(scope, teacher_ids=teacher_ids, ids=ids)
+            cursor.execute(
+                "INSERT INTO teacher_data_version (teacher_id, scope, version, updated_at) VALUES "
+                + ", ".join(["(%s, %s, 1, CURRENT_TIMESTAMP(6))"] * len(teacher_ids))
+                + " ON DUPLICATE KEY UPDATE version = version + 1, updated_at = CURRENT_TIMESTAMP(6)",
+                [value for teacher_id in teacher_ids for value in (teacher_id, scope)]
+            )
+        # 没有涉及教师的修改（例如没有作者的论文）也记入变更日志
+        cursor.execute(
+            "INSERT INTO change_log (scope, action, entity_ids, teacher_ids) VALUES (%s, %s, %s, %s)",
+            (scope, getattr(self._local, 'action', None) or scope, json.dumps(ids), json.dumps(teacher_ids))
+        )
+    
+    def _year_condition(self, column, start_year, end_year):
+        """
+        年份范围条件（以 AND 开头），两端各自独立生成，只给出一端时也能只扫描涉及的分区
+        paper 按 pub_year、course_teaching 按 course_year 分区（见 migrations.py），带上年份条件才能只扫描涉及的分区
+        返回 (条件, 参数)，两端都为 None 时返回空条件
+        """
+        condition, params = "", []
+        if start_year is not None:
+            condition += f" AND {column} >= %s"
+            params.append(start_year)
+        if end_year is not None:
+            condition += f" AND {column} <= %s"
+            params.append(end_year)
+        return condition, params
+
+    def _refresh_member_summary(self, cursor, table, parent_id):
+        """在当前事务中重新计算论文/项目行上的作者/参与者人数和姓名列表（调用前已锁住论文/项目行）"""
+        child_table, id_column, key_column, count_column, names_column = MEMBER_SUMMARY_COLUMNS[table]
+        cursor.execute(
+            f"SELECT t.name FROM {child_table} c JOIN teacher t ON c.teacher_id = t.teacher_id "
+            f"WHERE c.{id_column} = %s ORDER BY c.{key_column}",
+            (parent_id,)
+        )
+        names = [row[0] for row in cursor.fetchall()]
+        # 在应用中拼接，不受 group_concat_max_len 截断
+        cursor.execute(
+            f"UPDATE {table} SET {count_column} = %s, {names_column} = %s WHERE {id_column} = %s",
+            (len(names), ', '.join(names) or None, parent_id)
+        )
+
+    def _paper_teachers(self, cursor, paper_id):
+        """论文的全部作者ID（所有作者列表会显示在每位作者的查询结果中）"""
+        cursor.execute("SELECT teacher_id FROM paper_author WHERE paper_id = %s", (paper_id,))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _project_teachers(self, cursor, project_id):
+        """项目的全部参与者ID"""
+        cursor.execute("SELECT teacher_id FROM project_participant WHERE project_id = %s", (project_id,))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _course_teachers(self, cursor, course_id, year, semester):
+        """同一学期同一课程的全部主讲教师ID"""
+        cursor.execute(
+            "SELECT teacher_id FROM course_teaching "
+            "WHERE course_id = %s AND course_year = %s AND semester = %s",
+            (course_id, year, semester)
+        )
+        return [row[0] for row in cursor.fetchall()]
+    
+    # ========== 事务与加锁 ==========
+    # 所有写操作按相同顺序加锁：论文/项目/课程行 -> 作者/参与者行（按排名） -> 版本号行（按教师ID）
+    def _run_write(self, error_prefix, isolation_level, body, action=None):
+        """
+        在写事务中执行 body(cursor)，死锁或锁等待超时时回滚并退避重试
+        action 为写操作名称，记入变更日志
+        """
+        self._local.action = action
+        for attempt in range(1, WRITE_MAX_ATTEMPTS + 1):
+            connection = None
+            cursor = None
+            self._local.events = []
+            try:
+                connection = self.db.get_connection()
+                if connection.in_transaction:
+                    connection.rollback()
+                connection.start_transaction(isolation_level=isolation_level)
+                cursor = connection.cursor()
+                success, message = body(cursor)
+                if success:
+                    connection.commit()
+                else:
+                    connection.rollback()
+                    self._local.events = []
+                self._dispatch_events()
+                return success, message
+            except Exception as e:
+                if connection is not None:
+                    try:
+                        connection.rollback()
+                    except Exception:
+                        pass
+                if getattr(e, 'errno', None) in RETRYABLE_ERRNOS and attempt < WRITE_MAX_ATTEMPTS:
+                    with self._retry_lock:
+                        self.write_retries += 1
+                    delay = min(WRITE_RETRY_MAX_DELAY, WRITE_RETRY_BASE_DELAY * 2 ** attempt)
+                    time.sleep(random.uniform(0, delay))
+                    continue
+                return False, f"{error_prefix}: {str(e)}"
+            finally:
+                if cursor is not None:
+                    cursor.close()
+    
+    def _notify(self, event, **data):
+        """记录当前写事务产生的事件，提交后才通知监听器，回滚或重试时丢弃"""
+        events = getattr(self._local, 'events', None)
+        if events is not None:
+            events.append((event, data))
+    
+    def _audit(self, entity, key, before=None, after=None):
+        """
+        记录一条审计信息（修改前后的值，新增时 before 为 None，删除时 after 为 None）
+        与其他事件一样在事务提交后交给监听器（见 audit.py），不在写事务中写入
+        """
+        self._notify('audit', action=getattr(self._local, 'action', None), entity=entity, key=key,
+                     before=before, after=after)
+
+    def _dispatch_events(self):
+        events, self._local.events = self._local.events, None
+        for event, data in events:
+            for listener in self._listeners:
+                # 写操作已经提交，监听器出错不影响返回结果
+                try:
+                    listener(event, data)
+                except Exception as e:
+                    print(f"写操作监听器出错: {e}", file=sys.stderr)
+    
+    def _lock_paper(self, cursor, paper_id):
+        """锁住论文行，论文不存在或已删除时返回 None"""
+        cursor.execute("SELECT paper_id FROM paper WHERE paper_id = %s AND deleted_at IS NULL FOR UPDATE", (paper_id,))
+        return cursor.fetchone()
+    
+    def _lock_paper_authors(self, cursor, paper_id):
+        """
+        按排名顺序锁住论文的全部作者行
+        返回 [(teacher_id, author_rank, is_corresponding, author_rank_key), ...]，author_rank 为 1..n
+        """
+        cursor.execute(
+            "SELECT teacher_id, is_corresponding, author_rank_key FROM paper_author "
+            "WHERE paper_id = %s ORDER BY author_rank_key FOR UPDATE",
+            (paper_id,)
+        )
+        return [(teacher_id, rank, is_corresponding, rank_key)
+                for rank, (teacher_id, is_corresponding, rank_key) in enumerate(cursor.fetchall(), 1)]
+    
+    def _lock_project(self, cursor, project_id):
+        """锁住项目行，返回 (start_year, end_year, total_funding)，项目不存在或已删除时返回 None"""
+        cursor.execute(
+            "SELECT start_year, end_year, total_funding FROM project "
+            "WHERE project_id = %s AND deleted_at IS NULL FOR UPDATE",
+            (project_id,)
+        )
+        return cursor.fetchone()
+    
+    def _lock_project_participants(self, cursor, project_id):
+        """
+        按排名顺序锁住项目的全部参与者行
+        返回 [(teacher_id, participant_rank, funding, participant_rank_key), ...]，participant_rank 为 1..n
+        """
+        cursor.execute(
+            "SELECT teacher_id, funding, participant_rank_key FROM project_participant "
+            "WHERE project_id = %s ORDER BY participant_rank_key FOR UPDATE",
+            (project_id,)
+        )
+        return [(teacher_id, rank, funding, rank_key)
+                for rank, (teacher_id, funding, rank_key) in enumerate(cursor.fetchall(), 1)]
+    
+    def _lock_course(self, cursor, course_id):
+        """锁住课程行，返回 (total_hours,)，课程不存在时返回 None"""
+        cursor.execute("SELECT total_hours FROM course WHERE course_id = %s FOR UPDATE", (course_id,))
+        return cursor.fetchone()
+    
+    # ========== 稀疏排名键 ==========
+    def _rank_key_at(self, keys, position):
+        """
+        在升序排名键 keys 中放到第 position 位（从1开始）时使用的新键
+        追加到末尾时取最后一个键加一个间隔，否则取前后两个键的中点；没有空隙时返回 None
+        """
+        prev_key = keys[position - 2] if position > 1 else 0
+        if position > len(keys):
+            return prev_key + RANK_KEY_GAP
+        next_key = keys[position - 1]
+        if next_key - prev_key < 2:
+            return None
+        return (prev_key + next_key) // 2
+    
+    def _renumber_rank_keys(self, cursor, table, parent_column, key_column, parent_id, teacher_ids):
+        """
+        按 teacher_ids 的顺序把排名键重新设为 RANK_KEY_GAP 的整数倍，返回新的键列表
+        先把所有键取负再写入新值，避免更新过程中违反 (parent, key) 唯一约束
+        """
+        keys = [rank * RANK_KEY_GAP for rank in range(1, len(teacher_ids) + 1)]
+        if not teacher_ids:
+            return keys
+        cursor.execute(
+            f"UPDATE {table} SET {key_column} = -{key_column} WHERE {parent_column} = %s",
+            (parent_id,)
+        )
+        cursor.execute(
+            f"UPDATE {table} SET {key_column} = CASE teacher_id "
+            + " ".join("WHEN %s THEN %s" for _ in teacher_ids)
+            + f" END WHERE {parent_column} = %s",
+            [value for pair in zip(teacher_ids, keys) for value in pair] + [parent_id]
+        )
+        return keys
@@ -0,0 +1,69 @@
+"""学期排课计划的解析、校验和差异计算"""
+import unittest
+
+from course_planner import diff_plan, parse_plan, validate_plan
+
+
+class ParsePlanTest(unittest.TestCase):
+    def test_parses_assignments_and_withdrawals(self):
+        success, plan = parse_plan("# 2024 春季\nC001,T001,32\nC001, T002 ,16\n\nC002\n")
+        self.assertTrue(success)
+        self.assertEqual(plan, {'C001': [('T001', 32), ('T002', 16)], 'C002': []})
+
+    def test_rejects_bad_lines(self):
+        self.assertEqual(parse_plan("C001,T001"), (False, "第1行格式错误，应为: 课程ID,教师ID,学时"))
+        self.assertEqual(parse_plan("C001,T001,32\nC002,T002,abc"), (False, "第2行学时必须是整数"))
+        self.assertEqual(parse_plan("# 只有注释\n"), (False, "计划为空"))
+
+
+class ValidatePlanTest(unittest.TestCase):
+    course_hours = {'C001': 48, 'C002': 32}
+    teacher_ids = {'T001', 'T002'}
+
+    def test_valid_plan(self):
+        plan = {'C001': [('T001', 32), ('T002', 16)], 'C002': []}
+        self.assertEqual(validate_plan(plan, self.course_hours, self.teacher_ids), [])
+
+    def test_reports_every_problem(self):
+        plan = {
+            'C001': [('T001', 32), ('T001', 16), ('T009', 0)],
+            'C002': [('T002', 30)],
+            'C404': [('T001', 8)],
+        }
+        self.assertEqual(validate_plan(plan, self.course_hours, self.teacher_ids), [
+            "课程 C001 中教师 T001 重复",
+            "教师 T009 不存在",
+            "课程 C001 中教师 T009 的学时必须大于0",
+            "课程 C002 分配学时 30 与总学时 32 不一致",
+            "课程 C404 不存在",
+        ])
+
+
+class DiffPlanTest(unittest.TestCase):
+    def test_only_changed_rows_are_written(self):
+        plan = {'C001': [('T001', 32), ('T002', 16)], 'C002': []}
+        current = {('C001', 'T001'): 32, ('C001', 'T003'): 16, ('C002', 'T002'): 32}
+        upserts, deletes = diff_plan(plan, current)
+        self.assertEqual(upserts, [('C001', 'T002', 16)])
+        self.assertEqual(deletes, [('C001', 'T003'), ('C002', 'T002')])
+
+    def test_changed_hours_are_upserted(self):
+        upserts, deletes = diff_plan({'C001': [('T001', 24), ('T002', 24)]},
+                                     {('C001', 'T001'): 32, ('C001', 'T002'): 16})
+        self.assertEqual(upserts, [('C001', 'T001', 24), ('C001', 'T002', 24)])
+        self.assertEqual(deletes, [])
+
+    def test_unchanged_plan_is_empty_diff(self):
+        current = {('C001', 'T001'): 32}
+        self.assertEqual(diff_plan({'C001': [('T001', 32)]}, current), ([], []))
+
+    def test_results_are_sorted_for_lock_order(self):
+        plan = {'C002': [('T002', 8), ('T001', 8)], 'C001': [('T003', 16)]}
+        current = {('C002', 'T009'): 8, ('C001', 'T004'): 16, ('C001', 'T002'): 8}
+        upserts, deletes = diff_plan(plan, current)
+        self.assertEqual([row[:2] for row in upserts], [('C001', 'T003'), ('C002', 'T001'), ('C002', 'T002')])
+        self.assertEqual(deletes, [('C001', 'T002'), ('C001', 'T004'), ('C002', 'T009')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""项目经费按年分摊：各种分摊方式的比例、年份窗口裁剪和分组汇总"""
+import unittest
+
+from funding_analytics import np, parse_profile, yearly_series
+
+
+def row(teacher_id, start_year, end_year, funding, project_type=1, project_source="国家自然科学基金"):
+    return {'teacher_id': teacher_id, 'name': f"教师{teacher_id}", 'project_type': project_type,
+            'project_source': project_source, 'start_year': start_year, 'end_year': end_year, 'funding': funding}
+
+
+class ParseProfileTest(unittest.TestCase):
+    def test_presets_and_custom_weights(self):
+        self.assertEqual(parse_profile(None), (True, 'uniform'))
+        self.assertEqual(parse_profile('front'), (True, 'front'))
+        self.assertEqual(parse_profile("40，30,30"), (True, (40.0, 30.0, 30.0)))
+
+    def test_rejects_invalid_weights(self):
+        self.assertEqual(parse_profile("a,b"), (False, "无效的分摊方式: a,b"))
+        self.assertFalse(parse_profile("30,-1,10")[0])
+        self.assertFalse(parse_profile("30,0")[0])
+
+
+@unittest.skipIf(np is None, "未安装 numpy")
+class YearlySeriesTest(unittest.TestCase):
+    def values(self, rows, **kwargs):
+        success, result = yearly_series(rows, **kwargs)
+        self.assertTrue(success, result)
+        return result['years'], result['series'][0]['values'] if result['series'] else []
+
+    def test_uniform_splits_evenly(self):
+        self.assertEqual(self.values([row('T1', 2020, 2023, 100)]), ([2020, 2021, 2022, 2023], [25, 25, 25, 25]))
+
+    def test_front_and_back_profiles(self):
+        self.assertEqual(self.values([row('T1', 2020, 2022, 120)], profile='front')[1], [60, 40, 20])
+        self.assertEqual(self.values([row('T1', 2020, 2022, 120)], profile='back')[1], [20, 40, 60])
+
+    def test_custom_weights_normalised_per_project(self):
+        # 两年的项目只用到前两个权重
+        self.assertEqual(self.values([row('T1', 2020, 2021, 70)], profile=(40, 30, 30))[1], [40, 30])
+        # 更长的项目其余年份沿用最后一个权重
+        self.assertEqual(self.values([row('T1', 2020, 2023, 125)], profile=(50, 25))[1], [50, 25, 25, 25])
+
+    def test_zero_custom_weights_fall_back_to_uniform(self):
+        self.assertEqual(self.values([row('T1', 2020, 2021, 10)], profile=(0, 0, 1))[1], [5, 5])
+
+    def test_window_clips_without_rescaling(self):
+        years, values = self.values([row('T1', 2020, 2023, 100)], start_year=2021, end_year=2022)
+        self.assertEqual((years, values), ([2021, 2022], [25, 25]))
+        years, values = self.values([row('T1', 2020, 2021, 100)], start_year=2019, end_year=2022)
+        self.assertEqual((years, values), ([2019, 2020, 2021, 2022], [0, 50, 50, 0]))
+
+    def test_end_before_start_and_missing_funding(self):
+        self.assertEqual(self.values([row('T1', 2021, 2019, 30), row('T2', 2021, 2021, None)]), ([2021], [30]))
+
+    def test_group_by_teacher_sorted_by_total(self):
+        rows = [row('T1', 2020, 2021, 40), row('T2', 2020, 2020, 100), row('T1', 2021, 2021, 20)]
+        success, result = yearly_series(rows, group_by='teacher')
+        self.assertTrue(success)
+        self.assertEqual(result['years'], [2020, 2021])
+        self.assertEqual([(item['key'], item['label'], item['values'], item['total']) for item in result['series']], [
+            ('T2', "教师T2（T2）", [100, 0], 100),
+            ('T1', "教师T1（T1）", [20, 40], 60),
+        ])
+        self.assertEqual(result['totals'], [120, 40])
+
+    def test_group_by_project_type_labels(self):
+        rows = [row('T1', 2020, 2020, 10, project_type=2), row('T2', 2020, 2020, 5, project_type=9)]
+        success, result = yearly_series(rows, group_by='project_type')
+        self.assertEqual([item['label'] for item in result['series']], ["省部级项目", "未知类型"])
+
+    def test_errors_and_empty_input(self):
+        self.assertEqual(yearly_series([row('T1', 2020, 2020, 1)], group_by='college'),
+                         (False, "未知的汇总维度: college"))
+        self.assertEqual(yearly_series([row('T1', 2020, 2020, 1)], start_year=2022, end_year=2021),
+                         (False, "开始年份不能晚于结束年份"))
+        self.assertEqual(yearly_series([]), (True, {'years': [], 'series': [], 'totals': []}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""区间树堆：插入、删除和闭区间重叠查询，与逐个比较的结果一致"""
+import random
+import unittest
+
+from interval_index import IntervalTreap
+
+
+def brute_force(intervals, start, end):
+    return [key for (first, key) in sorted((first, key) for key, (first, last) in intervals.items()
+                                           if first <= end and last >= start)]
+
+
+class IntervalTreapTest(unittest.TestCase):
+    def test_closed_interval_overlap(self):
+        tree = IntervalTreap(seed=1)
+        tree.insert('P1', 2018, 2020)
+        tree.insert('P2', 2021, 2021)
+        tree.insert('P3', 2015, 2030)
+        self.assertEqual(tree.overlapping(2020, 2020), ['P3', 'P1'])
+        self.assertEqual(tree.overlapping(2021, 2025), ['P3', 'P2'])
+        self.assertEqual(tree.overlapping(2031, 2040), [])
+        self.assertEqual(tree.overlapping(float('-inf'), float('inf')), ['P3', 'P1', 'P2'])
+
+    def test_same_start_ordered_by_key(self):
+        tree = IntervalTreap(seed=2)
+        for key in ('P3', 'P1', 'P2'):
+            tree.insert(key, 2020, 2022)
+        self.assertEqual(tree.overlapping(2021, 2021), ['P1', 'P2', 'P3'])
+
+    def test_remove(self):
+        tree = IntervalTreap(seed=3)
+        tree.insert('P1', 2018, 2020)
+        tree.insert('P2', 2019, 2025)
+        self.assertFalse(tree.remove('P1', 2019))
+        self.assertTrue(tree.remove('P2', 2019))
+        self.assertFalse(tree.remove('P2', 2019))
+        self.assertEqual(len(tree), 1)
+        # 删除后子树的 max_end 随之更新，不再返回已删除的长区间
+        self.assertEqual(tree.overlapping(2022, 2030), [])
+
+    def test_matches_brute_force_under_random_updates(self):
+        rng = random.Random(7)
+        tree = IntervalTreap(seed=7)
+        intervals = {}
+        for step in range(3000):
+            if intervals and rng.random() < 0.4:
+                key = rng.choice(sorted(intervals))
+                first, _ = intervals.pop(key)
+                self.assertTrue(tree.remove(key, first))
+            else:
+                first = rng.randint(1990, 2030)
+                intervals[f"P{step}"] = (first, first + rng.randint(0, 8))
+                tree.insert(f"P{step}", *intervals[f"P{step}"])
+            if step % 50 == 0:
+                start = rng.randint(1985, 2035)
+                end = start + rng.randint(0, 5)
+                self.assertEqual(tree.overlapping(start, end), brute_force(intervals, start, end))
+        self.assertEqual(len(tree), len(intervals))
+
+
+if __name__ == '__main__':
+    unittest.main()
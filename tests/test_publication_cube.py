@@ -0,0 +1,102 @@
+"""论文统计立方体：按维度切片、筛选条件，以及论文写操作后的增量更新"""
+import unittest
+
+from publication_cube import PublicationCube, np
+
+
+class FakeService:
+    """论文作者记录 (teacher_id, year, level, type, 第一作者, 通讯作者)，接口与 TeacherService 相同"""
+
+    def __init__(self, authorships):
+        self.authorships = list(authorships)
+        self.listeners = []
+        self.queries = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def write(self, authorship):
+        self.authorships.append(authorship)
+        for listener in self.listeners:
+            listener('paper', {'teacher_ids': [authorship[0]], 'ids': []})
+
+    def list_teachers(self):
+        return True, [{'teacher_id': teacher_id, 'name': f"教师{teacher_id}"} for teacher_id in ('T1', 'T2', 'T3')]
+
+    def get_changed_teachers(self, scope, since):
+        return True, []
+
+    def get_publication_cells(self, teacher_ids=None):
+        self.queries.append(teacher_ids)
+        counts = {}
+        for authorship in self.authorships:
+            if teacher_ids is None or authorship[0] in teacher_ids:
+                counts[authorship] = counts.get(authorship, 0) + 1
+        return True, [key + (count,) for key, count in counts.items()]
+
+
+AUTHORSHIPS = [
+    ('T1', 2021, 1, 1, True, False),
+    ('T1', 2021, 1, 1, True, True),
+    ('T1', 2022, 2, 3, False, True),
+    ('T2', 2022, 1, 1, False, False),
+    ('T2', 2023, 6, 4, True, False),
+]
+
+
+@unittest.skipIf(np is None, "未安装 numpy")
+class PublicationCubeTest(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeService(AUTHORSHIPS)
+        self.cube = PublicationCube(self.service)
+
+    def test_count_with_filters(self):
+        self.assertEqual(self.cube.count(), (True, 5))
+        self.assertEqual(self.cube.count(teacher_ids=['T1']), (True, 3))
+        self.assertEqual(self.cube.count(start_year=2022), (True, 3))
+        self.assertEqual(self.cube.count(start_year=2022, end_year=2022), (True, 2))
+        self.assertEqual(self.cube.count(levels=[1]), (True, 3))
+        self.assertEqual(self.cube.count(types=[3, 4]), (True, 2))
+        self.assertEqual(self.cube.count(teacher_ids=['T3']), (True, 0))
+        self.assertEqual(self.cube.count(start_year=2030), (True, 0))
+
+    def test_role_filters(self):
+        self.assertEqual(self.cube.count(role='first'), (True, 3))
+        self.assertEqual(self.cube.count(role='corresponding'), (True, 2))
+        self.assertEqual(self.cube.count(role='first_or_corresponding'), (True, 4))
+
+    def test_slice_by_year(self):
+        success, rows = self.cube.slice(('year',))
+        self.assertTrue(success)
+        self.assertEqual([(row['year'], row['count']) for row in rows], [(2021, 2), (2022, 2), (2023, 1)])
+
+    def test_slice_by_teacher_and_level_with_labels(self):
+        success, rows = self.cube.slice(('teacher', 'level'), start_year=2021, end_year=2022)
+        self.assertTrue(success)
+        self.assertEqual([(row['teacher_id'], row['level'], row['count']) for row in rows],
+                         [('T1', 1, 2), ('T1', 2, 1), ('T2', 1, 1)])
+        self.assertEqual((rows[0]['teacher_name'], rows[0]['level_text']), ("教师T1", "CCF-A"))
+
+    def test_group_order_follows_group_by(self):
+        success, rows = self.cube.slice(('type', 'year'))
+        self.assertEqual([(row['type'], row['year']) for row in rows], [(1, 2021), (1, 2022), (3, 2022), (4, 2023)])
+        self.assertEqual(rows[-1]['type_text'], "demo paper")
+
+    def test_invalid_arguments(self):
+        self.assertEqual(self.cube.slice(('venue',)), (False, "未知的分组维度: venue"))
+        self.assertEqual(self.cube.slice(('year', 'year')), (False, "分组维度不能重复"))
+        self.assertEqual(self.cube.slice(role='last'), (False, "未知的作者角色: last"))
+
+    def test_write_is_applied_on_next_read_for_that_teacher_only(self):
+        self.cube.count()
+        self.service.queries.clear()
+        self.service.write(('T3', 2019, 3, 2, True, True))
+        self.assertEqual(self.service.queries, [])
+        self.assertEqual(self.cube.count(), (True, 6))
+        self.assertEqual(self.service.queries, [['T3']])
+        success, rows = self.cube.slice(('year',), teacher_ids=['T3'])
+        self.assertEqual([(row['year'], row['count']) for row in rows], [(2019, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""稀疏排名键：新位置的键取前后两个键的中点，间隔用尽时整体重新等距排列"""
+import sqlite3
+import unittest
+
+from snapshot import SnapshotCursor
+from teacher_service import RANK_KEY_GAP, TeacherService
+
+
+class RankKeyAtTest(unittest.TestCase):
+    def setUp(self):
+        self.service = TeacherService(None)
+
+    def test_first_key_of_empty_list(self):
+        self.assertEqual(self.service._rank_key_at([], 1), RANK_KEY_GAP)
+
+    def test_append_adds_one_gap(self):
+        keys = [RANK_KEY_GAP, 2 * RANK_KEY_GAP]
+        self.assertEqual(self.service._rank_key_at(keys, 3), 3 * RANK_KEY_GAP)
+
+    def test_insert_takes_midpoint(self):
+        keys = [RANK_KEY_GAP, 2 * RANK_KEY_GAP]
+        self.assertEqual(self.service._rank_key_at(keys, 1), RANK_KEY_GAP // 2)
+        self.assertEqual(self.service._rank_key_at(keys, 2), RANK_KEY_GAP + RANK_KEY_GAP // 2)
+
+    def test_new_key_keeps_order(self):
+        keys = [RANK_KEY_GAP, 2 * RANK_KEY_GAP, 3 * RANK_KEY_GAP]
+        for position in range(1, len(keys) + 2):
+            key = self.service._rank_key_at(keys, position)
+            new_keys = keys[:position - 1] + [key] + keys[position - 1:]
+            self.assertEqual(new_keys, sorted(set(new_keys)))
+
+    def test_exhausted_gap_returns_none(self):
+        self.assertIsNone(self.service._rank_key_at([5, 6], 2))
+        self.assertIsNone(self.service._rank_key_at([1, 2], 1))
+        self.assertEqual(self.service._rank_key_at([5, 7], 2), 6)
+
+    def test_repeated_front_inserts_run_out_after_log2_gap(self):
+        keys = [RANK_KEY_GAP]
+        inserts = 0
+        while True:
+            key = self.service._rank_key_at(keys, 1)
+            if key is None:
+                break
+            keys.insert(0, key)
+            inserts += 1
+        self.assertEqual(inserts, RANK_KEY_GAP.bit_length() - 1)
+
+
+class RenumberRankKeysTest(unittest.TestCase):
+    def setUp(self):
+        connection = sqlite3.connect(':memory:')
+        self.addCleanup(connection.close)
+        connection.execute(
+            "CREATE TABLE paper_author (paper_id TEXT, teacher_id TEXT, author_rank_key INTEGER, "
+            "PRIMARY KEY (paper_id, teacher_id), UNIQUE (paper_id, author_rank_key))"
+        )
+        connection.executemany("INSERT INTO paper_author VALUES (?, ?, ?)", [
+            ('P1', 'T1', 3), ('P1', 'T2', 4), ('P1', 'T3', 5), ('P2', 'T1', 3),
+        ])
+        self.connection = connection
+        self.cursor = SnapshotCursor(connection.cursor())
+
+    def keys(self, paper_id):
+        return self.connection.execute(
+            "SELECT teacher_id, author_rank_key FROM paper_author WHERE paper_id = ? ORDER BY author_rank_key",
+            (paper_id,)
+        ).fetchall()
+
+    def renumber(self, paper_id, teacher_ids):
+        return TeacherService(None)._renumber_rank_keys(self.cursor, 'paper_author', 'paper_id', 'author_rank_key',
+                                                        paper_id, teacher_ids)
+
+    def test_renumbers_in_given_order_without_unique_conflicts(self):
+        keys = self.renumber('P1', ['T3', 'T1', 'T2'])
+        self.assertEqual(keys, [RANK_KEY_GAP, 2 * RANK_KEY_GAP, 3 * RANK_KEY_GAP])
+        self.assertEqual(self.keys('P1'), [('T3', RANK_KEY_GAP), ('T1', 2 * RANK_KEY_GAP), ('T2', 3 * RANK_KEY_GAP)])
+
+    def test_other_parents_are_untouched(self):
+        self.renumber('P1', ['T1', 'T2', 'T3'])
+        self.assertEqual(self.keys('P2'), [('T1', 3)])
+
+    def test_empty_order_does_nothing(self):
+        self.assertEqual(self.renumber('P1', []), [])
+        self.assertEqual(self.keys('P1'), [('T1', 3), ('T2', 4), ('T3', 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""教学工作量汇总：各维度组合的小计、WITH ROLLUP 形式的行，以及写操作后的增量更新"""
+import unittest
+
+from workload_rollup import WorkloadRollup, _YearCube
+
+
+class FakeService:
+    """按 (年份, 教师, 学期, 课程类型) 保存学时，接口与 TeacherService.get_workload_cells 相同"""
+
+    def __init__(self, hours):
+        self.hours = dict(hours)
+        self.listeners = []
+        self.queries = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def write(self, key, hours):
+        self.hours[key] = hours
+        for listener in self.listeners:
+            listener('course', {'teacher_ids': [key[1]], 'ids': []})
+
+    def get_workload_cells(self, years, teacher_ids=None):
+        self.queries.append((list(years), teacher_ids))
+        return True, [(year, teacher_id, f"教师{teacher_id}", semester, course_type, hours)
+                      for (year, teacher_id, semester, course_type), hours in sorted(self.hours.items())
+                      if year in years and (teacher_ids is None or teacher_id in teacher_ids) and hours]
+
+
+class FakeTailer:
+    def __init__(self):
+        self.consumers = {}
+
+    def add_consumer(self, name, handler, from_start=False, per_process=False):
+        self.consumers[name] = handler
+
+
+HOURS = {
+    (2024, 'T1', 1, 1): 32, (2024, 'T1', 3, 2): 16,
+    (2024, 'T2', 1, 1): 48, (2024, 'T2', 1, 2): 8,
+    (2023, 'T1', 1, 1): 64,
+}
+
+
+class YearCubeTest(unittest.TestCase):
+    def test_totals_cover_every_dimension_combination(self):
+        cube = _YearCube()
+        for (year, teacher_id, semester, course_type), hours in HOURS.items():
+            if year == 2024:
+                cube.cells[(teacher_id, semester, course_type)] = hours
+                cube.add((teacher_id, semester, course_type), hours)
+        self.assertEqual(cube.totals[(None, None, None)], 104)
+        self.assertEqual(cube.totals[('T1', None, None)], 48)
+        self.assertEqual(cube.totals[(None, 1, None)], 88)
+        self.assertEqual(cube.totals[(None, None, 2)], 24)
+        self.assertEqual(cube.totals[('T2', 1, None)], 56)
+        self.assertEqual(cube.totals[(None, 1, 1)], 80)
+        # 4 个明细 + 各种汇总组合去重后的小计：(教师,学期) 3、(教师,类型) 4、(学期,类型) 3、单维度各 2、总计 1
+        self.assertEqual(len(cube.totals), 21)
+
+    def test_replace_teacher_adjusts_and_drops_zero_totals(self):
+        cube = _YearCube()
+        for key, hours in {('T1', 1, 1): 32, ('T2', 3, 2): 16}.items():
+            cube.cells[key] = hours
+            cube.add(key, hours)
+        cube.replace_teacher('T2', {('T2', 1, 1): 8})
+        self.assertEqual(cube.cells, {('T1', 1, 1): 32, ('T2', 1, 1): 8})
+        self.assertEqual(cube.totals[(None, None, None)], 40)
+        self.assertEqual(cube.totals[(None, 1, 1)], 40)
+        self.assertNotIn((None, 3, None), cube.totals)
+        self.assertNotIn(('T2', None, 2), cube.totals)
+
+
+class WorkloadRollupTest(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeService(HOURS)
+        self.tailer = FakeTailer()
+        self.rollup = WorkloadRollup(self.service, change_tailer=self.tailer)
+
+    def test_total_by_dimension(self):
+        self.assertEqual(self.rollup.total(2024), (True, 104))
+        self.assertEqual(self.rollup.total(2024, teacher_id='T1'), (True, 48))
+        self.assertEqual(self.rollup.total(2024, semester=1, course_type=1), (True, 80))
+        self.assertEqual(self.rollup.total(2023), (True, 64))
+        self.assertEqual(self.rollup.total(2022), (True, 0))
+
+    def test_rows_follow_with_rollup_order(self):
+        success, rows = self.rollup.rows(2024, ('teacher_id', 'semester'))
+        self.assertTrue(success)
+        self.assertEqual([(row['teacher_id'], row['semester'], row['hours'], row['level']) for row in rows], [
+            ('T1', 1, 32, 2), ('T1', 3, 16, 2), ('T1', None, 48, 1),
+            ('T2', 1, 56, 2), ('T2', None, 56, 1),
+            (None, None, 104, 0),
+        ])
+        self.assertEqual(rows[0]['teacher_name'], "教师T1")
+        self.assertEqual(rows[0]['semester_text'], "春季学期")
+
+    def test_rows_reject_unknown_dimension(self):
+        self.assertEqual(self.rollup.rows(2024, ('room',)), (False, "未知的汇总维度: room"))
+
+    def test_write_is_applied_on_next_read_for_that_teacher_only(self):
+        self.rollup.total(2024)
+        self.service.queries.clear()
+        self.service.write((2024, 'T2', 1, 2), 0)
+        self.assertEqual(self.service.queries, [])
+        self.assertEqual(self.rollup.total(2024), (True, 96))
+        self.assertEqual(self.service.queries, [([2024], ['T2'])])
+        self.assertEqual(self.rollup.total(2024, course_type=2), (True, 16))
+
+    def test_change_log_consumer_marks_teachers_and_resets(self):
+        handler = self.tailer.consumers['workload_rollup']
+        self.rollup.total(2024)
+        self.service.hours[(2024, 'T1', 1, 1)] = 40
+        handler(None, [{'scope': 'paper', 'teacher_ids': ['T2']}, {'scope': 'course', 'teacher_ids': ['T1']}])
+        self.service.queries.clear()
+        self.assertEqual(self.rollup.total(2024), (True, 112))
+        self.assertEqual(self.service.queries, [([2024], ['T1'])])
+        handler(None, None)
+        self.service.queries.clear()
+        self.assertEqual(self.rollup.total(2024), (True, 112))
+        self.assertEqual(self.service.queries, [([2024], None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
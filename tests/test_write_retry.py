@@ -0,0 +1,102 @@
+"""写事务装饰器：死锁（1213）和锁等待超时（1205）时回滚重试，其他错误直接返回失败"""
+import unittest
+from unittest import mock
+
+from mysql.connector import Error
+
+import teacher_service
+from teacher_service import WRITE_MAX_ATTEMPTS, TeacherService, write_transaction
+
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def start_transaction(self, isolation_level=None):
+        self.in_transaction = True
+
+    def cursor(self):
+        return mock.Mock()
+
+    def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+
+class FakeConnector:
+    def __init__(self):
+        self.connection = FakeConnection()
+
+    def get_connection(self, readonly=False):
+        return self.connection
+
+
+class FlakyService(TeacherService):
+    """前几次执行抛出 errors 中的异常，之后成功并产生一个写事件"""
+
+    def __init__(self, errors):
+        super().__init__(FakeConnector())
+        self.errors = list(errors)
+        self.calls = 0
+
+    @write_transaction("测试写入失败")
+    def write(self, cursor):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self._notify('paper', teacher_ids=['T001'], ids=['P001'])
+        return True, "写入成功"
+
+
+class WriteRetryTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(teacher_service.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_write(self, errors):
+        service = FlakyService(errors)
+        events = []
+        service.add_listener(lambda event, data: events.append((event, data['teacher_ids'])))
+        return service, service.write(), events
+
+    def test_retries_deadlock_and_lock_wait_timeout(self):
+        service, result, events = self.run_write([Error(msg="Deadlock found", errno=1213),
+                                                  Error(msg="Lock wait timeout exceeded", errno=1205)])
+        self.assertEqual(result, (True, "写入成功"))
+        self.assertEqual(service.calls, 3)
+        self.assertEqual(service.write_retries, 2)
+        self.assertEqual(service.db.connection.commits, 1)
+        self.assertEqual(service.db.connection.rollbacks, 2)
+        self.assertEqual(self.sleep.call_count, 2)
+        # 失败的尝试中产生的事件被丢弃，监听器只收到提交的那一次
+        self.assertEqual(events, [('paper', ['T001'])])
+
+    def test_gives_up_after_max_attempts(self):
+        errors = [Error(msg="Deadlock found", errno=1213) for _ in range(WRITE_MAX_ATTEMPTS)]
+        service, (success, message), events = self.run_write(errors)
+        self.assertFalse(success)
+        self.assertTrue(message.startswith("测试写入失败: "))
+        self.assertEqual(service.calls, WRITE_MAX_ATTEMPTS)
+        self.assertEqual(service.write_retries, WRITE_MAX_ATTEMPTS - 1)
+        self.assertEqual(service.db.connection.commits, 0)
+        self.assertEqual(events, [])
+
+    def test_other_errors_are_not_retried(self):
+        service, (success, message), events = self.run_write([Error(msg="Duplicate entry", errno=1062)])
+        self.assertFalse(success)
+        self.assertIn("Duplicate entry", message)
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(service.write_retries, 0)
+        self.sleep.assert_not_called()
+        self.assertEqual(events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+数据版本号监视
+进程内的缓存通过 TeacherService 的监听器得知本进程的写操作，
+其他进程的写操作只能通过 teacher_data_version 发现：定期查询最近变化的版本号，
+与上次看到的版本号比较，得到数据发生变化的教师。
+"""
+import datetime
+import threading
+import time
+
+EPOCH = datetime.datetime(1970, 1, 1)
+# updated_at 是语句执行时间而不是提交时间，回看一段时间以免漏掉提交较晚的事务
+SYNC_LOOKBACK = datetime.timedelta(minutes=5)
+
+
+class VersionWatch:
+    """按 scope 监视教师数据版本号的变化（线程安全，最多每 interval 秒查询一次）"""
+
+    def __init__(self, service, scope, interval=5):
+        self.service = service
+        self.scope = scope
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._synced_at = 0
+        # 已处理的版本号: 最新的 updated_at，以及回看窗口内每位教师的版本号
+        self._watermark = None
+        self._seen = {}
+
+    def poll(self):
+        """
+        返回自上次检查以来版本号发生变化的教师集合
+        第一次检查只记录水位（之前的修改已包含在随后加载的数据中）；未到检查时间或查询失败时返回空集合
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._synced_at < self.interval:
+                return set()
+            self._synced_at = now
+        since = self._watermark - SYNC_LOOKBACK if self._watermark is not None else EPOCH
+        success, changes = self.service.get_changed_teachers(self.scope, since)
+        if not success:
+            return set()
+        changed = {teacher_id for teacher_id, version, _ in changes if self._seen.get(teacher_id) != version}
+        first_sync = self._watermark is None
+        self._seen = {teacher_id: version for teacher_id, version, _ in changes}
+        self._watermark = max([self._watermark or EPOCH] + [updated_at for _, _, updated_at in changes])
+        return set() if first_sync else changed
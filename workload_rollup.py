@@ -0,0 +1,201 @@
+"""
+教学工作量汇总
+按年份缓存 教师 × 学期 × 课程类型 的主讲学时，以及任意维度组合的小计和总计
+（相当于对三个维度做 GROUP BY ... WITH CUBE），按任意维度切片都直接从内存读取。
+
+缓存按教师增量维护：
+- 本进程的课程写操作提交后，TeacherService 的监听器只记下涉及的教师，下一次查询时再重新汇总，
+  写请求本身不等待任何汇总查询；
+- 其他进程的写操作由变更日志的持久消费者（见 changelog.ChangeLogTailer）在后台发现，同样只记下涉及的教师；
+  没有传入 change_tailer 时改为通过 teacher_data_version 的 course 版本号发现，最多每 sync_interval 秒检查一次。
+"""
+import threading
+from collections import OrderedDict
+from itertools import product
+
+from version_watch import VersionWatch
+
+# 汇总维度，对应缓存键 (teacher_id, semester, course_type) 的三个位置
+DIMENSIONS = ('teacher_id', 'semester', 'course_type')
+
+SEMESTER_TEXT = {1: "春季学期", 2: "夏季学期", 3: "秋季学期"}
+COURSE_TYPE_TEXT = {1: "本科生课程", 2: "研究生课程"}
+
+
+class _YearCube:
+    """一年的汇总数据：明细单元格及其所有维度组合的小计"""
+
+    def __init__(self):
+        # (teacher_id, semester, course_type) -> 学时
+        self.cells = {}
+        # 同样的键，汇总掉的维度为 None
+        self.totals = {}
+
+    def add(self, key, hours):
+        for mask in product((False, True), repeat=len(DIMENSIONS)):
+            total_key = tuple(None if rolled else value for value, rolled in zip(key, mask))
+            total = self.totals.get(total_key, 0) + hours
+            if total:
+                self.totals[total_key] = total
+            else:
+                self.totals.pop(total_key, None)
+
+    def replace_teacher(self, teacher_id, cells):
+        """用新的明细单元格 {key: 学时} 替换某位教师的全部明细，并调整小计"""
+        for key in [key for key in self.cells if key[0] == teacher_id]:
+            self.add(key, -self.cells.pop(key))
+        for key, hours in cells.items():
+            self.cells[key] = hours
+            self.add(key, hours)
+
+
+class WorkloadRollup:
+    """按年份缓存的教学工作量汇总（每个进程一份，线程安全）"""
+
+    def __init__(self, teacher_service, max_years=10, sync_interval=5, change_tailer=None):
+        self.service = teacher_service
+        self.max_years = max_years
+        self.teacher_names = {}
+        self._cubes = OrderedDict()
+        # 正在加载的年份 -> 加载期间数据发生变化的教师，加载完成后补上
+        self._loading = {}
+        # 整体清空缓存时加一，清空前开始的加载不再放入缓存
+        self._generation = 0
+        self._lock = threading.Lock()
+        # 增量更新的查询和应用串行执行，避免较早查到的数据覆盖较新的数据
+        self._refresh_lock = threading.Lock()
+        # 本进程写操作涉及、尚未重新汇总的教师
+        self._dirty = set()
+        self._watch = None
+        if change_tailer is not None:
+            change_tailer.add_consumer('workload_rollup', self.on_changes, per_process=True)
+        else:
+            self._watch = VersionWatch(teacher_service, 'course', sync_interval)
+        teacher_service.add_listener(self._on_write)
+
+    # ========== 查询 ==========
+    def total(self, year, teacher_id=None, semester=None, course_type=None):
+        """某一年指定维度取值下的总学时，参数为 None 表示汇总该维度"""
+        success, cube = self._cube(year)
+        if not success:
+            return False, cube
+        with self._lock:
+            return True, cube.totals.get((teacher_id, semester, course_type), 0)
+
+    def rows(self, year, group_by=DIMENSIONS):
+        """
+        按 group_by 中的维度依次分组，返回明细行和各级小计（与 WITH ROLLUP 的结果相同）
+        返回格式: [{'teacher_id': ..., 'semester': ..., 'course_type': ..., 'hours': ..., 'level': n}, ...]
+        未参与分组或被汇总的维度为 None；level 为该行分组的维度个数，0 为总计
+        """
+        for dimension in group_by:
+            if dimension not in DIMENSIONS:
+                return False, f"未知的汇总维度: {dimension}"
+        success, cube = self._cube(year)
+        if not success:
+            return False, cube
+
+        positions = [DIMENSIONS.index(dimension) for dimension in group_by]
+        with self._lock:
+            totals = list(cube.totals.items())
+        result = []
+        for key, hours in totals:
+            # 只保留 group_by 的前缀分组：前 level 个维度有值，其余维度全部汇总
+            level = sum(1 for position in positions if key[position] is not None)
+            if any(key[i] is not None for i in range(len(DIMENSIONS)) if i not in positions[:level]):
+                continue
+            if any(key[position] is None for position in positions[:level]):
+                continue
+            row = dict(zip(DIMENSIONS, key), hours=hours, level=level)
+            row['teacher_name'] = self.teacher_names.get(key[0])
+            row['semester_text'] = SEMESTER_TEXT.get(key[1], "未知学期") if key[1] is not None else None
+            row['course_type_text'] = COURSE_TYPE_TEXT.get(key[2], "未知类型") if key[2] is not None else None
+            result.append(row)
+        # 小计排在所属分组的明细之后
+        result.sort(key=lambda row: [(row[dimension] is None, row[dimension] or 0) for dimension in group_by])
+        return True, result
+
+    # ========== 缓存维护 ==========
+    def _cube(self, year):
+        self._sync()
+        with self._lock:
+            cube = self._cubes.get(year)
+            if cube is not None:
+                self._cubes.move_to_end(year)
+                return True, cube
+            self._loading.setdefault(year, set())
+            generation = self._generation
+
+        success, cells = self.service.get_workload_cells([year])
+        with self._lock:
+            changed = self._loading.pop(year, set())
+            if not success:
+                return False, cells
+            cube = _YearCube()
+            for _, teacher_id, name, semester, course_type, hours in cells:
+                self.teacher_names[teacher_id] = name
+                cube.cells[(teacher_id, semester, course_type)] = hours
+                cube.add((teacher_id, semester, course_type), hours)
+            if generation == self._generation:
+                self._cubes[year] = cube
+            while len(self._cubes) > self.max_years:
+                self._cubes.popitem(last=False)
+        if changed:
+            self._refresh(changed)
+        return True, cube
+
+    def on_changes(self, cursor, changes):
+        """变更日志消费者的处理函数：记下课程变更涉及的教师；changes 为 None 时之前的变更已无法得知，清空缓存"""
+        if changes is None:
+            with self._lock:
+                self._cubes.clear()
+                self._generation += 1
+            return
+        teacher_ids = {teacher_id for change in changes if change['scope'] == 'course'
+                       for teacher_id in change['teacher_ids']}
+        if teacher_ids:
+            with self._lock:
+                self._dirty.update(teacher_ids)
+
+    def _on_write(self, event, data):
+        """写操作提交后在写请求的线程中调用：只记下涉及的教师，下一次查询时再更新，写请求不等待查询"""
+        if event == 'course':
+            with self._lock:
+                self._dirty.update(data['teacher_ids'])
+
+    def _refresh(self, teacher_ids):
+        """重新汇总指定教师在所有已缓存年份中的明细"""
+        with self._lock:
+            for changed in self._loading.values():
+                changed.update(teacher_ids)
+        with self._refresh_lock:
+            with self._lock:
+                years = list(self._cubes)
+            if not years:
+                return
+            success, cells = self.service.get_workload_cells(years, sorted(teacher_ids))
+            if not success:
+                # 无法增量更新时丢弃缓存，下次查询重新加载
+                with self._lock:
+                    self._cubes.clear()
+                return
+            by_year = {year: {teacher_id: {} for teacher_id in teacher_ids} for year in years}
+            for year, teacher_id, name, semester, course_type, hours in cells:
+                self.teacher_names[teacher_id] = name
+                by_year[year][teacher_id][(teacher_id, semester, course_type)] = hours
+            with self._lock:
+                for year, teachers in by_year.items():
+                    cube = self._cubes.get(year)
+                    if cube is None:
+                        continue
+                    for teacher_id, teacher_cells in teachers.items():
+                        cube.replace_teacher(teacher_id, teacher_cells)
+
+    def _sync(self):
+        """重新汇总写操作涉及的教师（其他进程的写操作由变更日志消费者或 course 版本号发现）"""
+        changed = self._watch.poll() if self._watch is not None else set()
+        with self._lock:
+            changed |= self._dirty
+            self._dirty = set()
+        if changed:
+            self._refresh(changed)
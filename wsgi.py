@@ -0,0 +1,8 @@
+"""
+生产环境入口
+    gunicorn -c gunicorn.conf.py wsgi:application
+其它 WSGI 服务器（uwsgi、waitress 等）同样加载 wsgi:application 即可
+"""
+from app import create_app
+
+application = create_app()